@@ -0,0 +1,67 @@
+"""
+Adaptive centerline parameters. Instead of densifying every polygon to 0.1 m, the densify distance of each
+polygon follows its typical width, estimated as 2 * area / perimeter (the width of a long corridor). The
+centerline is simplified by a quarter of the densify distance, which removes the staircase the Voronoi
+skeleton of the coarser densification leaves along it.
+"""
+
+import numpy as np
+import shapely
+
+MIN_DENSE = 0.1
+DENSE_FRACTION = 0.25
+TOLE_FRACTION = 0.25
+
+#Typical width of the polygons
+def estimate_width(polygons):
+    """Returns the typical width of each polygon, estimated as 2 * area / perimeter."""
+    polygons = np.asarray(polygons, dtype=object)
+    perimeter = shapely.length(polygons)
+    return np.divide(2 * shapely.area(polygons), perimeter, out=np.zeros(len(polygons)), where=perimeter > 0)
+
+#Densify and simplify tolerances per polygon
+def centerline_parameters(polygons, fraction=DENSE_FRACTION, min_dense=MIN_DENSE):
+    """
+    Picks the densify distance and simplify tolerance of the centerline of each polygon.
+
+    Parameters
+    ----------
+    polygons (GeoSeries or arraylike): A polygon or multipolygon
+    fraction (float): Densify distance as a fraction of the typical width. The default is 0.25.
+    min_dense (float): Smallest densify distance. The default is 0.1, the fixed default of create_centerline.
+
+    Returns
+    -------
+    dense (ndarray): Densify distance of each polygon. The distances are rounded down to steps of sqrt(2)
+        from min_dense, so that similar polygons share their parameters and can be processed together.
+    tole (ndarray): Simplify tolerance of each polygon, a quarter of the densify distance.
+
+    """
+    raw = np.maximum(estimate_width(polygons) * fraction, min_dense)
+    steps = np.floor(2 * np.log2(raw / min_dense))
+    dense = min_dense * 2 ** (steps / 2)
+    return dense, dense * TOLE_FRACTION
+
+#Centerlines with adaptive parameters
+def centerline(polygons, cache=None, fraction=DENSE_FRACTION, min_dense=MIN_DENSE):
+    """
+    Calculates the centerline of each polygon with the parameters picked by centerline_parameters. Polygons
+    that share their parameters are processed in one pygeoops call.
+
+    Returns
+    -------
+    lines (ndarray): The centerline of each polygon.
+    dense, tole (ndarray): The densify distance and simplify tolerance used for each polygon.
+
+    """
+    import pygeoops
+    polygons = np.asarray(polygons, dtype=object)
+    dense, tole = centerline_parameters(polygons, fraction, min_dense)
+    lines = np.empty(len(polygons), dtype=object)
+    for value in np.unique(dense):
+        group = np.flatnonzero(dense == value)
+        if cache is None:
+            lines[group] = pygeoops.centerline(polygons[group], densify_distance=value, simplifytolerance=value * TOLE_FRACTION)
+        else:
+            lines[group] = cache.centerline(polygons[group], float(value), float(value * TOLE_FRACTION))
+    return lines, dense, tole
@@ -0,0 +1,452 @@
+"""
+Benchmarks for the centerline and perpendicular line stages, run on synthetic road corridors.
+
+Usage: python benchmark.py                                  micro benchmarks of the optimized stages
+       python benchmark.py suite --tiers 1 10 100 -o a.json  per-stage suite over tiers of km of road
+       python benchmark.py compare a.json b.json             ratios between two suite results
+       python benchmark.py imports                           import time of the modules
+       python benchmark.py service --jobs 200 --concurrency 8 load test of the local service
+
+The suite generates a layer of road polygons per tier (see road and road_layer), runs every stage of the
+pipeline on it, and records the wall time, peak memory and feature and vertex counts of each stage in a JSON
+file, together with the commit and library versions, so that results can be compared between commits.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+import geopandas as gpd
+import centerperp as cp
+import dissolve
+import line_simplify
+import output
+import profiling
+import service
+from transects import clip_perpendiculars, perpendiculars, width_profile
+
+#Synthetic road corridor
+def corridor(length=1000, width=10, sinuosity=50, wavelength=200, step=5):
+    """Creates a winding road polygon of the given length and width, sampled every step metres."""
+    x = np.arange(0, length + step, step, dtype=float)
+    y = sinuosity * np.sin(2 * np.pi * x / wavelength)
+    return shapely.LineString(np.column_stack([x, y])).buffer(width / 2, cap_style="flat")
+
+#Synthetic road polygon with a given sinuosity
+def road(length=1000, width=10, sinuosity=1.05, vertices=None, wavelength=300, width_variation=0.1, seed=0):
+    """
+    Creates a road-like polygon whose centerline meanders with the given sinuosity.
+
+    Parameters
+    ----------
+    length (float): Length of the centerline, in metres. The default is 1000.
+    width (float): Mean width of the road. The default is 10.
+    sinuosity (float): Ratio of the centerline length to the distance between its ends, at least 1.
+        The default is 1.05.
+    vertices (int): Number of vertices on each side of the polygon. The default is one every 5 metres.
+    wavelength (float): Mean length of a meander. The default is 300.
+    width_variation (float): Amplitude of the width changes, as a fraction of the width. The default is 0.1.
+    seed (int): Seed of the random meanders and width changes. The default is 0.
+
+    Returns
+    -------
+    polygon (Polygon)
+
+    """
+    rng = np.random.default_rng(seed)
+    count = max(int(vertices or length / 5), 2)
+    s = np.linspace(0, length, count)
+    # The heading swings with random phases around a meander wavelength; its amplitude sets the sinuosity
+    waves = rng.uniform(0.5, 1.5, 4)
+    phases = rng.uniform(0, 2 * np.pi, 4)
+    swing = sum(np.sin(2 * np.pi * s / (wavelength * w) + p) for w, p in zip(waves, phases)) / 2
+    low, high = 0.0, np.pi / 2
+    for _ in range(50):
+        amplitude = (low + high) / 2
+        if 1 / np.mean(np.cos(amplitude * swing)) < sinuosity:
+            low = amplitude
+        else:
+            high = amplitude
+    heading = amplitude * swing
+    step = np.diff(s, prepend=0)
+    xy = np.column_stack([np.cumsum(step * np.cos(heading)), np.cumsum(step * np.sin(heading))])
+
+    half = width / 2 * (1 + width_variation * np.sin(2 * np.pi * s / (wavelength * rng.uniform(1, 3)) + rng.uniform(0, 2 * np.pi)))
+    normal = np.column_stack([-np.sin(heading), np.cos(heading)])
+    ring = np.concatenate([xy + half[:, None] * normal, (xy - half[:, None] * normal)[::-1]])
+    polygon = shapely.Polygon(ring)
+    return polygon if polygon.is_valid else shapely.make_valid(polygon)
+
+def road_layer(total_length=10000, piece_length=10000, width=10, sinuosity=1.05, step=5, seed=0):
+    """Creates a layer of separate roads of piece_length, total_length metres of road altogether, laid out in rows."""
+    count = max(int(np.ceil(total_length / piece_length)), 1)
+    length = total_length / count
+    polygons = [shapely.affinity.translate(road(length, width, sinuosity, length / step, seed=seed + i), 0, 500 * i)
+                for i in range(count)]
+    return gpd.GeoDataFrame({"name": [f"road {i}" for i in range(count)]}, geometry=polygons, crs=32651)
+
+def timed(func, *args, repeat=3, **kwargs):
+    """Returns the best wall time of func over a few runs, and its last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+#Clipping stage: gpd.overlay against the prepared polygon / STRtree path
+def bench_clip(length=10000, width=10, distance=10, interval=5):
+    gdf_polygon = gpd.GeoDataFrame(geometry=[corridor(length, width)], crs=32651)
+    gdf_lines = cp.create_centerline(gdf_polygon, dense=1)
+    perp, _, _, xy, _ = perpendiculars(gdf_lines.geometry, distance, interval)
+    raw = gpd.GeoDataFrame(geometry=perp, crs=gdf_polygon.crs)
+
+    # Both sides clip the same lines, the placement of the stations is not timed
+    overlay_time, overlay = timed(gpd.overlay, raw, gdf_polygon, how="intersection")
+    clip_time, (clipped, _, _) = timed(clip_perpendiculars, perp, xy, gdf_polygon.geometry)
+    print(f"clip    {len(perp):>8} transects | overlay {overlay_time:8.3f} s | clip_perpendiculars {clip_time:8.3f} s")
+    print(f"        mean width | overlay {overlay.length.mean():8.3f} m | clip_perpendiculars {shapely.length(clipped).mean():8.3f} m")
+
+#Removal of intersecting perpendicular lines, with and without thinning
+def bench_remove_intersect(length=10000, width=10, distance=10, interval=2):
+    gdf_polygon = gpd.GeoDataFrame(geometry=[corridor(length, width, sinuosity=80, wavelength=60)], crs=32651)
+    gdf_lines = cp.create_centerline(gdf_polygon, dense=1)
+    perp = cp.create_perp(gdf_polygon, gdf_lines, distance, interval)
+
+    remove_time, removed = timed(cp.remove_intersect, perp)
+    thin_time, thinned = timed(cp.remove_intersect, perp, thin=True)
+    print(f"remove  {len(perp):>8} transects | remove {remove_time:8.3f} s ({len(removed)} kept) | thin {thin_time:8.3f} s ({len(thinned)} kept)")
+
+def peak_memory(func, *args, **kwargs):
+    """Returns the peak memory allocated by func, in MB."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+#Width per station: create_perp against the array-only width_profile
+def bench_width(length=10000, width=10, distance=10, interval=5):
+    gdf_polygon = gpd.GeoDataFrame(geometry=[corridor(length, width)], crs=32651)
+    gdf_lines = cp.create_centerline(gdf_polygon, dense=1)
+
+    perp_time, perp = timed(cp.create_perp, gdf_polygon, gdf_lines, distance, interval)
+    profile_time, profile = timed(width_profile, gdf_polygon.geometry.values, gdf_lines.geometry.values, interval, distance)
+    perp_memory = peak_memory(cp.create_perp, gdf_polygon, gdf_lines, distance, interval)
+    profile_memory = peak_memory(width_profile, gdf_polygon.geometry.values, gdf_lines.geometry.values, interval, distance)
+    print(f"width   {len(perp):>8} stations   | create_perp {perp_time:8.3f} s {perp_memory:8.1f} MB"
+          f" | width_profile {profile_time:8.3f} s {profile_memory:8.1f} MB")
+
+def turning(line):
+    """Returns the number of vertices of a line and its total absolute turn in degrees, which a zigzag inflates."""
+    coords = shapely.get_coordinates(line)
+    heading = np.arctan2(*np.diff(coords, axis=0)[:, ::-1].T)
+    return len(coords), np.degrees(np.abs((np.diff(heading) + np.pi) % (2 * np.pi) - np.pi)).sum()
+
+#Adaptive densify distance against the fixed 0.1 m
+def bench_adaptive(length=1000, widths=(6, 10, 20)):
+    for width in widths:
+        gdf_polygon = gpd.GeoDataFrame(geometry=[corridor(length, width)], crs=32651)
+        base_time, base = timed(cp.create_centerline, gdf_polygon, repeat=1)
+        auto_time, auto = timed(cp.create_centerline, gdf_polygon, "auto", repeat=1)
+
+        # Deviation of the adaptive centerline from the baseline, sampled every metre
+        base_line, auto_line = base.geometry.values[0], auto.geometry.values[0]
+        samples = shapely.points(shapely.get_coordinates(shapely.segmentize(auto_line, 1)))
+        deviation = shapely.distance(samples, base_line)
+        (base_vertices, base_turn), (auto_vertices, auto_turn) = turning(base_line), turning(auto_line)
+        print(f"dense   {width:>6} m wide    | 0.1 m {base_time:8.3f} s | auto {auto['dense'][0]:5.2f} m {auto_time:8.3f} s"
+              f" | x{base_time / auto_time:6.1f} | mean {deviation.mean():6.3f} m"
+              f" | hausdorff {shapely.hausdorff_distance(auto_line, base_line):6.3f} m"
+              f" | vertices {base_vertices:>6} -> {auto_vertices:>6} | turn {base_turn:7.0f} -> {auto_turn:7.0f} deg")
+
+#Adaptive transect spacing against a fixed interval, at the same width fidelity
+def bench_spacing(length=10000, width=10, sinuosity=30, wavelength=800, distance=10):
+    polygon = corridor(length, width, sinuosity, wavelength)
+    centerline = cp.create_centerline(gpd.GeoDataFrame(geometry=[polygon], crs=32651), dense=1).geometry.values
+    reference = width_profile([polygon], centerline, 0.5, distance)
+    reference = reference[reference["route"] == 0]
+
+    for interval in (5, "auto"):
+        profile_time, profile = timed(width_profile, [polygon], centerline, interval, distance)
+        measured = np.isfinite(profile["width"]) & (profile["route"] == 0)
+        estimate = np.interp(reference["chainage"], profile["chainage"][measured], profile["width"][measured])
+        error = np.abs(estimate - reference["width"])[np.isfinite(reference["width"])]
+        print(f"spacing {str(interval):>8} interval | {len(profile):>8} stations {profile_time:8.3f} s"
+              f" | width error mean {error.mean():6.3f} m, p95 {np.percentile(error, 95):6.3f} m")
+
+#Smoothing throughput per 1,000 polygons
+def bench_smooth(count=1000, length=300, width=10, threads=4):
+    rng = np.random.default_rng(0)
+    offsets = rng.uniform(0, 100000, (count, 2))
+    polygon = corridor(length, width, step=1)
+    polygons = np.array([shapely.affinity.translate(polygon, *offset) for offset in offsets])
+    gdf = gpd.GeoDataFrame(geometry=polygons, crs=32651)
+
+    def per_row(gdf):
+        return gdf.geometry.apply(lambda geom: geom.buffer(5, quad_segs=40).buffer(-5, quad_segs=40).simplify(1, preserve_topology=True))
+
+    row_time, rows = timed(per_row, gdf, repeat=1)
+    vector_time, vector = timed(line_simplify.smoothen, gdf, repeat=1)
+    thread_time, _ = timed(line_simplify.smoothen, gdf, threads=threads, repeat=1)
+    fast_time, _ = timed(line_simplify.smoothen, gdf, preserve_topology=False, repeat=1)
+    difference = shapely.area(shapely.symmetric_difference(rows.values, vector.geometry.values)).sum() / shapely.area(rows.values).sum()
+    scale = 1000 / count
+    print(f"smooth  {count:>8} polygons   | per row, 40 {row_time * scale:8.3f} s | vectorized, auto {vector_time * scale:8.3f} s"
+          f" | {threads} threads {thread_time * scale:8.3f} s | without topology {fast_time * scale:8.3f} s (per 1,000)"
+          f" | area difference {difference:.2%}")
+
+#Write throughput of the output formats
+def bench_write(count=100000):
+    rng = np.random.default_rng(0)
+    start = rng.uniform(0, 100000, (count, 2))
+    end = start + rng.uniform(-10, 10, (count, 2))
+    perp = gpd.GeoDataFrame({"part": np.repeat(np.arange(count // 100 + 1), 100)[:count], "id": np.arange(count)},
+                            geometry=shapely.linestrings(np.stack([start, end], axis=1)), crs=32651)
+    perp["width"] = perp.geometry.length
+
+    for fmt in output.FORMATS:
+        with tempfile.TemporaryDirectory() as out_dir:
+            path = output.output_paths(out_dir, fmt)["perp"]
+            write_time, _ = timed(output.write_layer, perp, path, "perp", fmt, repeat=1)
+            size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+        print(f"write   {count:>8} transects | {fmt:<8} {write_time:8.3f} s | {count / write_time:10.0f} features/s | {size / 1e6:8.1f} MB")
+
+#Import time of the modules in a fresh interpreter
+HEAVY_MODULES = ("geopandas", "pandas", "pygeoops", "pyogrio", "pyproj", "pyarrow", "matplotlib")
+LIGHT_MODULES = ("transects", "line_simplify", "adaptive", "cache", "reproject", "tiling", "centerperp", "pipeline",
+                 "streaming", "incremental", "output", "profiling", "service", "store", "topology", "cli", "main")
+
+def import_time(module, repeat=3):
+    """Returns the best time to import a module in a new interpreter, and the heavy modules the import loaded."""
+    code = ("import sys, time; start = time.perf_counter(); import {}; print(time.perf_counter() - start); "
+            "print(','.join(name for name in {!r} if name in sys.modules))").format(module, HEAVY_MODULES)
+    best, loaded = float("inf"), ""
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        seconds, loaded = result.stdout.splitlines()
+        best = min(best, float(seconds))
+    return best, [name for name in loaded.split(",") if name]
+
+def bench_imports(modules=LIGHT_MODULES):
+    """
+    Prints the import time of the modules, and returns the modules whose import loaded one of HEAVY_MODULES.
+    These are imported by the stages that need them, so importing the pipeline, or unpickling a task in a
+    worker process, only costs shapely and numpy.
+    """
+    baseline, _ = import_time("shapely")
+    print(f"import  {'shapely, numpy':<16} {baseline * 1000:8.1f} ms")
+    offenders = []
+    for module in modules:
+        seconds, loaded = import_time(module)
+        print(f"import  {module:<16} {seconds * 1000:8.1f} ms" + (f" | loads {', '.join(loaded)}" if loaded else ""))
+        if loaded:
+            offenders.append(module)
+    return offenders
+
+#Per-stage suite
+def vertex_count(gdf):
+    return int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+def measure(stage, func, *args, repeat=1, memory=True):
+    """Runs one stage, and returns its result and a record of its best wall time, peak memory and output size."""
+    seconds, result = timed(func, *args, repeat=repeat)
+    record = {"stage": stage, "seconds": seconds}
+    if memory:
+        # Python and NumPy allocations, measured in a separate run as tracemalloc slows the stage down
+        record["peak_mb"] = peak_memory(func, *args)
+    # High-water mark of the process so far; tracemalloc does not see the memory allocated inside GEOS
+    record["max_rss_mb"] = profiling.max_rss_mb()
+    if hasattr(result, "geometry"):
+        record.update(features=len(result), vertices=vertex_count(result))
+    return result, record
+
+def run_suite(tiers=(1, 10, 100), piece_length=10000, width=10, sinuosity=1.05, step=5, dense="auto", tole=0.001,
+              distance=10, interval=5, repeat=1, memory=True):
+    """
+    Runs every stage of the pipeline on a road layer per tier.
+
+    Parameters
+    ----------
+    tiers (sequence): Total length of road of each tier, in km. The default is (1, 10, 100).
+    piece_length, width, sinuosity, step: See road_layer.
+    dense, tole, distance, interval: See pipeline.process. dense defaults to "auto".
+    repeat (int): Number of runs the best time of each stage is taken from. The default is 1.
+    memory (bool): Measure the peak memory of each stage too. The default is True.
+
+    Returns
+    -------
+    results (dict): The environment, the parameters and a record per tier and stage, ready for json.dump.
+
+    """
+    params = dict(piece_length=piece_length, width=width, sinuosity=sinuosity, step=step, dense=dense, tole=tole,
+                  distance=distance, interval=interval, repeat=repeat)
+    records = []
+    for tier in tiers:
+        layer = road_layer(tier * 1000, piece_length, width, sinuosity, step)
+        with tempfile.TemporaryDirectory() as out_dir:
+            path = os.path.join(out_dir, "input.gpkg")
+            layer.to_file(path)
+            stages = []
+            gdf, record = measure("read", gpd.read_file, path, repeat=repeat, memory=memory)
+            stages.append(record)
+            stages.append(measure("dissolve", dissolve.dissolve, gdf, repeat=repeat, memory=memory)[1])
+            smoothed, record = measure("smoothen", line_simplify.smoothen, gdf, repeat=repeat, memory=memory)
+            stages.append(record)
+            centerline, record = measure("centerline", cp.create_centerline, smoothed, dense, tole, repeat=repeat, memory=memory)
+            stages.append(record)
+            perp, record = measure("perp", cp.create_perp, smoothed, centerline, distance, interval, repeat=repeat, memory=memory)
+            stages.append(record)
+            stages.append(measure("remove_intersect", cp.remove_intersect, perp, repeat=repeat, memory=memory)[1])
+            layers = dict(zip(output.LAYERS, (smoothed, centerline, perp)))
+            stages.append(measure("write", output.write_outputs, layers, os.path.join(out_dir, "out"), "gpkg",
+                                  repeat=repeat, memory=memory)[1])
+        for record in stages:
+            record.update(tier_km=tier, input_features=len(layer), input_vertices=vertex_count(layer))
+            records.append(record)
+            print(f"{tier:>6} km | {record['stage']:<16} {record['seconds']:9.3f} s"
+                  + (f" {record['peak_mb']:9.1f} MB" if "peak_mb" in record else ""))
+    return {"environment": profiling.environment(), "params": params, "results": records}
+
+#Load test of the service
+def bench_service(jobs=200, concurrency=8, length=1000, width=10, workers=None, batch_size=16, batch_window=0.02,
+                  chunksize=4):
+    """
+    Starts the service on a free localhost port, sends jobs of one road each from concurrent clients and
+    waits for their results, and prints the client throughput and latency and the metrics of the service.
+    Returns the metrics, with the client figures under "client".
+    """
+    layers = [road_layer(length, length, width, seed=i).to_json() for i in range(min(jobs, 20))]
+    server = service.start(port=0, workers=workers, batch_size=batch_size, batch_window=batch_window,
+                           chunksize=chunksize)
+    url = f"http://127.0.0.1:{server.server_address[1]}/jobs?wait=1"
+
+    def send(i):
+        payload = {"geojson": json.loads(layers[i % len(layers)]), "crs": "EPSG:32651",
+                   "params": {"target_epsg": 32651, "dense": "auto"}}
+        request = urllib.request.Request(url, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as clients:
+            latencies = np.array(list(clients.map(send, range(jobs))))
+        seconds = time.perf_counter() - start
+        metrics = server.service.metrics()
+    finally:
+        service.stop(server)
+    metrics["client"] = {"jobs": jobs, "concurrency": concurrency, "seconds": seconds, "jobs_per_s": jobs / seconds,
+                         "p50_s": np.percentile(latencies, 50), "p95_s": np.percentile(latencies, 95)}
+    print(f"service {jobs:>6} jobs x {concurrency:>3} clients | {jobs / seconds:8.2f} jobs/s"
+          f" | p50 {metrics['client']['p50_s']:7.3f} s | p95 {metrics['client']['p95_s']:7.3f} s"
+          f" | {metrics['workers']} workers, {metrics['failed']} failed")
+    return metrics
+
+#Comparison of two suite results
+def compare(baseline, candidate, threshold=1.1):
+    """
+    Prints the time and memory ratio of every stage of two suite results, candidate over baseline, and
+    returns the stages that are slower than threshold times the baseline.
+    """
+    before = {(r["tier_km"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"{baseline['environment']['commit']} -> {candidate['environment']['commit']}")
+    for record in candidate["results"]:
+        key = (record["tier_km"], record["stage"])
+        if key not in before:
+            continue
+        ratio = record["seconds"] / max(before[key]["seconds"], 1e-9)
+        memory = ""
+        if "peak_mb" in record and "peak_mb" in before[key]:
+            memory = f" | memory x{record['peak_mb'] / max(before[key]['peak_mb'], 1e-9):6.2f}"
+        flag = " <- slower" if ratio > threshold else ""
+        print(f"{key[0]:>6} km | {key[1]:<16} {before[key]['seconds']:9.3f} s -> {record['seconds']:9.3f} s"
+              f" | x{ratio:6.2f}{memory}{flag}")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+def micro():
+    for length in (1000, 10000, 50000):
+        bench_clip(length)
+    for length in (1000, 10000, 50000):
+        bench_remove_intersect(length)
+    for length in (1000, 10000, 50000):
+        bench_width(length)
+    bench_adaptive()
+    bench_spacing()
+    bench_smooth()
+    bench_write()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the centerline and perpendicular line stages.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("micro", help="micro benchmarks of the optimized stages (the default)")
+    commands.add_parser("imports", help="import time of the modules; fails if one loads geopandas, pygeoops, ...")
+    suite = commands.add_parser("suite", help="per-stage timings and peak memory over tiers of km of road")
+    suite.add_argument("--tiers", type=float, nargs="+", default=[1, 10, 100],
+                       help="total km of road of each tier, up to 1000 (default: 1 10 100)")
+    suite.add_argument("--piece-length", type=float, default=10000, help="length of each road (default: 10000)")
+    suite.add_argument("--width", type=float, default=10, help="mean road width (default: 10)")
+    suite.add_argument("--sinuosity", type=float, default=1.05, help="road sinuosity (default: 1.05)")
+    suite.add_argument("--step", type=float, default=5, help="distance between the polygon vertices (default: 5)")
+    suite.add_argument("--dense", default="auto", help="densify distance of the centerline (default: auto)")
+    suite.add_argument("--repeat", type=int, default=1, help="runs per stage, the best is kept (default: 1)")
+    suite.add_argument("--no-memory", action="store_true", help="skip the peak memory runs")
+    suite.add_argument("-o", "--output", help="JSON file the results are written to")
+    load = commands.add_parser("service", help="load test of the local service, see service.py")
+    load.add_argument("--jobs", type=int, default=200, help="number of jobs (default: 200)")
+    load.add_argument("--concurrency", type=int, default=8, help="concurrent clients (default: 8)")
+    load.add_argument("--length", type=float, default=1000, help="length of the road of each job (default: 1000)")
+    load.add_argument("-j", "--workers", type=int, help="worker processes of the service (default: number of CPUs)")
+    load.add_argument("--batch-size", type=int, default=16, help="jobs batched at a time (default: 16)")
+    load.add_argument("--batch-window", type=float, default=0.02, help="batching window in seconds (default: 0.02)")
+    load.add_argument("-o", "--output", help="JSON file the metrics are written to")
+    diff = commands.add_parser("compare", help="compare two suite results")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--threshold", type=float, default=1.1,
+                      help="time ratio above which a stage counts as slower (default: 1.1)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "suite":
+        dense = args.dense if args.dense == "auto" else float(args.dense)
+        results = run_suite(args.tiers, args.piece_length, args.width, args.sinuosity, args.step, dense, repeat=args.repeat,
+                            memory=not args.no_memory)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=1)
+    elif args.command == "service":
+        metrics = bench_service(args.jobs, args.concurrency, args.length, workers=args.workers,
+                                batch_size=args.batch_size, batch_window=args.batch_window)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(metrics, file, indent=1, default=float)
+    elif args.command == "imports":
+        sys.exit(1 if bench_imports() else 0)
+    elif args.command == "compare":
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.candidate) as file:
+            candidate = json.load(file)
+        sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
+    else:
+        micro()
+
+if __name__ == "__main__":
+    main()
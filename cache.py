@@ -0,0 +1,112 @@
+"""
+On-disk cache of centerlines, so that re-runs with other perpendicular line parameters do not repeat the
+skeletonization. Entries are keyed by a hash of the polygon WKB and the centerline parameters, stored as WKB
+in SQLite, and evicted least recently used first once the cache grows beyond its size limit.
+"""
+
+import functools
+import hashlib
+import sqlite3
+import time
+import numpy as np
+import shapely
+
+class CenterlineCache:
+    """
+    Content-addressed centerline cache in a SQLite file. The cache can be shared by several processes,
+    and its hit and miss counters are kept in the file.
+
+    Parameters
+    ----------
+    path (str): Path of the SQLite file
+    max_bytes (int): Size limit of the stored centerlines. The default is 1 GB.
+
+    """
+
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS centerlines "
+                                    "(key TEXT PRIMARY KEY, wkb BLOB, size INTEGER, accessed REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS centerlines_accessed ON centerlines (accessed)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+            self.connection.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+            self.evict()
+
+    @staticmethod
+    def key(wkb, dense, tole):
+        """Returns the cache key of a polygon WKB and the centerline parameters."""
+        return hashlib.sha256(wkb + repr((dense, tole)).encode()).hexdigest()
+
+    def get(self, keys):
+        """Returns the centerline WKB of each key, or None where it is not cached."""
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT key, wkb FROM centerlines WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            found.update(rows)
+        hits = len([key for key in keys if key in found])
+        with self.connection:
+            self.connection.executemany("UPDATE centerlines SET accessed = ? WHERE key = ?",
+                                        [(time.time(), key) for key in found])
+            self.connection.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (hits,))
+            self.connection.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (len(keys) - hits,))
+        return [found.get(key) for key in keys]
+
+    def put(self, keys, wkbs):
+        """Stores the centerline WKB of each key, and evicts the least recently used entries beyond the size limit."""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO centerlines VALUES (?, ?, ?, ?)",
+                                        [(key, wkb, len(wkb), now) for key, wkb in zip(keys, wkbs)])
+            self.evict()
+
+    def evict(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM centerlines").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM centerlines ORDER BY accessed")
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM centerlines WHERE key = ?", evicted)
+
+    def stats(self):
+        """Returns the hit and miss counters, the number of entries and their size in bytes."""
+        stats = dict(self.connection.execute("SELECT name, value FROM stats"))
+        stats["entries"], stats["bytes"] = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM centerlines").fetchone()
+        return stats
+
+    def close(self):
+        self.connection.close()
+
+    #Centerlines, computed only for the polygons that are not cached
+    def centerline(self, polygons, dense=0.1, tole=0.001):
+        """Returns the centerline of each polygon, like pygeoops.centerline, using the cache where possible."""
+        polygons = np.asarray(polygons, dtype=object)
+        keys = [self.key(wkb, dense, tole) for wkb in shapely.to_wkb(polygons)]
+        wkbs = self.get(keys)
+        missing = [i for i, wkb in enumerate(wkbs) if wkb is None]
+        if missing:
+            import pygeoops
+            lines = pygeoops.centerline(polygons[missing], densify_distance=dense, simplifytolerance=tole)
+            lines = np.asarray(lines, dtype=object)
+            lines[shapely.is_missing(lines)] = shapely.LineString()
+            computed = shapely.to_wkb(lines)
+            self.put([keys[i] for i in missing], computed)
+            for i, wkb in zip(missing, computed):
+                wkbs[i] = wkb
+        return shapely.from_wkb(wkbs)
+
+@functools.lru_cache(maxsize=None)
+def open_cache(path, max_bytes=1 << 30):
+    """Returns the cache of a path, opened once per process."""
+    return CenterlineCache(path, max_bytes)
@@ -1,73 +1,47 @@
-import geopandas as gpd
-import pygeoops
-from shapely.geometry import LineString, MultiLineString
-import numpy as np
+import adaptive
+import profiling
+import topology
+from transects import perpendiculars, clip_perpendiculars, non_intersecting, part_routes
 
 #Create polygon centerline 
-def create_centerline(gdf_polygon, dense = 0.1, tole = 0.001):
-    """Creates the centerline of the polygon."""
-    gdf_lines = pygeoops.centerline(gdf_polygon.geometry, densify_distance=dense, simplifytolerance=tole)
+def create_centerline(gdf_polygon, dense = 0.1, tole = 0.001, cache=None):
+    """Creates the centerline of the polygon. With dense="auto", the densify distance and tolerance are picked per polygon (see adaptive.py) and reported in the dense and tole columns."""
+    import geopandas as gpd
+    if dense == "auto":
+        lines, dense, tole = adaptive.centerline(gdf_polygon.geometry, cache)
+        return gpd.GeoDataFrame({"dense": dense, "tole": tole}, geometry=lines, crs=gdf_polygon.crs)
+    if cache is None:
+        import pygeoops
+        gdf_lines = pygeoops.centerline(gdf_polygon.geometry, densify_distance=dense, simplifytolerance=tole)
+    else:
+        gdf_lines = cache.centerline(gdf_polygon.geometry, dense, tole)
     gdf_lines = gpd.GeoDataFrame(geometry=gdf_lines, crs=gdf_polygon.crs)
     
     return gdf_lines
 
-#Create perpendicular lines
-def create_perp(gdf_polygon, gdf_lines, distance=10, interval=5):
-    """Create a series of perpendicular lines at specified intervals from each line feature in a GeoDataFrame."""
-    new_perp = []
-
-    for idx, row in gdf_lines.iterrows():
-        geom = row.geometry
-        
-        if isinstance(geom, LineString):
-            length = geom.length
-            num_lines = int(length // interval) + 1  # Calculate number of perpendicular lines based on interval
-
-            for i in range(num_lines):
-                position = i * interval
-                point = geom.interpolate(position)
-
-                # Find the next point along the line to determine the direction
-                next_position = min(position + interval, length)
-                next_point = geom.interpolate(next_position)
-                direction = np.array(next_point.coords[0]) - np.array(point.coords[0])
-                angle = np.arctan2(direction[1], direction[0])
-                perp_angle = angle + np.pi / 2
-
-                # Create the perpendicular line
-                perp_start = np.array(point.coords[0]) + distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-                perp_end = np.array(point.coords[0]) - distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-
-                perpendicular_line = LineString([tuple(perp_start), tuple(perp_end)])
-                new_perp.append(perpendicular_line)
+#Prune centerline spurs
+def prune_centerline(gdf_polygon, gdf_lines, factor=topology.PRUNE_FACTOR):
+    """Prunes the spurs of each centerline shorter than factor times the polygon width where they branch off, and merges the rest into routes (see topology.py). The pruned length is reported in the pruned_len column."""
+    lines, removed = topology.prune(gdf_lines.geometry.values, gdf_polygon.geometry.values, factor)
+    gdf_lines = gdf_lines.set_geometry(lines, crs=gdf_lines.crs)
+    gdf_lines['pruned_len'] = removed
 
-        elif isinstance(geom, MultiLineString):
-            for line in geom.geoms:
-                length = line.length
-                num_lines = int(length // interval) + 1  # Calculate number of perpendicular lines based on interval
-
-                for i in range(num_lines):
-                    position = i * interval
-                    point = line.interpolate(position)
-
-                    next_position = min(position + interval, length)
-                    next_point = line.interpolate(next_position)
-                    direction = np.array(next_point.coords[0]) - np.array(point.coords[0])
-                    angle = np.arctan2(direction[1], direction[0])
-                    perp_angle = angle + np.pi / 2
-
-                    # Create the perpendicular line
-                    perp_start = np.array(point.coords[0]) + distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-                    perp_end = np.array(point.coords[0]) - distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
+    return gdf_lines
 
-                    perpendicular_line = LineString([tuple(perp_start), tuple(perp_end)])
-                    new_perp.append(perpendicular_line)
-        else:
-            raise ValueError("Unsupported geometry type")
-    new_perp = gpd.GeoDataFrame(geometry=new_perp, crs=gdf_polygon.crs)
-    new_perp = gpd.overlay(new_perp, gdf_polygon, how='intersection')    
+#Create perpendicular lines
+def create_perp(gdf_polygon, gdf_lines, distance=10, interval=5, profiler=None):
+    """Create a series of perpendicular lines at specified intervals ("auto" for adaptive spacing) from each line feature in a GeoDataFrame. The route column is the part of the centerline each line is placed on, numbered from 0 for the longest, and chainage its distance along that part. With a profiler, the placement of the lines and their clipping are recorded as the stations and clip stages."""
+    import geopandas as gpd
+    perp, _, chainage, xy, part = profiling.run(profiler, "stations", perpendiculars, gdf_lines.geometry, distance,
+                                                interval, gdf_polygon.geometry)
+    route = part_routes(gdf_lines.geometry)[part]
+    perp, perp_index, poly_index = profiling.run(profiler, "clip", clip_perpendiculars, perp, xy, gdf_polygon.geometry)
+    attributes = gdf_polygon.drop(columns=gdf_polygon.geometry.name).iloc[poly_index].reset_index(drop=True)
+    new_perp = gpd.GeoDataFrame(attributes, geometry=perp, crs=gdf_polygon.crs)
     new_perp['id'] = range(len(new_perp))
     new_perp['width'] = new_perp.geometry.length
+    new_perp['route'] = route[perp_index]
+    new_perp['chainage'] = chainage[perp_index]
     
     return new_perp
 
@@ -80,20 +54,9 @@ def print_width(gdf):
         print(f"Length: {geom.length:.3f} meters")
 
 #Removes perpendicular lines that intersect with other lines
-def remove_intersect(gdf):
+def remove_intersect(gdf, thin=False):
     """Remove intersecting lines from the GeoDataFrame."""
-    non_intersecting_lines = []
-    
-    for i, geom1 in enumerate(gdf.geometry):
-        intersects = False
-        for j, geom2 in enumerate(gdf.geometry):
-            if i != j and geom1.intersects(geom2):
-                intersects = True
-                break
-        if not intersects:
-            non_intersecting_lines.append(geom1)
-    
-    return gpd.GeoDataFrame(geometry=non_intersecting_lines, crs=gdf.crs)
+    return gdf[non_intersecting(gdf.geometry, thin)]
 
 #≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈
 #≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈
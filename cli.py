@@ -0,0 +1,271 @@
+"""
+Command line interface that processes whole directories of delineations in one interpreter.
+
+Usage: python cli.py INPUT [INPUT ...] -o OUTPUT_DIR [options]
+
+Each input is a file, a directory (all .shp and .gpkg files inside it) or a glob pattern. The outputs of
+an input are written to OUTPUT_DIR/<input path>/, its path relative to the argument it was found by (the
+directory, the folder of the file, or the directory a glob pattern starts from), extension included, so an
+input has the same outputs whichever other inputs it is run with. Inputs whose outputs are newer than the
+input are skipped. An input that fails is
+reported at the end and does not stop the others.
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import cache
+import incremental
+import centerperp as cp
+import output
+import pipeline
+import profiling
+import store
+import streaming
+import topology
+
+INPUT_EXTENSIONS = (".shp", ".gpkg")
+
+def pattern_root(pattern):
+    """Returns the directory a glob pattern starts from: the folder of its part before the first wildcard."""
+    prefix = re.split(r"[*?[]", pattern, maxsplit=1)[0]
+    return os.path.abspath(os.path.dirname(prefix) or os.curdir)
+
+def find_inputs(patterns):
+    """
+    Expands files, directories and glob patterns into the input files, sorted, and returns the directory the
+    outputs of each input are placed relative to: the directory or the start of the glob pattern it was found
+    by, or its folder for a file. An input found by several arguments keeps the first.
+    """
+    files = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))
+                     if name.lower().endswith(INPUT_EXTENSIONS)]
+            root = os.path.abspath(pattern)
+        elif glob.has_magic(pattern):
+            found = [path for path in sorted(glob.glob(pattern)) if os.path.isfile(path)]
+            root = pattern_root(pattern)
+        else:
+            found = [pattern] if os.path.isfile(pattern) else []
+            root = None
+        for path in found:
+            files.setdefault(path, root)
+    return dict(sorted(files.items()))
+
+def output_dir(input_file, output_root, root=None):
+    """
+    Returns the output directory of an input: its path relative to root, extension included, under output_root,
+    so that inputs with the same name in other folders or formats do not share outputs. root is the folder of
+    the input by default.
+    """
+    path = os.path.abspath(input_file)
+    root = os.path.dirname(path) if root is None else root
+    relative = os.path.relpath(path, root) if root else os.path.splitdrive(path)[1].lstrip("\\/")
+    return os.path.join(output_root, relative)
+
+def output_paths(out_dir, fmt):
+    return sorted(set(output.output_paths(out_dir, fmt).values()))
+
+def is_up_to_date(input_file, paths):
+    """Returns True if all outputs exist and are newer than the input."""
+    if not all(os.path.exists(path) for path in paths):
+        return False
+    return min(os.path.getmtime(path) for path in paths) >= os.path.getmtime(input_file)
+
+#Processes one input file
+def process_file(input_file, out_dir, params, fmt="shp", remove_intersect=False, thin=False, split=None, workers=None,
+                 chunksize=1, report=False, profile=False, trace_memory=False, transect_store=False):
+    import geopandas as gpd
+    profiler = make_profiler(out_dir, report, profile, trace_memory)
+    run = profiling.run
+    gdf_poly = run(profiler, "read", gpd.read_file, input_file)
+    simplify_poly, centerline, perp_lines = pipeline.process(gdf_poly, **params, split=split, workers=workers, chunksize=chunksize,
+                                                             profiler=profiler)
+    if remove_intersect or thin:
+        perp_lines = run(profiler, "remove_intersect", cp.remove_intersect, perp_lines, thin=thin)
+
+    run(profiler, "write", output.write_outputs, dict(zip(output.LAYERS, (simplify_poly, centerline, perp_lines))), out_dir, fmt)
+    if transect_store:
+        run(profiler, "store", store.write, os.path.join(out_dir, store.STORE), perp_lines, centerline)
+    write_report(profiler, out_dir, input_file, params)
+    return len(perp_lines)
+
+def make_profiler(out_dir, report=False, profile=False, trace_memory=False):
+    """Returns a StageProfiler if a run report is wanted, or None."""
+    if not (report or profile or trace_memory):
+        return None
+    return profiling.StageProfiler(profile, trace_memory, os.path.join(out_dir, "profile") if profile else None)
+
+def write_report(profiler, out_dir, input_file, params):
+    if profiler is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        profiler.write(os.path.join(out_dir, profiling.REPORT), input=input_file, params=params)
+
+def _attempt(func, *args, **kwargs):
+    """Returns the result of func and None, or None and the error it raised, so one bad input does not stop a batch."""
+    try:
+        return func(*args, **kwargs), None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+def _process_file(args):
+    return _attempt(process_file, *args)
+
+def _update(path, out_dir, **kwargs):
+    import geopandas as gpd
+    return incremental.update(gpd.read_file(path), out_dir, **kwargs)
+
+def _stream_file(path, out_dir, args, fmt, params):
+    profiler = make_profiler(out_dir, args.report, args.profile, args.trace_memory)
+    count = streaming.stream_file(path, out_dir, args.batch_size, fmt, args.split or "components", args.workers,
+                                  args.chunksize, args.remove_intersect, args.thin, profiler, **params)
+    write_report(profiler, out_dir, path, params)
+    return count
+
+def dense_type(value):
+    return value if value == "auto" else float(value)
+
+def epsg_type(value):
+    return value if value == "utm" else int(value)
+
+def interval_type(value):
+    if ":" in value:
+        return tuple(float(bound) for bound in value.split(":"))
+    return dense_type(value)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Creates the centerline and perpendicular lines of polygon delineations.")
+    parser.add_argument("inputs", nargs="+", help="input files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", required=True, help="directory the outputs are written to")
+    parser.add_argument("--dense", type=dense_type, default=0.1,
+                        help="densify distance of the centerline, or auto to pick it per polygon (default: 0.1)")
+    parser.add_argument("--tole", type=float, default=0.001, help="simplify tolerance of the centerline (default: 0.001)")
+    parser.add_argument("--distance", type=float, default=10, help="half length of the perpendicular lines (default: 10)")
+    parser.add_argument("--interval", type=interval_type, default=5,
+                        help="interval between perpendicular lines, or auto or MIN:MAX to space them by the curvature "
+                             "and width changes of the centerline, see transects.py (default: 5)")
+    parser.add_argument("--buffer-distance", type=float, default=5, help="buffer distance of the smoothing (default: 5)")
+    parser.add_argument("--simplify-tolerance", type=float, default=1, help="simplify tolerance of the smoothing (default: 1)")
+    parser.add_argument("--epsg", type=epsg_type, default=32651,
+                        help="EPSG code of the projected CRS, or utm for the UTM zone of the data (default: 32651)")
+    parser.add_argument("--to-source", action="store_true",
+                        help="write the outputs in the CRS of the input; with --split and --epsg utm, each part is "
+                             "processed in its own UTM zone")
+    parser.add_argument("--format", choices=tuple(output.FORMATS),
+                        help="output format, see output.py (default: shp, or gpkg with --batch-size or --incremental)")
+    parser.add_argument("--tile-size", type=float, help="tile the centerline of polygons longer than this, see tiling.py")
+    parser.add_argument("--tile-overlap", type=float, default=200, help="overlap of the tiles (default: 200)")
+    parser.add_argument("--prune", type=float, nargs="?", const=topology.PRUNE_FACTOR,
+                        help="prune the centerline spurs shorter than PRUNE times the polygon width, see topology.py"
+                             f" (default when given: {topology.PRUNE_FACTOR})")
+    parser.add_argument("--cache", help="SQLite file caching the centerlines across runs, see cache.py")
+    parser.add_argument("--cache-size", type=float, default=1024, help="size limit of the cache in MB (default: 1024)")
+    parser.add_argument("--remove-intersect", action="store_true", help="remove intersecting perpendicular lines")
+    parser.add_argument("--thin", action="store_true", help="keep one perpendicular line per crossing cluster")
+    parser.add_argument("--split", choices=("components", "features"),
+                        help="split each input into parts and process them in the worker pool")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes, for the parts with --split or else for the files (default: 1)")
+    parser.add_argument("--chunksize", type=int, default=1, help="parts or files sent to a worker at a time (default: 1)")
+    parser.add_argument("--batch-size", type=int,
+                        help="stream each input in batches of this many features, see streaming.py")
+    parser.add_argument("--incremental", action="store_true",
+                        help="recompute only the changed components and patch the GeoPackage, see incremental.py")
+    parser.add_argument("--report", action="store_true",
+                        help=f"write a {profiling.REPORT} with the time, memory and counts of every stage next to the outputs")
+    parser.add_argument("--profile", action="store_true",
+                        help="add the top functions of a cProfile of every stage to the report, and write the stats to profile/")
+    parser.add_argument("--trace-memory", action="store_true", help="add the tracemalloc peak of every stage to the report")
+    parser.add_argument("--store", action="store_true",
+                        help="also write a memory-mapped transect store for width queries, see store.py")
+    parser.add_argument("-f", "--force", action="store_true", help="process inputs whose outputs are up to date")
+    args = parser.parse_args(argv)
+
+    # Options the streaming and incremental runs do not support are refused rather than ignored
+    if args.incremental:
+        unsupported = [flag for flag, value in (("--batch-size", args.batch_size), ("--store", args.store),
+                                                ("--report", args.report), ("--profile", args.profile),
+                                                ("--trace-memory", args.trace_memory)) if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --incremental")
+        if args.format not in (None, "gpkg"):
+            parser.error("--incremental patches a GeoPackage, --format must be gpkg")
+    elif args.batch_size:
+        if args.store:
+            parser.error("--store cannot be used with --batch-size")
+        if args.format is not None and args.format not in output.APPENDABLE:
+            parser.error(f"--batch-size appends to the outputs, --format must be one of {', '.join(output.APPENDABLE)}")
+    if args.format is None:
+        args.format = "gpkg" if args.batch_size or args.incremental else "shp"
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format
+    params = dict(dense=args.dense, tole=args.tole, distance=args.distance, interval=args.interval,
+                  buffer_distance=args.buffer_distance, simplify_tolerance=args.simplify_tolerance,
+                  target_epsg=args.epsg, cache=args.cache, cache_size=int(args.cache_size * 1e6),
+                  tile_size=args.tile_size, tile_overlap=args.tile_overlap, prune=args.prune,
+                  to_source=args.to_source)
+
+    executor = None
+    inputs = find_inputs(args.inputs)
+    out_dirs = {path: output_dir(path, args.output_dir, root) for path, root in inputs.items()}
+    shared = {}
+    for path, out_dir in out_dirs.items():
+        shared.setdefault(os.path.normcase(os.path.abspath(out_dir)), []).append(path)
+    shared = [paths for paths in shared.values() if len(paths) > 1]
+    if shared:
+        sys.exit("Inputs found by different arguments would share their outputs: "
+                 + "; ".join(", ".join(paths) for paths in shared))
+    todo = [path for path in inputs
+            if args.force or args.incremental or not is_up_to_date(path, output_paths(out_dirs[path], fmt))]
+    print(f"{len(inputs)} inputs, {len(inputs) - len(todo)} up to date")
+
+    if args.incremental:
+        results = (_attempt(_update, path, out_dirs[path], workers=args.workers, chunksize=args.chunksize,
+                            remove_intersect=args.remove_intersect, thin=args.thin, **params) for path in todo)
+        message = "{added} components recomputed, {removed} removed, {unchanged} unchanged"
+    elif args.batch_size:
+        results = (_attempt(_stream_file, path, out_dirs[path], args, fmt, params) for path in todo)
+        message = "{} perpendicular lines"
+    elif args.split or args.workers <= 1:
+        results = (_attempt(process_file, path, out_dirs[path], params, fmt, args.remove_intersect, args.thin,
+                            args.split, args.workers, args.chunksize, args.report, args.profile, args.trace_memory,
+                            args.store)
+                   for path in todo)
+        message = "{} perpendicular lines"
+    else:
+        tasks = [(path, out_dirs[path], params, fmt, args.remove_intersect, args.thin, None, 1, 1,
+                  args.report, args.profile, args.trace_memory, args.store) for path in todo]
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = executor.map(_process_file, tasks, chunksize=args.chunksize)
+        message = "{} perpendicular lines"
+
+    failures = []
+    for path, (result, error) in zip(todo, results):
+        if error is not None:
+            failures.append((path, error))
+            print(f"{path}: failed, {error}")
+        elif isinstance(result, dict):
+            print(f"{path}: " + message.format(**result))
+        else:
+            print(f"{path}: " + message.format(result))
+    if executor is not None:
+        executor.shutdown()
+
+    if args.cache:
+        print("centerline cache: {hits} hits, {misses} misses, {entries} entries, {bytes} bytes".format(
+            **cache.open_cache(args.cache, params["cache_size"]).stats()))
+    if failures:
+        print(f"{len(failures)} of {len(todo)} inputs failed:")
+        for path, error in failures:
+            print(f"  {path}: {error}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
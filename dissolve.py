@@ -1,5 +1,3 @@
-import geopandas as gpd    # Used only for debugging
-
 # Loop through all files in the input folder
 def dissolve(input_file):
     
@@ -0,0 +1,167 @@
+"""
+Incremental reprocessing of a polygon layer whose outputs were written before. Every feature is hashed by its
+geometry, and every connected component of the dissolved layer by the hashes of its features and the
+processing parameters. A manifest in the output directory records the components of the last run, so a re-run
+only recomputes the components that are new or whose features changed, and patches the outputs in place: the
+rows of the stale components are deleted from the GeoPackage and the recomputed rows are appended.
+
+A changed feature invalidates its whole component, as the dissolve merges it with every feature it touches.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import numpy as np
+import shapely
+import centerperp as cp
+import output
+import pipeline
+import reproject
+
+MANIFEST = "manifest.json"
+VERSION = 1
+# Parameters that do not change the outputs are left out of the component keys
+UNKEYED = ("cache", "cache_size")
+
+#Hash of each feature
+def feature_hashes(gdf_poly):
+    """Returns the sha256 hex digest of the WKB of each feature geometry."""
+    wkbs = shapely.to_wkb(gdf_poly.geometry.values, hex=False)
+    return [hashlib.sha256(wkb).hexdigest() for wkb in wkbs]
+
+#Component of each feature
+def component_members(gdf_poly, parts):
+    """
+    Returns the components each feature of the layer falls in, as a list of feature positions per component.
+    Each polygon of a feature is assigned by a point on its surface, so a multipolygon feature can belong to
+    several components.
+    """
+    polygons, feature = shapely.get_parts(gdf_poly.geometry.values, return_index=True)
+    points = shapely.point_on_surface(polygons)
+    point, component = shapely.STRtree(parts.geometry.values).query(points, predicate="within")
+    members = [set() for _ in range(len(parts))]
+    for i, j in zip(feature[point], component):
+        members[j].add(int(i))
+    return [sorted(m) for m in members]
+
+def component_keys(members, hashes, params):
+    """Returns the key of each component, a hash of the sorted hashes of its features and the parameters."""
+    salt = json.dumps({name: value for name, value in params.items() if name not in UNKEYED}, sort_keys=True)
+    return [hashlib.sha256("\n".join(sorted(hashes[i] for i in m) + [salt]).encode()).hexdigest() for m in members]
+
+def load_manifest(out_dir):
+    """Returns the manifest of the last run in the output directory, or None if there is none."""
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        manifest = json.load(file)
+    return manifest if manifest.get("version") == VERSION else None
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".partial", "w") as file:
+        json.dump(manifest, file)
+    os.replace(path + ".partial", path)
+
+def delete_components(path, keys):
+    """Deletes the rows of the given components from every output layer of the GeoPackage."""
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            for layer in output.LAYERS:
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{layer}_component" ON "{layer}" (component)')
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    connection.execute(f'DELETE FROM "{layer}" WHERE component IN ({",".join("?" * len(chunk))})', chunk)
+    finally:
+        connection.close()
+
+#Re-runs the pipeline on the changed components only
+def update(gdf_poly, out_dir, target_epsg=32651, workers=None, chunksize=1, remove_intersect=False, thin=False,
+           to_source=False, **params):
+    """
+    Brings the outputs in out_dir up to date with the polygon layer, recomputing only the components that were
+    added or changed since the last run. The outputs are written to a GeoPackage (see output.py) whose layers
+    have a component column with the key of the component each row was derived from; part and id of the
+    recomputed rows continue after those of the previous runs.
+
+    Parameters
+    ----------
+    gdf_poly (GeoDataFrame): A polygon or multipolygon layer
+    out_dir (str): Directory of the outputs and the manifest
+    target_epsg, workers, chunksize, to_source: See pipeline.process. With "utm", the components are keyed on
+        the zone of the whole layer, and the outputs are rewritten when the layer moves to another zone.
+    remove_intersect, thin (bool): Remove intersecting perpendicular lines, see centerperp.remove_intersect.
+        The lines are compared within the recomputed components. The default is False.
+    **params: The processing parameters, see pipeline.parameters.
+
+    Returns
+    -------
+    stats (dict): Numbers of added, removed and unchanged components.
+
+    """
+    import pyproj
+    params = pipeline.parameters(**params)
+    path = output.output_paths(out_dir, "gpkg")[output.LAYERS[0]]
+    # "utm" is keyed on the zone it resolves to, so components are recomputed when the layer moves to another zone
+    target = reproject.target_crs(gdf_poly, target_epsg)
+    target = target if isinstance(target, int) else pyproj.CRS.from_user_input(target).to_string()
+    reprojected = reproject.reproject_crs(gdf_poly, target)
+    parts = pipeline.split_parts(reprojected, "components")
+    members = component_members(reprojected, parts)
+    hashes = feature_hashes(gdf_poly)
+    keys = component_keys(members, hashes, dict(params, target_epsg=target, to_source=to_source))
+    crs = pyproj.CRS.from_user_input(gdf_poly.crs if to_source else target).to_string()
+
+    manifest = load_manifest(out_dir)
+    # The layers declare a single CRS, so outputs in another CRS are written from scratch
+    dropped = 0
+    if manifest is not None and manifest.get("crs", crs) != crs:
+        dropped = len(manifest["components"])
+        manifest = None
+    if manifest is None or not os.path.exists(path):
+        manifest = {"version": VERSION, "components": {}, "next_part": 0, "next_id": 0}
+        if os.path.exists(path):
+            os.remove(path)
+    manifest["crs"] = crs
+    known = manifest["components"]
+    added = [i for i, key in enumerate(keys) if key not in known]
+    removed = sorted(set(known) - set(keys))
+    if not added and not removed:
+        return {"added": 0, "removed": 0, "unchanged": len(keys)}
+
+    simplify_poly, centerline, perp_lines = pipeline.process_parts(parts.iloc[added], params, workers, chunksize)
+    if (remove_intersect or thin) and len(perp_lines):
+        perp_lines = cp.remove_intersect(perp_lines, thin=thin)
+    if to_source:
+        simplify_poly, centerline, perp_lines = (reproject.reproject_crs(gdf, gdf_poly.crs)
+                                                 for gdf in (simplify_poly, centerline, perp_lines))
+    component = np.array([keys[i] for i in added], dtype=object)
+    simplify_poly.insert(0, "component", component)
+    centerline.insert(0, "component", component[centerline["part"].to_numpy()])
+    perp_lines.insert(0, "component", component[perp_lines["part"].to_numpy()])
+    simplify_poly["part"] += manifest["next_part"]
+    centerline["part"] += manifest["next_part"]
+    perp_lines["part"] += manifest["next_part"]
+    perp_lines["id"] += manifest["next_id"]
+
+    os.makedirs(out_dir, exist_ok=True)
+    exists = os.path.exists(path)
+    if exists:
+        # The added components are deleted too, in case an interrupted run appended them already
+        delete_components(path, removed + [keys[i] for i in added])
+    if added:
+        for layer, gdf in zip(output.LAYERS, (simplify_poly, centerline, perp_lines)):
+            output.write_layer(gdf, path, layer, "gpkg", append=exists, promote_to_multi=True)
+
+    for key in removed:
+        del known[key]
+    for i in added:
+        known[keys[i]] = [hashes[j] for j in members[i]]
+    manifest["next_part"] += len(added)
+    if len(perp_lines):
+        manifest["next_id"] = int(perp_lines["id"].max()) + 1
+    save_manifest(out_dir, manifest)
+    return {"added": len(added), "removed": len(removed) + dropped, "unchanged": len(keys) - len(added)}
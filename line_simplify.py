@@ -1,58 +1,132 @@
-import geopandas as gpd
-from shapely.geometry import Polygon, MultiPolygon
-import matplotlib.pyplot as plt
+"""
+Smoothing of polygons: a buffer out and back in by the same distance rounds off the corners and fills the
+notches, and a simplification then removes the extra vertices. The whole geometry array is processed at once
+with shapely's vectorized functions, optionally split over threads (shapely releases the GIL).
 
-# Path to the input shapefile
-input_shapefile = (".shp")
+Run as a script to smooth a shapefile and plot the result over the original geometries.
+"""
 
-# Read the shapefile into a GeoDataFrame
-try:
-    gdf = gpd.read_file(input_shapefile)
-except Exception as e:
-    print(f"Error reading shapefile: {e}")
-    raise
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+
+POLYGON_TYPES = (3, 6)  # Polygon, MultiPolygon
+
+#Quadrant resolution of the buffer
+def auto_resolution(buffer_distance, simplify_tolerance, max_resolution=40):
+    """
+    Returns the lowest number of segments per quarter circle whose deviation from the arc stays below a
+    quarter of the simplify tolerance, as finer arcs are removed again by the simplification.
+    """
+    max_error = simplify_tolerance / 4
+    if buffer_distance <= max_error:
+        return 1
+    angle = 2 * np.arccos(1 - max_error / abs(buffer_distance))
+    return int(min(max(np.ceil(np.pi / 2 / angle), 1), max_resolution))
+
+def smooth(geoms, buffer_distance=5, simplify_tolerance=1, resolution="auto", threads=1, preserve_topology=True):
+    """
+    Smooths an array of geometries. Geometries other than polygons are returned as they are.
+
+    Parameters
+    ----------
+    geoms (GeoSeries or arraylike): Polygons or multipolygons
+    buffer_distance (float): Radius of the buffer in the Minkowski sum (or difference)
+    simplify_tolerance (float): All parts of a simplified geometry will be no more than tolerance distance from
+        the original.
+    resolution (int or str): Number of linear segments in a quarter circle of the buffer, or "auto" to derive it
+        from the buffer distance and the simplify tolerance (see auto_resolution). The default is "auto".
+    threads (int): Number of threads the array is split over. The default is 1.
+    preserve_topology (bool): Simplify without letting rings collapse or cross, as a single geometry's simplify
+        does. With False, the faster plain Douglas-Peucker is used and only the geometries it makes invalid or
+        empty are simplified preserving topology, so small holes and narrow parts may vanish. The default is True.
+
+    Returns
+    -------
+    smoothed (ndarray)
+
+    """
+    geoms = np.array(geoms, dtype=object)
+    if resolution == "auto":
+        resolution = auto_resolution(buffer_distance, simplify_tolerance)
+    polygons = np.flatnonzero(np.isin(shapely.get_type_id(geoms), POLYGON_TYPES) & ~shapely.is_empty(geoms))
+
+    def smooth_chunk(chunk):
+        chunk = shapely.buffer(chunk, buffer_distance, quad_segs=resolution)
+        chunk = shapely.buffer(chunk, -buffer_distance, quad_segs=resolution)
+        if preserve_topology:
+            return shapely.simplify(chunk, simplify_tolerance, preserve_topology=True)
+        # Plain Douglas-Peucker is much faster; only the geometries it breaks are simplified preserving topology
+        simplified = shapely.simplify(chunk, simplify_tolerance, preserve_topology=False)
+        broken = ~shapely.is_valid(simplified) | (shapely.is_empty(simplified) & ~shapely.is_empty(chunk))
+        simplified[broken] = shapely.simplify(chunk[broken], simplify_tolerance, preserve_topology=True)
+        return simplified
+
+    if threads > 1 and len(polygons) > 1:
+        chunks = np.array_split(geoms[polygons], threads)
+        with ThreadPoolExecutor(threads) as executor:
+            geoms[polygons] = np.concatenate(list(executor.map(smooth_chunk, chunks)))
+    else:
+        geoms[polygons] = smooth_chunk(geoms[polygons])
+    return geoms
+
+def smoothen(gdf, buffer_distance=5, simplify_tolerance=1, resolution="auto", threads=1, preserve_topology=True):
+    """Returns a copy of the GeoDataFrame with smoothed geometries, see smooth. The input is left unchanged."""
+    smoothed_gdf = gdf.copy()
+    if not gdf.empty:
+        smoothed_gdf[gdf.geometry.name] = smooth(gdf.geometry.values, buffer_distance, simplify_tolerance, resolution,
+                                                 threads, preserve_topology)
+    return smoothed_gdf
 
 def smooth_geometry(geom, buffer_distance=2.5, simplify_tolerance=2):
-    if geom.is_empty:
-        return geom
-    if isinstance(geom, (Polygon, MultiPolygon)):
-        # Apply buffering and simplification to the geometry
-        geom = geom.buffer(buffer_distance).buffer(-buffer_distance)
-        geom = geom.simplify(simplify_tolerance, preserve_topology=True)
-    return geom
+    """Smooths a single geometry, see smooth."""
+    return smooth([geom], buffer_distance, simplify_tolerance)[0]
+
+if __name__ == "__main__":
+    import geopandas as gpd
+    import matplotlib.pyplot as plt
+
+    # Path to the input shapefile
+    input_shapefile = (".shp")
+
+    # Read the shapefile into a GeoDataFrame
+    try:
+        gdf = gpd.read_file(input_shapefile)
+    except Exception as e:
+        print(f"Error reading shapefile: {e}")
+        raise
 
-# Apply the smoothing function to each geometry in the GeoDataFrame
-smoothed_gdf = gdf.copy()
-smoothed_gdf['geometry'] = smoothed_gdf['geometry'].apply(lambda geom: smooth_geometry(geom, buffer_distance=2.5, simplify_tolerance=2))
+    # Apply the smoothing function to each geometry in the GeoDataFrame
+    smoothed_gdf = smoothen(gdf, buffer_distance=2.5, simplify_tolerance=2)
 
-# Plotting the smoothed geometries with the original geometries overlaid
-fig, ax = plt.subplots(figsize=(10, 10), dpi=300)
+    # Plotting the smoothed geometries with the original geometries overlaid
+    fig, ax = plt.subplots(figsize=(10, 10), dpi=300)
 
-# Plot smoothed geometries
-smoothed_gdf.plot(ax=ax, edgecolor='black', facecolor='lightgreen', alpha=0.5, label='Smoothed Geometry')
+    # Plot smoothed geometries
+    smoothed_gdf.plot(ax=ax, edgecolor='black', facecolor='lightgreen', alpha=0.5, label='Smoothed Geometry')
 
-# Overlay original geometries
-gdf.plot(ax=ax, edgecolor='red', facecolor='none', linewidth=0.5, label='Original Geometry')
+    # Overlay original geometries
+    gdf.plot(ax=ax, edgecolor='red', facecolor='none', linewidth=0.5, label='Original Geometry')
 
-# Add title and legend
-ax.set_title('Original Geometry Overlaid on Smoothed Geometry')
-ax.legend()
-ax.set_axis_off()  # Hide the axes for a cleaner look
+    # Add title and legend
+    ax.set_title('Original Geometry Overlaid on Smoothed Geometry')
+    ax.legend()
+    ax.set_axis_off()  # Hide the axes for a cleaner look
 
-# Adjust layout to make sure everything fits nicely
-plt.tight_layout()
+    # Adjust layout to make sure everything fits nicely
+    plt.tight_layout()
 
-# Optionally save the plot
-plt.savefig('output_plot.png', dpi=300)
+    # Optionally save the plot
+    plt.savefig('output_plot.png', dpi=300)
 
-# Path to save the output shapefile
-output_shapefile = (".shp")
+    # Path to save the output shapefile
+    output_shapefile = (".shp")
 
-# Save the smoothed GeoDataFrame to a new shapefile
-try:
-    smoothed_gdf.to_file(output_shapefile)
-    print(f"Smoothed geometries saved to: {output_shapefile}")
-except Exception as e:
-    print(f"Error saving shapefile: {e}")
+    # Save the smoothed GeoDataFrame to a new shapefile
+    try:
+        smoothed_gdf.to_file(output_shapefile)
+        print(f"Smoothed geometries saved to: {output_shapefile}")
+    except Exception as e:
+        print(f"Error saving shapefile: {e}")
 
-plt.show()
+    plt.show()
@@ -15,14 +15,15 @@ for easy access and further use in GIS applications.
 ≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈≈
 """
 
-import geopandas as gpd
 import os
 import centerperp as cp
-import reproject
-import dissolve
-import line_simplify
+import output
+import pipeline
+import profiling
+
+def main(split=None, workers=None, chunksize=1):
+    import geopandas as gpd
 
-def main():
     # Get user input for file path
     input_file = input("Enter the path to the GeoDataFrame file (GeoPackage or Shapefile): ")
 
@@ -33,25 +34,15 @@ def main():
 
     # Load the GeoDataFrame
     # try:
-    gdf_poly = gpd.read_file(input_file)
+    profiler = profiling.StageProfiler()
+    gdf_poly = profiler.run("read", gpd.read_file, input_file)
     # except Exception as e:
     #     print(f"Error loading file: {e}")
     #     return
 
-    #Dissolve
-    dissolved_poly = dissolve.dissolve_poly(gdf_poly)
-    
-    # Reproject
-    reprojected_poly = reproject.reproject_crs(dissolved_poly)
-    
-    #Smoothing/Simplify
-    simplify_poly = line_simplify.smoothen(reprojected_poly)
-    
-    #Centerline
-    centerline = cp.create_centerline(simplify_poly)
-
-    # Perpendicular lines
-    perp_lines = cp.create_perp(simplify_poly, centerline)
+    # Dissolve (or split into parts with split), reproject, smooth, and create the centerline and perpendicular lines
+    simplify_poly, centerline, perp_lines = pipeline.process(gdf_poly, split=split, workers=workers, chunksize=chunksize,
+                                                             profiler=profiler)
 
     # Remove intersecting lines
     # gdf_non_intersecting = cp.remove_intersect(perpendicular_lines)
@@ -61,9 +52,11 @@ def main():
 
     # Save simplified poly, centerline, and perpendicular lines
     output_file = input("Enter the path to save the simplified polygon, its centerline, and perpendicular lines: ")
-    simplify_poly.to_file(os.path.join(output_file, "Simplified Polygon.shp"))
-    centerline.to_file(os.path.join(output_file, "centerline.shp"))
-    perp_lines.to_file(os.path.join(output_file, "perp.shp"))
+    profiler.run("write", output.write_outputs, dict(zip(output.LAYERS, (simplify_poly, centerline, perp_lines))), output_file, "shp")
+
+    # Save the run report with the time, memory and counts of every stage
+    profiler.write(os.path.join(output_file, profiling.REPORT), input=input_file)
+    print("\n".join(profiler.summary()))
     # gdf_non_intersecting.to_file(os.path.join(output_file, "perpendicular.shp"))
     
     # try:
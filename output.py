@@ -0,0 +1,95 @@
+"""
+Output formats of the simplified polygon, centerline and perpendicular lines.
+
+    shp      the three shapefiles written by main.py
+    gpkg     a single GeoPackage with one layer per output, replaced in one step
+    fgb      one FlatGeobuf file per output, with a spatial index
+    parquet  one GeoParquet file per output
+
+The OGR formats are written through pyogrio's Arrow write path when pyarrow is installed.
+"""
+
+import importlib.util
+import os
+
+# pyarrow is only looked up here; it is imported by pyogrio when a layer is written
+USE_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+LAYERS = ("simplified_polygon", "centerline", "perp")
+SHAPEFILES = {"simplified_polygon": "Simplified Polygon.shp", "centerline": "centerline.shp", "perp": "perp.shp"}
+FORMATS = {"shp": "ESRI Shapefile", "gpkg": "GPKG", "fgb": "FlatGeobuf", "parquet": None}
+APPENDABLE = ("gpkg", "fgb")
+
+def output_paths(out_dir, fmt="shp"):
+    """Returns the output path of each layer."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if fmt == "shp":
+        return {layer: os.path.join(out_dir, SHAPEFILES[layer]) for layer in LAYERS}
+    if fmt == "gpkg":
+        return {layer: os.path.join(out_dir, "outputs.gpkg") for layer in LAYERS}
+    return {layer: os.path.join(out_dir, f"{layer}.{fmt}") for layer in LAYERS}
+
+#Writes one layer
+def write_layer(gdf, path, layer, fmt="shp", append=False, promote_to_multi=None):
+    """
+    Writes a GeoDataFrame as a layer in the given format.
+
+    Parameters
+    ----------
+    gdf (GeoDataFrame): The layer
+    path (str): Output path, see output_paths
+    layer (str): Name of the layer
+    fmt (str): "shp", "gpkg", "fgb" or "parquet". The default is "shp".
+    append (bool): Append to an existing layer, for the formats in APPENDABLE. The default is False.
+    promote_to_multi (bool): Write the geometries as Multi* types, so that later batches with multipart
+        geometries can be appended to the layer. The default is append.
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported, or cannot be appended to.
+
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if append and fmt not in APPENDABLE:
+        raise ValueError(f"Cannot append to the {fmt} format")
+
+    if fmt == "parquet":
+        gdf.to_parquet(path)
+        return
+    import pyogrio
+    layer_options = {"SPATIAL_INDEX": "YES"} if fmt == "fgb" else None
+    pyogrio.write_dataframe(gdf, path, layer=None if fmt == "shp" else layer, driver=FORMATS[fmt],
+                            append=append, use_arrow=USE_ARROW, layer_options=layer_options,
+                            promote_to_multi=append if promote_to_multi is None else promote_to_multi)
+
+#Writes all layers
+def write_outputs(layers, out_dir, fmt="shp"):
+    """
+    Writes the simplified polygon, centerline and perpendicular lines. A GeoPackage is written to a
+    temporary file that replaces the output once every layer is complete, so readers never see a
+    partly written GeoPackage. The layers of the formats in APPENDABLE are written as Multi* types, as the
+    streaming and incremental runs write them, so that their layers have the same types in every mode.
+
+    Parameters
+    ----------
+    layers (dict): GeoDataFrame of each layer in LAYERS
+    out_dir (str): Directory the outputs are written to
+    fmt (str): "shp", "gpkg", "fgb" or "parquet". The default is "shp".
+
+    """
+    paths = output_paths(out_dir, fmt)
+    os.makedirs(out_dir, exist_ok=True)
+    if fmt == "gpkg":
+        path = paths[LAYERS[0]]
+        partial = os.path.splitext(path)[0] + ".partial.gpkg"
+        if os.path.exists(partial):
+            os.remove(partial)
+        for layer in LAYERS:
+            write_layer(layers[layer], partial, layer, fmt, promote_to_multi=True)
+        os.replace(partial, path)
+        return
+    for layer in LAYERS:
+        write_layer(layers[layer], paths[layer], layer, fmt, promote_to_multi=fmt in APPENDABLE)
@@ -0,0 +1,212 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+import cache
+import centerperp as cp
+import dissolve
+import line_simplify
+import profiling
+import reproject
+import tiling
+
+#Splits the polygon layer into independent parts
+def split_parts(gdf_poly, split="components"):
+    """
+    Splits the polygon layer into parts that can be processed independently.
+
+    Parameters
+    ----------
+    gdf_poly (GeoDataFrame): A polygon or multipolygon layer
+    split (str): "components" to dissolve the layer and split it into its connected components,
+        or "features" to keep one part per input feature. The default is "components".
+
+    Raises
+    ------
+    ValueError
+        If split is not "components" or "features".
+
+    Returns
+    -------
+    parts (GeoDataFrame): One row per part, in a deterministic order, with normalized geometries.
+
+    """
+    if split == "components":
+        parts = dissolve.dissolve(gdf_poly).explode(index_parts=False)
+        # Order the components by position so that the output does not depend on the dissolve
+        centroids = shapely.get_coordinates(shapely.centroid(parts.geometry.values))
+        parts = parts.iloc[np.lexsort((centroids[:, 1], centroids[:, 0]))]
+    elif split == "features":
+        parts = gdf_poly[~gdf_poly.geometry.is_empty]
+    else:
+        raise ValueError(f"Unsupported split: {split}")
+    # The smoothing depends on the start and orientation of the rings, which the dissolve changes, so both
+    # splits give the same outputs for the same polygons
+    parts = parts.set_geometry(shapely.normalize(parts.geometry.values), crs=parts.crs)
+    return parts.reset_index(drop=True)
+
+#Processes one part, in a worker process
+def process_part(wkb, crs, params, target_epsg=None):
+    """
+    Smooths one polygon and creates its centerline and perpendicular lines. The geometries are passed in
+    and out as WKB to keep the cost of pickling low. With target_epsg, the part is processed in that CRS
+    ("utm" for the UTM zone of the part) and the outputs are transformed back to crs.
+
+    Returns
+    -------
+    smoothed (bytes), centerline (bytes), centerline attributes (dict), perp (list of bytes), width, route and
+        chainage (ndarray)
+
+    """
+    import geopandas as gpd
+    gdf_part = gpd.GeoDataFrame(geometry=[shapely.from_wkb(wkb)], crs=crs)
+    if target_epsg is not None:
+        gdf_part = reproject.reproject_crs(gdf_part, target_epsg)
+    simplify_poly = line_simplify.smoothen(gdf_part, params["buffer_distance"], params["simplify_tolerance"])
+    centerline = _create_centerline(simplify_poly, params)
+    if params["prune"] is not None:
+        centerline = cp.prune_centerline(simplify_poly, centerline, params["prune"])
+    perp_lines = cp.create_perp(simplify_poly, centerline, params["distance"], params["interval"])
+    if target_epsg is not None:
+        simplify_poly, centerline, perp_lines = _reproject_outputs((simplify_poly, centerline, perp_lines), crs)
+    return (shapely.to_wkb(simplify_poly.geometry.values[0]), shapely.to_wkb(centerline.geometry.values[0]),
+            centerline.drop(columns=centerline.geometry.name).iloc[0].to_dict(),
+            list(shapely.to_wkb(perp_lines.geometry.values)), perp_lines["width"].to_numpy(),
+            perp_lines["route"].to_numpy(), perp_lines["chainage"].to_numpy())
+
+def _process_part(args):
+    return process_part(*args)
+
+def _reproject_outputs(outputs, crs):
+    return tuple(reproject.reproject_crs(gdf, crs) for gdf in outputs)
+
+def _open_cache(params):
+    if params["cache"] is None:
+        return None
+    return cache.open_cache(params["cache"], params["cache_size"])
+
+def _create_centerline(simplify_poly, params):
+    if params["tile_size"] is None:
+        return cp.create_centerline(simplify_poly, params["dense"], params["tole"], _open_cache(params))
+    return tiling.create_centerline(simplify_poly, params["dense"], params["tole"], _open_cache(params),
+                                    params["tile_size"], params["tile_overlap"])
+
+def parameters(dense=0.1, tole=0.001, distance=10, interval=5, buffer_distance=5, simplify_tolerance=1, cache=None,
+               cache_size=1 << 30, tile_size=None, tile_overlap=200, prune=None):
+    """Returns the processing parameters of the parts as a dictionary, see process."""
+    return dict(dense=dense, tole=tole, distance=distance, interval=interval, buffer_distance=buffer_distance,
+                simplify_tolerance=simplify_tolerance, cache=cache, cache_size=cache_size, tile_size=tile_size,
+                tile_overlap=tile_overlap, prune=prune)
+
+#Runs the whole pipeline
+def process(gdf_poly, dense=0.1, tole=0.001, distance=10, interval=5, buffer_distance=5, simplify_tolerance=1,
+            target_epsg=32651, split=None, workers=None, chunksize=1, executor=None, cache=None, cache_size=1 << 30,
+            tile_size=None, tile_overlap=200, prune=None, to_source=False, profiler=None):
+    """
+    Reprojects and smooths the polygon layer, and creates its centerline and perpendicular lines.
+
+    By default the layer is dissolved into a single feature and processed as one geometry. With split, the
+    layer is split into independent parts (see split_parts) that are scheduled across a process pool, and the
+    results are merged in the order of the parts.
+
+    Parameters
+    ----------
+    gdf_poly (GeoDataFrame): A polygon or multipolygon layer
+    dense, tole: See create_centerline. dense can be "auto".
+    distance, interval: See create_perp.
+    buffer_distance, simplify_tolerance: See smoothen.
+    target_epsg (int or str): EPSG code of the projected CRS the geometries are processed in, or "utm" for the
+        UTM zone of the layer, see reproject.py. The default is 32651.
+    split (str): None, "components" or "features". The default is None.
+    workers (int): Number of worker processes. With 1, the parts are processed in this process.
+        The default is the number of CPUs.
+    chunksize (int): Number of parts sent to a worker at a time. The default is 1.
+    executor (Executor): An existing process pool to schedule the parts on, instead of starting a new one.
+    cache (str): Path of a centerline cache shared by all processes, see cache.py. The default is None.
+    cache_size (int): Size limit of the centerline cache in bytes. The default is 1 GB.
+    tile_size (float): Tile the centerline of polygons longer than this, see tiling.py. The default is None.
+    tile_overlap (float): Overlap of the tiles. The default is 200.
+    prune (float): Prune the centerline spurs shorter than prune times the polygon width and merge the rest
+        into routes before the perpendicular lines are placed, see topology.py. The default is None.
+    to_source (bool): Transform the outputs back to the CRS of gdf_poly. With split and target_epsg "utm",
+        every part is then processed in its own UTM zone. The default is False.
+    profiler (StageProfiler): Records every stage of the run, see profiling.py. The default is None.
+
+    Returns
+    -------
+    simplify_poly, centerline, perp_lines (GeoDataFrame)
+
+    """
+    params = parameters(dense, tole, distance, interval, buffer_distance, simplify_tolerance, cache, cache_size,
+                        tile_size, tile_overlap, prune)
+
+    run = profiling.run
+    if split is None:
+        dissolved_poly = run(profiler, "dissolve", dissolve.dissolve, gdf_poly)
+        reprojected_poly = run(profiler, "reproject", reproject.reproject_crs, dissolved_poly, target_epsg)
+        simplify_poly = run(profiler, "smoothen", line_simplify.smoothen, reprojected_poly, buffer_distance, simplify_tolerance)
+        centerline = run(profiler, "centerline", _create_centerline, simplify_poly, params)
+        if prune is not None:
+            centerline = run(profiler, "topology", cp.prune_centerline, simplify_poly, centerline, prune)
+        # Records the placement and the clipping of the lines as separate stages
+        perp_lines = cp.create_perp(simplify_poly, centerline, distance, interval, profiler)
+        outputs = simplify_poly, centerline, perp_lines
+    elif to_source and target_epsg == "utm":
+        # The parts stay in the source CRS, and each worker projects its part to the zone of the part
+        parts = run(profiler, "split", split_parts, gdf_poly, split)
+        return run(profiler, "parts", process_parts, parts, params, workers, chunksize, executor, "utm")
+    else:
+        reprojected_poly = run(profiler, "reproject", reproject.reproject_crs, gdf_poly, target_epsg)
+        parts = run(profiler, "split", split_parts, reprojected_poly, split)
+        outputs = run(profiler, "parts", process_parts, parts, params, workers, chunksize, executor)
+    if to_source:
+        outputs = run(profiler, "reproject_outputs", _reproject_outputs, outputs, gdf_poly.crs)
+    return outputs
+
+#Processes the parts of a split layer
+def process_parts(parts, params, workers=None, chunksize=1, executor=None, target_epsg=None):
+    """
+    Processes the parts of a split polygon layer across a process pool and merges the results in the order of
+    the parts. See process for the parameters; params is a dictionary made by parameters, and target_epsg is
+    passed on to process_part.
+
+    Returns
+    -------
+    simplify_poly, centerline, perp_lines (GeoDataFrame): Every layer has a part column with the position of
+        the part of its rows, and perp_lines an id column numbering the lines from 0.
+
+    """
+    tasks = part_tasks(parts, params, target_epsg)
+    if executor is not None:
+        results = list(executor.map(_process_part, tasks, chunksize=chunksize))
+    elif workers == 1:
+        results = list(map(_process_part, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            results = list(executor.map(_process_part, tasks, chunksize=chunksize))
+    return merge_parts(parts, results)
+
+def part_tasks(parts, params, target_epsg=None):
+    """Returns the arguments of process_part for every part."""
+    return [(wkb, parts.crs, params, target_epsg) for wkb in shapely.to_wkb(parts.geometry.values)]
+
+#Merges the results of the parts
+def merge_parts(parts, results):
+    """Merges the results of process_part into the output layers, in the order of the parts, see process_parts."""
+    import geopandas as gpd
+    crs = parts.crs
+    attributes = parts.drop(columns=parts.geometry.name)
+    simplify_poly = gpd.GeoDataFrame(attributes, geometry=shapely.from_wkb([r[0] for r in results]), crs=crs)
+    simplify_poly["part"] = np.arange(len(parts))
+    centerline = gpd.GeoDataFrame([r[2] for r in results], geometry=shapely.from_wkb([r[1] for r in results]), crs=crs)
+    centerline.insert(0, "part", range(len(parts)))
+
+    counts = [len(r[3]) for r in results]
+    part = np.repeat(np.arange(len(parts)), counts)
+    perp_geoms = shapely.from_wkb([wkb for r in results for wkb in r[3]])
+    perp_lines = gpd.GeoDataFrame(attributes.iloc[part].reset_index(drop=True), geometry=perp_geoms, crs=crs)
+    perp_lines["part"] = part
+    perp_lines["id"] = range(len(perp_lines))
+    for column, i in (("width", 4), ("route", 5), ("chainage", 6)):
+        perp_lines[column] = np.concatenate([r[i] for r in results]) if results else np.array([])
+    return simplify_poly, centerline, perp_lines
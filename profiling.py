@@ -0,0 +1,213 @@
+"""
+Instrumentation of the pipeline stages. A StageProfiler runs each stage and records its wall and CPU time,
+the high-water mark of the resident memory of the process and how much the stage raised it, and the number
+of features and vertices going in and out, and can capture a cProfile and a tracemalloc peak per stage. The
+records of a run are written as a JSON report alongside the outputs.
+
+The resident memory and the CPU time of the child processes are read with the resource module, which only
+exists on Unix; elsewhere the memory of the process is read with psutil when it is installed, and the rest is
+reported as None.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import shapely
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT = "report.json"
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+def geometry_counts(value):
+    """Returns the number of features and vertices of a GeoDataFrame, geometry array, or tuple or dict of them, or None."""
+    if isinstance(value, dict):
+        value = tuple(value.values())
+    if isinstance(value, tuple):
+        counts = [geometry_counts(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return tuple(map(sum, zip(*counts))) if counts else None
+    geoms = getattr(value, "geometry", value)
+    if isinstance(geoms, np.ndarray) or hasattr(geoms, "values"):
+        geoms = np.asarray(getattr(geoms, "values", geoms), dtype=object)
+        if geoms.size and isinstance(geoms.flat[0], shapely.Geometry):
+            return len(geoms), int(shapely.get_num_coordinates(geoms).sum())
+    return None
+
+#Resident memory
+def max_rss_mb(children=False):
+    """
+    Returns the high-water mark of the resident memory of the process so far, or of its largest finished child
+    process, in MB, or None where it cannot be measured.
+    """
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT / 1e6
+    if children:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # peak_wset is the high-water mark on Windows
+    return getattr(memory, "peak_wset", memory.rss) / 1e6
+
+def _children_cpu_s():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _add(record, key, value):
+    if value is not None:
+        record[key] = (record[key] or 0.0) + value
+
+def _max(record, key, value):
+    if value is not None:
+        record[key] = max(record[key] or 0.0, value)
+
+def environment():
+    """Returns the commit, library versions and machine of the run."""
+    import geopandas as gpd
+    import pygeoops
+    import pyproj
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "numpy": np.__version__,
+            "shapely": shapely.__version__, "geopandas": gpd.__version__, "pygeoops": pygeoops.__version__,
+            "pyproj": pyproj.__version__}
+
+class StageProfiler:
+    """
+    Records the cost of every stage of a run. A stage that runs several times, like a stage per batch, is
+    accumulated into one record. max_rss_mb is the high-water mark of the process when the stage ends, so it
+    stays at the peak of the heaviest stage run before; rss_growth_mb is how much the stage itself raised it.
+    Values that cannot be measured on the platform are None.
+
+    Parameters
+    ----------
+    profile (bool): Capture a cProfile of every stage. The default is False.
+    trace_memory (bool): Measure the peak of the Python and NumPy allocations of every stage with tracemalloc,
+        which slows the stages down. The default is False.
+    profile_dir (str): Directory the cProfile stats of every stage are written to by write, as <stage>.prof.
+        The default is None.
+    top (int): Number of functions of each cProfile listed in the report. The default is 10.
+
+    """
+
+    def __init__(self, profile=False, trace_memory=False, profile_dir=None, top=10):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.top = top
+        self.stages = {}
+        self.profiles = {}
+        self.start = time.perf_counter()
+
+    def run(self, stage, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) as a stage and returns its result."""
+        children_cpu, rss = _children_cpu_s(), max_rss_mb()
+        record = self.stages.setdefault(stage, {
+            "stage": stage, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "children_cpu_s": None, "max_rss_mb": None,
+            "rss_growth_mb": None, "children_max_rss_mb": None, "input_features": 0, "input_vertices": 0,
+            "output_features": 0, "output_vertices": 0})
+        counts = next((c for c in map(geometry_counts, args) if c is not None), None)
+        if counts is not None:
+            record["input_features"] += counts[0]
+            record["input_vertices"] += counts[1]
+
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        profiler = self.profiles.setdefault(stage, cProfile.Profile()) if self.profile else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_s"] += time.perf_counter() - wall
+            record["cpu_s"] += time.process_time() - cpu
+            if children_cpu is not None:
+                _add(record, "children_cpu_s", _children_cpu_s() - children_cpu)
+            after = max_rss_mb()
+            _max(record, "max_rss_mb", after)
+            if rss is not None:
+                _add(record, "rss_growth_mb", after - rss)
+            _max(record, "children_max_rss_mb", max_rss_mb(children=True))
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+                record["traced_peak_mb"] = max(record.get("traced_peak_mb", 0.0), peak)
+            record["calls"] += 1
+
+        counts = geometry_counts(result)
+        if counts is not None:
+            record["output_features"] += counts[0]
+            record["output_vertices"] += counts[1]
+        return result
+
+    def _top_functions(self, profiler):
+        stats = pstats.Stats(profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+        return [{"function": f"{filename}:{line}({name})", "calls": calls, "own_s": own, "cumulative_s": cumulative}
+                for (filename, line, name), (_, calls, own, cumulative, _) in rows]
+
+    def report(self, **info):
+        """Returns the run report: the environment, the given information, the stage records and their totals."""
+        stages = []
+        for stage, record in self.stages.items():
+            record = dict(record)
+            if stage in self.profiles:
+                record["top_functions"] = self._top_functions(self.profiles[stage])
+            stages.append(record)
+        total = {"wall_s": time.perf_counter() - self.start,
+                 "stage_wall_s": sum(record["wall_s"] for record in stages),
+                 "cpu_s": sum(record["cpu_s"] + (record["children_cpu_s"] or 0.0) for record in stages),
+                 "max_rss_mb": max([record["max_rss_mb"] for record in stages if record["max_rss_mb"] is not None],
+                                   default=None)}
+        return {"environment": environment(), **info, "stages": stages, "total": total}
+
+    def write(self, path, **info):
+        """Writes the run report as JSON, and the cProfile stats of every stage to profile_dir."""
+        report = self.report(**info)
+        if self.profile_dir is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for stage, profiler in self.profiles.items():
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{stage}.prof"))
+        with open(path, "w") as file:
+            json.dump(report, file, indent=1, default=str)
+        return report
+
+    def summary(self):
+        """Returns the stage records as lines of text."""
+        return [f"{record['stage']:<16} {record['wall_s']:9.3f} s wall"
+                f" {record['cpu_s'] + (record['children_cpu_s'] or 0.0):9.3f} s cpu"
+                f" {_mb(record['rss_growth_mb'])} MB rss growth | {record['input_features']:>7} -> {record['output_features']:>7} features"
+                f" {record['input_vertices']:>9} -> {record['output_vertices']:>9} vertices"
+                for record in self.stages.values()]
+
+def _mb(value):
+    return f"{'n/a':>8}" if value is None else f"{value:8.1f}"
+
+def run(profiler, stage, func, *args, **kwargs):
+    """Runs func as a stage of the profiler, or just runs it when the profiler is None."""
+    if profiler is None:
+        return func(*args, **kwargs)
+    return profiler.run(stage, func, *args, **kwargs)
@@ -1,15 +1,88 @@
-import geopandas as gpd
+"""
+Reprojection of the polygon layer and the outputs. Transformers are created once per (source, target) pair
+and process, and the coordinates of a whole geometry array are transformed in one call through
+shapely.transform. The projected CRS can be a fixed EPSG code or "utm", the UTM zone of the data.
+"""
 
+import functools
+import numpy as np
+import shapely
+
+WGS84 = 4326
+
+#Transformer of a pair of CRS
+@functools.lru_cache(maxsize=None)
+def transformer(source, target):
+    """Returns the Transformer from source to target (anything pyproj.CRS accepts), created once per process."""
+    import pyproj
+    return pyproj.Transformer.from_crs(source, target, always_xy=True)
+
+def transform(geoms, source, target):
+    """
+    Transforms an array of geometries from the source to the target CRS, all coordinates at once. Geometries with
+    Z coordinates keep them, transformed along with x and y as GeoDataFrame.to_crs does.
+    """
+    import pyproj
+    geoms = np.asarray(geoms, dtype=object)
+    if pyproj.CRS.from_user_input(source) == pyproj.CRS.from_user_input(target):
+        return geoms.copy()
+    project = transformer(source, target)
+    transformed = np.empty(len(geoms), dtype=object)
+    has_z = shapely.has_z(geoms)
+    transformed[~has_z] = shapely.transform(geoms[~has_z], lambda xy: np.column_stack(project.transform(*xy.T)))
+    if has_z.any():
+        transformed[has_z] = shapely.transform(geoms[has_z], lambda xyz: np.column_stack(project.transform(*xyz.T)),
+                                               include_z=True)
+    return transformed
+
+#UTM zone of the data
+def utm_epsg(geoms, crs):
+    """
+    Returns the EPSG code of the WGS 84 / UTM zone of each geometry, picked by the centre of its bounds.
+
+    Raises
+    ------
+    ValueError
+        If a geometry lies beyond the latitudes covered by UTM (80°S to 84°N).
+
+    """
+    bounds = shapely.bounds(np.asarray(geoms, dtype=object))
+    x, y = (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2
+    lon, lat = transformer(crs, WGS84).transform(x, y)
+    if np.any((np.asarray(lat) < -80) | (np.asarray(lat) > 84)):
+        raise ValueError("Geometries beyond the UTM latitudes need a target_epsg")
+    zone = np.clip(np.floor((np.asarray(lon) + 180) / 6).astype(np.int64) + 1, 1, 60)
+    return np.where(np.asarray(lat) >= 0, 32600, 32700) + zone
+
+def target_crs(gdf, target_epsg=32651):
+    """Returns the EPSG code the layer is processed in: target_epsg, or the UTM zone of the whole layer with "utm"."""
+    if target_epsg != "utm":
+        return target_epsg
+    if gdf.empty:
+        return gdf.crs
+    return int(utm_epsg([shapely.box(*gdf.total_bounds)], gdf.crs)[0])
+
+#Reprojects a layer
 def reproject_crs(input_file, target_epsg=32651):
-    # try:
-        # Returns reprojected shapefile   
-        return input_file.to_crs(epsg=target_epsg)
-
-# gdf = reproject_crs(r"C:\Users\user-307E123400\OneDrive - Philippine Space Agency\FMR\Delineations & Centerlines\undissolved\BSG-113-20240823-004447-268994436.shp")
-# gdf.to_file(r"C:\Users\user-307E123400\OneDrive - Philippine Space Agency\FMR\Delineations & Centerlines\undissolved\4326.shp")
-    # except FileNotFoundError:
-    #     print("Error: Input file not found.")
-    # except ValueError as e:
-    #     print(f"Value Error: {e}")
-    # except Exception as e:
-    #     print(f"Error: {e}")
+    """
+    Returns a copy of the layer in the target CRS, like GeoDataFrame.to_crs but with the cached Transformer.
+
+    Parameters
+    ----------
+    input_file (GeoDataFrame): The layer
+    target_epsg (int or str): EPSG code of the target CRS, or "utm" for the UTM zone of the layer.
+        The default is 32651.
+
+    Raises
+    ------
+    ValueError
+        If the layer has no CRS.
+
+    """
+    import geopandas as gpd
+    import pyproj
+    if input_file.crs is None:
+        raise ValueError("Cannot transform naive geometries. Please set a crs on the object first.")
+    target = pyproj.CRS.from_user_input(target_crs(input_file, target_epsg))
+    geoms = transform(input_file.geometry.values, input_file.crs, target)
+    return input_file.set_geometry(gpd.GeoSeries(geoms, index=input_file.index, crs=target, name=input_file.geometry.name))
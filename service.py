@@ -0,0 +1,573 @@
+"""
+Service mode: a local HTTP server that keeps the geometry stack imported and a process pool warm, so that
+width requests do not pay for a cold interpreter.
+
+Usage: python service.py [--port 8765] [-j WORKERS]
+
+    POST /jobs              submit a job and return its id, or with ?wait=1 wait for it and return its result
+    GET  /jobs/<id>         status and progress of a job
+    GET  /jobs/<id>/events  progress of a job as server-sent events, until it is done
+    GET  /jobs/<id>/result  a layer of the result, ?layer=perp|centerline|simplified_polygon&format=geojson|parquet
+    GET  /metrics           throughput, latency percentiles, queue and job counts
+    GET  /health
+
+A job is a JSON object with either "geojson" (a FeatureCollection, Feature or geometry, in the CRS given by
+"crs", EPSG:4326 by default) or "path" (a file readable by the server), and optionally "params" (see
+pipeline.process, with remove_intersect and thin), "format" and "layer" for ?wait=1. By default every part is
+processed in its own UTM zone and the outputs are returned in the CRS of the input.
+
+A job is read, projected and split into parts on a small thread pool, so that a large upload does not hold
+up the others, and the prepared jobs are taken in batches: their parts are split into chunks that mix the parts of several jobs, so
+that small jobs share the round trips to the workers. If a worker dies, the jobs with parts in flight fail and
+the pool is replaced. The server binds to localhost by default.
+"""
+
+import argparse
+import collections
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import centerperp as cp
+import output
+import pipeline
+import reproject
+
+DEFAULTS = dict(target_epsg="utm", to_source=True, split="components", remove_intersect=False, thin=False)
+PROCESS_PARAMS = tuple(pipeline.parameters())
+CONTENT_TYPES = {"geojson": "application/geo+json", "parquet": "application/vnd.apache.parquet"}
+FINISHED = ("done", "failed")
+
+def _warm():
+    """Imports the geometry stack in a worker process and runs a first centerline."""
+    import geopandas  # noqa: F401
+    import pygeoops
+    import shapely
+    pygeoops.centerline([shapely.box(0, 0, 20, 2)], densify_distance=1)
+
+def _process_chunk(tasks):
+    """Processes the parts of a chunk, and returns the error of a part that fails in place of its result."""
+    results = []
+    for task in tasks:
+        try:
+            results.append(pipeline.process_part(*task))
+        except Exception as error:
+            results.append(error)
+    return results
+
+#Reads the layer of a job
+def load_layer(payload):
+    """
+    Returns the polygon layer of a job, from its "geojson" or "path".
+
+    Raises
+    ------
+    ValueError
+        If the job has neither, or the GeoJSON is not an object.
+
+    """
+    import geopandas as gpd
+    if "path" in payload:
+        return gpd.read_file(payload["path"])
+    data = payload.get("geojson")
+    if isinstance(data, str):
+        data = json.loads(data)
+    if not isinstance(data, dict):
+        raise ValueError("A job needs a geojson object or a path")
+    if data.get("type") == "FeatureCollection":
+        features = data["features"]
+    elif data.get("type") == "Feature":
+        features = [data]
+    else:
+        features = [{"type": "Feature", "geometry": data, "properties": {}}]
+    return gpd.GeoDataFrame.from_features(features, crs=payload.get("crs", "EPSG:4326"))
+
+def _positive(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+def job_parameters(payload):
+    """
+    Returns the parameters of a job merged with DEFAULTS.
+
+    Raises
+    ------
+    ValueError
+        If a parameter is unknown, or dense, interval or target_epsg is not valid, so that a bad job fails
+        before its parts are sent to the workers with the parts of other jobs.
+
+    """
+    import pyproj
+    params = dict(DEFAULTS, **payload.get("params", {}))
+    unknown = set(params) - set(PROCESS_PARAMS) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    if isinstance(params.get("interval"), list):
+        params["interval"] = tuple(params["interval"])
+    dense, interval, target_epsg = params.get("dense", 0.1), params.get("interval", 5), params["target_epsg"]
+    if dense != "auto" and not _positive(dense):
+        raise ValueError(f"Unsupported dense: {dense!r}")
+    if not (interval == "auto" or _positive(interval) or (isinstance(interval, tuple) and len(interval) == 2
+                                                         and all(map(_positive, interval)) and interval[0] <= interval[1])):
+        raise ValueError(f"Unsupported interval: {interval!r}")
+    if target_epsg != "utm":
+        if not isinstance(target_epsg, int) or isinstance(target_epsg, bool):
+            raise ValueError(f"Unsupported target_epsg: {target_epsg!r}")
+        try:
+            pyproj.CRS.from_epsg(target_epsg)
+        except pyproj.exceptions.CRSError as error:
+            raise ValueError(f"Unsupported target_epsg: {target_epsg}") from error
+    return params
+
+class Job:
+    """A queued polygon layer, its progress and its result."""
+
+    def __init__(self, payload):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.done = self.total = 0
+        self.error = None
+        self.result = None
+        self.encoded = {}
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def state(self):
+        state = {"id": self.id, "status": self.status, "parts_done": self.done, "parts_total": self.total}
+        if self.error is not None:
+            state["error"] = self.error
+        if self.finished is not None:
+            state["latency_s"] = self.finished - self.submitted
+        return state
+
+    def wait(self, timeout=None):
+        with self.changed:
+            return self.changed.wait_for(lambda: self.status in FINISHED, timeout)
+
+    #Encoded layers of the result
+    def encode(self, layer="perp", fmt="geojson"):
+        """Returns a layer of the result as GeoJSON or GeoParquet bytes."""
+        if layer not in output.LAYERS:
+            raise ValueError(f"Unknown layer: {layer}")
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if (layer, fmt) not in self.encoded:
+            gdf = self.result[layer]
+            if fmt == "parquet":
+                buffer = io.BytesIO()
+                gdf.to_parquet(buffer)
+                self.encoded[layer, fmt] = buffer.getvalue()
+            else:
+                self.encoded[layer, fmt] = gdf.to_json(drop_id=True).encode()
+        return self.encoded[layer, fmt]
+
+class Service:
+    """
+    The job queue and the warm process pool.
+
+    Parameters
+    ----------
+    workers (int): Number of worker processes. The default is the number of CPUs.
+    batch_size (int): Largest number of jobs taken from the queue at a time. The default is 16.
+    batch_window (float): Time to wait for more jobs once a job is queued, in seconds. The default is 0.02.
+    chunksize (int): Number of parts sent to a worker at a time. The default is 4.
+    max_jobs (int): Number of jobs kept, the oldest finished jobs are dropped beyond it. The default is 1000.
+    prepare_threads (int): Number of threads jobs are read and split into parts on. The default is 2.
+
+    """
+
+    def __init__(self, workers=None, batch_size=16, batch_window=0.02, chunksize=4, max_jobs=1000, prepare_threads=2):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.chunksize = chunksize
+        self.max_jobs = max_jobs
+        self.pool_lock = threading.Lock()
+        self.executor = self._start_pool()
+        self.preparer = ThreadPoolExecutor(prepare_threads, thread_name_prefix="prepare")
+
+        self.jobs = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.completions = queue.Queue()
+        self.latencies = collections.deque(maxlen=10000)
+        self.finish_times = collections.deque(maxlen=100000)
+        self.counters = collections.Counter()
+        self.started = time.time()
+        self.closed = False
+        self.threads = [threading.Thread(target=self._dispatch, daemon=True),
+                        threading.Thread(target=self._collect, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def _start_pool(self):
+        executor = ProcessPoolExecutor(self.workers, initializer=_warm)
+        # Start every worker now rather than on the first job
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _restart(self, broken):
+        """Replaces the pool after a worker died, unless another thread has already replaced it."""
+        with self.pool_lock:
+            if self.executor is broken and not self.closed:
+                broken.shutdown(wait=False)
+                self.executor = self._start_pool()
+                with self.lock:
+                    self.counters["restarts"] += 1
+            return self.executor
+
+    def submit(self, payload):
+        """Queues a job and returns it."""
+        job = Job(payload)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.counters["submitted"] += 1
+            while len(self.jobs) > self.max_jobs:
+                oldest = next((key for key, old in self.jobs.items() if old.status in FINISHED), None)
+                if oldest is None:
+                    break
+                del self.jobs[oldest]
+        try:
+            if self.closed:
+                raise RuntimeError("The service is closed")
+            self.preparer.submit(self._prepare_job, job)
+        except RuntimeError as error:
+            self._fail(job, error)
+        return job
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def close(self):
+        """Stops the service. The jobs it has not finished fail, so that no client waits for them."""
+        self.closed = True
+        self.preparer.shutdown(cancel_futures=True)
+        self.queue.put(None)
+        self.threads[0].join()
+        with self.pool_lock:
+            executor = self.executor
+        # The done-callbacks of the cancelled chunks have posted them before shutdown returns
+        executor.shutdown(cancel_futures=True)
+        self.completions.put(None)
+        self.threads[1].join()
+        with self.lock:
+            unfinished = [job for job in self.jobs.values() if job.status not in FINISHED]
+        for job in unfinished:
+            self._fail(job, RuntimeError("The service is closed"))
+
+    def _fail(self, job, error):
+        if job.status in FINISHED:
+            return
+        job.update(status="failed", error=f"{type(error).__name__}: {error}", finished=time.time())
+        with self.lock:
+            self.counters["failed"] += 1
+
+    #Prepares the parts of a job
+    def _prepare(self, job):
+        params = job_parameters(job.payload)
+        gdf = load_layer(job.payload)
+        process_params = pipeline.parameters(**{name: params[name] for name in PROCESS_PARAMS if name in params})
+        per_part = params["to_source"] and params["target_epsg"] == "utm"
+        if per_part:
+            # Every worker projects its part to the UTM zone of the part, see pipeline.process
+            parts = pipeline.split_parts(gdf, params["split"])
+        else:
+            parts = pipeline.split_parts(reproject.reproject_crs(gdf, params["target_epsg"]), params["split"])
+        job.params, job.crs, job.per_part, job.parts = params, gdf.crs, per_part, parts
+        job.tasks = pipeline.part_tasks(parts, process_params, "utm" if per_part else None)
+        job.results = [None] * len(job.tasks)
+
+    def _prepare_job(self, job):
+        """Prepares a job on the thread pool and queues it for the dispatcher."""
+        try:
+            self._prepare(job)
+        except Exception as error:
+            self._fail(job, error)
+            return
+        self.queue.put(job)
+
+    def _dispatch(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    job = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.queue.put(None)
+                    break
+                batch.append(job)
+            self._submit_batch(batch)
+
+    def _submit_batch(self, batch):
+        tasks = []
+        for job in batch:
+            job.update(status="running", started=time.time(), total=len(job.tasks))
+            if not job.tasks:
+                self.completions.put((job, None, None))
+            tasks.extend((job, i) for i in range(len(job.tasks)))
+
+        # The chunks mix the parts of the jobs of the batch
+        for start in range(0, len(tasks), self.chunksize):
+            chunk = tasks[start:start + self.chunksize]
+            executor = self.executor
+            try:
+                try:
+                    future = executor.submit(_process_chunk, [job.tasks[i] for job, i in chunk])
+                except BrokenProcessPool:
+                    executor = self._restart(executor)
+                    future = executor.submit(_process_chunk, [job.tasks[i] for job, i in chunk])
+            except RuntimeError as error:  # The pool is shut down
+                for job, _ in chunk:
+                    self._fail(job, error)
+                return
+            future.add_done_callback(
+                lambda future, chunk=chunk, executor=executor: self.completions.put((chunk, future, executor)))
+
+    def _collect(self):
+        while True:
+            item = self.completions.get()
+            if item is None:
+                return
+            chunk, future, executor = item
+            if future is None:
+                self._finish(chunk)
+                continue
+            try:
+                results = future.result()
+            except Exception as error:
+                # A worker died: the chunks in flight fail, and the later ones go to a new pool
+                if isinstance(error, BrokenProcessPool):
+                    self._restart(executor)
+                for job, _ in chunk:
+                    self._fail(job, error)
+                continue
+            for (job, i), result in zip(chunk, results):
+                if job.status in FINISHED:
+                    continue
+                # A part that failed only fails its own job, not the others of the chunk
+                if isinstance(result, Exception):
+                    self._fail(job, result)
+                    continue
+                job.results[i] = result
+                job.update(done=job.done + 1)
+                if job.done == job.total:
+                    self._finish(job)
+
+    #Merges the parts of a finished job
+    def _finish(self, job):
+        try:
+            simplify_poly, centerline, perp_lines = pipeline.merge_parts(job.parts, job.results)
+            if job.params["remove_intersect"] or job.params["thin"]:
+                perp_lines = cp.remove_intersect(perp_lines, thin=job.params["thin"])
+            layers = (simplify_poly, centerline, perp_lines)
+            if job.params["to_source"] and not job.per_part:
+                layers = tuple(reproject.reproject_crs(gdf, job.crs) for gdf in layers)
+        except Exception as error:
+            self._fail(job, error)
+            return
+        finished = time.time()
+        job.tasks = job.results = job.parts = None
+        job.update(result=dict(zip(output.LAYERS, layers)), status="done", finished=finished)
+        with self.lock:
+            self.counters["completed"] += 1
+            self.counters["parts"] += job.total
+            self.latencies.append(finished - job.submitted)
+            self.finish_times.append(finished)
+
+    #Throughput and latency
+    def metrics(self, window=60):
+        """Returns the job counts, the throughput over the last window seconds and the latency percentiles."""
+        now = time.time()
+        with self.lock:
+            latencies = np.array(self.latencies)
+            recent = sum(1 for finished in self.finish_times if finished > now - window)
+            states = collections.Counter(job.status for job in self.jobs.values())
+            counters = dict(self.counters)
+        span = min(window, now - self.started)
+        metrics = {"uptime_s": now - self.started, "workers": self.workers, "queue": self.queue.qsize(),
+                   "queued": states["queued"], "running": states["running"],
+                   "submitted": counters.get("submitted", 0), "completed": counters.get("completed", 0),
+                   "failed": counters.get("failed", 0), "parts": counters.get("parts", 0),
+                   "pool_restarts": counters.get("restarts", 0),
+                   "throughput_jobs_per_s": recent / span if span > 0 else 0.0, "latency_s": None}
+        if len(latencies):
+            metrics["latency_s"] = {"mean": latencies.mean(), "p50": np.percentile(latencies, 50),
+                                    "p95": np.percentile(latencies, 95), "p99": np.percentile(latencies, 99),
+                                    "max": latencies.max(), "count": len(latencies)}
+        return metrics
+
+class Handler(BaseHTTPRequestHandler):
+    """Routes the requests to the Service of the server."""
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, code, body, content_type="application/json", headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, value, headers=None):
+        self._send(code, json.dumps(value, default=float).encode(), headers=headers)
+
+    def _send_result(self, job, layer, fmt):
+        if job.status == "failed":
+            self._send_json(422, job.state())
+        elif job.status != "done":
+            self._send_json(409, job.state())
+        else:
+            try:
+                body = job.encode(layer, fmt)
+            except ValueError as error:
+                self._send_json(400, {"error": str(error)})
+                return
+            self._send(200, body, CONTENT_TYPES[fmt], {"X-Job-Id": job.id})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("A job must be a JSON object")
+        except ValueError as error:
+            self._send_json(400, {"error": f"Invalid job: {error}"})
+            return
+        job = self.server.service.submit(payload)
+        query = parse_qs(url.query)
+        if query.get("wait", ["0"])[0] in ("1", "true"):
+            job.wait()
+            self._send_result(job, payload.get("layer", "perp"), payload.get("format", "geojson"))
+        else:
+            self._send_json(202, job.state(), {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.strip("/").split("/")
+        service = self.server.service
+        if path == ["health"]:
+            self._send_json(200, {"status": "ok"})
+        elif path == ["metrics"]:
+            self._send_json(200, service.metrics())
+        elif len(path) in (2, 3) and path[0] == "jobs":
+            job = service.job(path[1])
+            if job is None:
+                self._send_json(404, {"error": f"Unknown job: {path[1]}"})
+            elif len(path) == 2:
+                self._send_json(200, job.state())
+            elif path[2] == "events":
+                self._stream(job)
+            elif path[2] == "result":
+                query = parse_qs(url.query)
+                self._send_result(job, query.get("layer", [job.payload.get("layer", "perp")])[0],
+                                  query.get("format", [job.payload.get("format", "geojson")])[0])
+            else:
+                self._send_json(404, {"error": "Not found"})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    #Progress as server-sent events
+    def _stream(self, job, heartbeat=15):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last = None
+        while True:
+            with job.changed:
+                if job.state() == last:
+                    job.changed.wait(heartbeat)
+                state = job.state()
+            if state == last:
+                self.wfile.write(b": heartbeat\n\n")
+            else:
+                self.wfile.write(f"event: {state['status']}\ndata: {json.dumps(state)}\n\n".encode())
+            self.wfile.flush()
+            last = state
+            if state["status"] in FINISHED:
+                return
+
+def start(host="127.0.0.1", port=8765, verbose=False, **kwargs):
+    """
+    Starts the service in a background thread. With port 0 a free port is picked, see server.server_address.
+
+    Returns
+    -------
+    server (ThreadingHTTPServer): The server, with its Service as server.service. Stop it with stop(server).
+
+    """
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.service = Service(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stop(server):
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serves centerline and perpendicular line jobs over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument("-j", "--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=16, help="jobs taken from the queue at a time (default: 16)")
+    parser.add_argument("--batch-window", type=float, default=0.02,
+                        help="seconds to wait for more jobs to batch (default: 0.02)")
+    parser.add_argument("--chunksize", type=int, default=4, help="parts sent to a worker at a time (default: 4)")
+    parser.add_argument("--prepare-threads", type=int, default=2,
+                        help="threads jobs are read and split into parts on (default: 2)")
+    parser.add_argument("--max-jobs", type=int, default=1000, help="finished jobs kept for their results (default: 1000)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.verbose = args.verbose
+    server.service = Service(args.workers, args.batch_size, args.batch_window, args.chunksize, args.max_jobs,
+                             args.prepare_threads)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {server.service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+
+if __name__ == "__main__":
+    main()
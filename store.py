@@ -0,0 +1,339 @@
+"""
+Compact on-disk store of the perpendicular lines, for width queries that do not load the whole layer.
+
+Usage: python store.py build OUTPUT_DIR [--feature name]       builds OUTPUT_DIR/transects.store from the outputs
+       python store.py query STORE --feature X [--route 0] --chainage 2300 2800
+       python store.py query STORE --window XMIN YMIN XMAX YMAX
+
+The store is a directory of NumPy arrays, one per column (feature, route, chainage, endpoint coordinates, width
+and id of every transect), that are memory-mapped when the store is opened. The route is the part of the
+centerline a transect lies on, and its chainage is measured along that part, as create_perp reports them; a
+centerline of several parts has several routes, numbered by length from the longest whether or not it was pruned. The rows are sorted by feature, route
+and chainage, so the transects of a route are a contiguous block and a chainage range is found by binary
+search within it. A packed R-tree over the bounding boxes of the transects answers window queries: its leaves are runs
+of node_size consecutive rows, and the levels above them are packed in Hilbert order of the node centres.
+Queries return row indices or slices, and the columns are read as views of the mapped arrays.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import shapely
+
+STORE = "transects.store"
+VERSION = 2
+COLUMNS = ("feature", "route", "chainage", "x0", "y0", "x1", "y1", "width", "id")
+NODE_SIZE = 16
+
+def _hilbert(x, y, order=16):
+    """Returns the index of each point along a Hilbert curve over the unit square, with 2**order cells a side."""
+    n = 1 << order
+    x = np.clip((x * (n - 1)).astype(np.int64), 0, n - 1)
+    y = np.clip((y * (n - 1)).astype(np.int64), 0, n - 1)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve continues in the next one
+        flip = ~ry
+        x, y = np.where(flip & rx, n - 1 - x, x), np.where(flip & rx, n - 1 - y, y)
+        x, y = np.where(flip, y, x), np.where(flip, x, y)
+        s >>= 1
+    return d
+
+def _union(boxes, node_size):
+    """Returns the bounding box of every run of node_size boxes."""
+    starts = np.arange(0, len(boxes), node_size)
+    return np.column_stack([np.minimum.reduceat(boxes[:, 0], starts), np.minimum.reduceat(boxes[:, 1], starts),
+                            np.maximum.reduceat(boxes[:, 2], starts), np.maximum.reduceat(boxes[:, 3], starts)])
+
+#Packed R-tree
+def pack_rtree(boxes, node_size=NODE_SIZE):
+    """
+    Packs an R-tree over the boxes, whose leaves are runs of node_size consecutive boxes.
+
+    Parameters
+    ----------
+    boxes (ndarray): (xmin, ymin, xmax, ymax) of every item, in storage order
+    node_size (int): Number of children of every node. The default is 16.
+
+    Returns
+    -------
+    tree (ndarray): Boxes of the nodes, level by level from the leaves up to the root.
+    levels (ndarray): Offset of every level in tree, and the end of the last one.
+    leaf_order (ndarray): Leaf of every position of the first level; leaf i holds the items
+        i * node_size to (i + 1) * node_size.
+
+    """
+    leaves = _union(boxes, node_size) if len(boxes) else np.empty((0, 4))
+    if len(leaves):
+        low, high = leaves[:, :2].min(axis=0), leaves[:, 2:].max(axis=0)
+        centre = ((leaves[:, :2] + leaves[:, 2:]) / 2 - low) / np.maximum(high - low, 1e-12)
+        leaf_order = np.argsort(_hilbert(centre[:, 0], centre[:, 1]), kind="stable")
+    else:
+        leaf_order = np.empty(0, dtype=np.int64)
+    level = leaves[leaf_order]
+    tree = [level]
+    while len(level) > 1:
+        level = _union(level, node_size)
+        tree.append(level)
+    levels = np.cumsum([0] + [len(level) for level in tree])
+    return np.concatenate(tree), levels, leaf_order
+
+def _feature_codes(perp, feature):
+    if feature is None:
+        return np.zeros(len(perp), dtype=np.int32), [0]
+    keys, codes = np.unique(perp[feature].to_numpy(), return_inverse=True)
+    return codes.astype(np.int32), keys.tolist()
+
+def _chainage(perp, centerline, midpoints):
+    """
+    Returns the route and chainage of every transect: the part of the centerline of its feature it lies on and
+    the distance along that part, from the route and chainage columns, or else measured by its midpoint on
+    the nearest part.
+    """
+    if "chainage" in perp.columns and "route" in perp.columns:
+        return perp["route"].to_numpy(dtype=np.int64), perp["chainage"].to_numpy(dtype=np.float64)
+    if centerline is None:
+        raise ValueError("The perpendicular lines have no chainage column, a centerline is needed")
+    lines = centerline.geometry.values
+    if "part" in perp.columns and "part" in centerline.columns:
+        position = {part: i for i, part in enumerate(centerline["part"].to_numpy())}
+        lines = lines[np.array([position[part] for part in perp["part"].to_numpy()], dtype=np.int64)]
+    elif len(centerline) == 1:
+        lines = np.repeat(lines, len(perp))
+    else:
+        raise ValueError("The centerline has several features but no part column to match the transects with")
+    # Every part of the centerline of each transect, the nearest of which it is measured along
+    counts = shapely.get_num_geometries(lines)
+    pair = np.repeat(np.arange(len(lines)), counts)
+    route = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    parts = shapely.get_geometry(lines[pair], route)
+    distance = shapely.distance(parts, midpoints[pair])
+    order = np.lexsort((distance, pair))
+    nearest = order[np.searchsorted(pair[order], np.arange(len(lines)))]
+    # Routes are numbered from the longest part, as create_perp numbers them
+    rank = np.empty_like(route)
+    rank[np.lexsort((-shapely.length(parts), pair))] = route
+    return rank[nearest], shapely.line_locate_point(parts[nearest], midpoints)
+
+#Builds the columns of the store
+def build(perp, centerline=None, feature=None, node_size=NODE_SIZE):
+    """
+    Returns the columns, R-tree and metadata of a store of the perpendicular lines.
+
+    Parameters
+    ----------
+    perp (GeoDataFrame): The perpendicular lines, as returned by create_perp
+    centerline (GeoDataFrame): The centerline the lines were placed on, to measure their chainage, matched by
+        the part column if there is one. Not needed if perp has route and chainage columns. The default is None.
+    feature (str): Column of perp grouping the transects, like a road name. The default is "part" if perp
+        has it, or else a single feature.
+    node_size (int): Number of children of every R-tree node. The default is 16.
+
+    Returns
+    -------
+    arrays (dict): Every column of COLUMNS and the tree, levels, leaf_order and offsets arrays
+    meta (dict): Version, length, CRS, feature column, feature keys and node size
+
+    Raises
+    ------
+    ValueError
+        If the chainage cannot be measured.
+
+    """
+    if feature is None and "part" in perp.columns:
+        feature = "part"
+    geoms = perp.geometry.values
+    codes, keys = _feature_codes(perp, feature)
+    route, chainage = _chainage(perp, centerline, shapely.line_interpolate_point(geoms, 0.5, normalized=True))
+    coords, index = shapely.get_coordinates(geoms, return_index=True)
+    first = np.searchsorted(index, np.arange(len(geoms)))
+    last = np.searchsorted(index, np.arange(len(geoms)), side="right") - 1
+
+    order = np.lexsort((chainage, route, codes))
+    arrays = {"feature": codes[order], "route": route[order].astype(np.int32), "chainage": chainage[order],
+              "x0": coords[first[order], 0], "y0": coords[first[order], 1],
+              "x1": coords[last[order], 0], "y1": coords[last[order], 1],
+              "width": perp["width"].to_numpy(dtype=np.float64)[order] if "width" in perp.columns
+              else shapely.length(geoms[order]),
+              "id": perp["id"].to_numpy(dtype=np.int64)[order] if "id" in perp.columns else order.astype(np.int64)}
+    arrays["offsets"] = np.searchsorted(arrays["feature"], np.arange(len(keys) + 1)).astype(np.int64)
+    arrays["tree"], arrays["levels"], arrays["leaf_order"] = pack_rtree(shapely.bounds(geoms[order]), node_size)
+    meta = {"version": VERSION, "length": len(perp), "crs": perp.crs.to_wkt() if perp.crs is not None else None,
+            "feature_column": feature, "features": keys, "node_size": node_size}
+    return arrays, meta
+
+#Writes a store
+def write(path, perp, centerline=None, feature=None, node_size=NODE_SIZE):
+    """
+    Writes a store of the perpendicular lines to the directory path, replacing the store there, and returns
+    it opened. See build for the parameters.
+    """
+    arrays, meta = build(perp, centerline, feature, node_size)
+    partial = path + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for name, values in arrays.items():
+        np.save(os.path.join(partial, f"{name}.npy"), values)
+    with open(os.path.join(partial, "meta.json"), "w") as file:
+        json.dump(meta, file)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(partial, path)
+    return TransectStore(path)
+
+class TransectStore:
+    """
+    A store written by write, with its arrays memory-mapped. Queries return row slices or indices of the rows,
+    whose columns are read with column.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as file:
+            self.meta = json.load(file)
+        if self.meta.get("version") != VERSION:
+            raise ValueError(f"Unsupported store version: {self.meta.get('version')}")
+        self.path = path
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                       for name in COLUMNS + ("offsets", "tree", "levels", "leaf_order")}
+        self.codes = {key: code for code, key in enumerate(self.meta["features"])}
+
+    def __len__(self):
+        return self.meta["length"]
+
+    @property
+    def features(self):
+        return self.meta["features"]
+
+    def column(self, name, rows=slice(None)):
+        """Returns a column at the given rows, a view of the mapped array for a slice."""
+        return self.arrays[name][rows]
+
+    def rows(self, feature):
+        """Returns the slice of the rows of a feature."""
+        if feature not in self.codes:
+            raise KeyError(feature)
+        code = self.codes[feature]
+        offsets = self.arrays["offsets"]
+        return slice(int(offsets[code]), int(offsets[code + 1]))
+
+    #Chainage range query
+    def range(self, feature, start=-np.inf, end=np.inf, route=0):
+        """
+        Returns the slice of the rows of a route of a feature whose chainage is between start and end. Route 0 is
+        the longest part of the centerline of the feature.
+        """
+        rows = self.rows(feature)
+        routes = self.arrays["route"][rows]
+        rows = slice(rows.start + int(np.searchsorted(routes, route, side="left")),
+                     rows.start + int(np.searchsorted(routes, route, side="right")))
+        chainage = self.arrays["chainage"][rows]
+        return slice(rows.start + int(np.searchsorted(chainage, start, side="left")),
+                     rows.start + int(np.searchsorted(chainage, end, side="right")))
+
+    def min_width(self, feature, start=-np.inf, end=np.inf, route=0):
+        """Returns the chainage and width of the narrowest transect of a route between start and end, or None."""
+        rows = self.range(feature, start, end, route)
+        if rows.start == rows.stop:
+            return None
+        width = self.arrays["width"][rows]
+        i = rows.start + int(np.argmin(width))
+        return float(self.arrays["chainage"][i]), float(self.arrays["width"][i])
+
+    #Window query
+    def window(self, xmin, ymin, xmax, ymax):
+        """Returns the sorted indices of the rows whose transect intersects the window."""
+        tree, levels, node_size = self.arrays["tree"], self.arrays["levels"], self.meta["node_size"]
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(levels[-1] - levels[-2])
+        for level in range(len(levels) - 2, -1, -1):
+            boxes = tree[levels[level] + nodes]
+            nodes = nodes[(boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)]
+            if level > 0:
+                nodes = (nodes[:, None] * node_size + np.arange(node_size)).ravel()
+                nodes = nodes[nodes < levels[level] - levels[level - 1]]
+        rows = (self.arrays["leaf_order"][nodes][:, None] * node_size + np.arange(node_size)).ravel()
+        rows = np.sort(rows[rows < len(self)])
+        return rows[_clip_segments(*(self.arrays[name][rows] for name in ("x0", "y0", "x1", "y1")),
+                                   xmin, ymin, xmax, ymax)]
+
+    def to_geodataframe(self, rows=slice(None)):
+        """Returns the transects at the given rows as a GeoDataFrame of two-point lines."""
+        import geopandas as gpd
+        columns = {name: np.asarray(self.arrays[name][rows]) for name in COLUMNS}
+        lines = shapely.linestrings(np.stack([np.column_stack([columns["x0"], columns["y0"]]),
+                                              np.column_stack([columns["x1"], columns["y1"]])], axis=1))
+        keys = np.array(self.features, dtype=object)[columns.pop("feature")]
+        data = {self.meta["feature_column"] or "feature": keys, **{name: columns[name] for name in ("id", "route", "chainage", "width")}}
+        return gpd.GeoDataFrame(data, geometry=lines, crs=self.meta["crs"])
+
+def _clip_segments(x0, y0, x1, y1, xmin, ymin, xmax, ymax):
+    """Returns whether each segment intersects the box (Liang-Barsky)."""
+    dx, dy = x1 - x0, y1 - y0
+    low, high = np.zeros(len(x0)), np.ones(len(x0))
+    outside = np.zeros(len(x0), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            outside |= (p == 0) & (q < 0)
+            ratio = q / p
+            low = np.where(p < 0, np.maximum(low, ratio), low)
+            high = np.where(p > 0, np.minimum(high, ratio), high)
+    return ~outside & (low <= high)
+
+#Builds a store from the outputs of a run
+def build_outputs(out_dir, feature=None):
+    """Writes out_dir/transects.store from the perpendicular lines and centerline written to out_dir, in any format."""
+    import geopandas as gpd
+    import output
+    for fmt in output.FORMATS:
+        paths = output.output_paths(out_dir, fmt)
+        if os.path.exists(paths["perp"]):
+            read = gpd.read_parquet if fmt == "parquet" else gpd.read_file
+            layer = {} if fmt in ("shp", "parquet", "fgb") else {"layer": "perp"}
+            perp = read(paths["perp"], **layer)
+            centerline = read(paths["centerline"], **({} if not layer else {"layer": "centerline"}))
+            return write(os.path.join(out_dir, STORE), perp, centerline, feature)
+    raise FileNotFoundError(f"No perpendicular lines in {out_dir}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Builds and queries the transect store of a run.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build the store from the outputs in a directory")
+    build_parser.add_argument("output_dir")
+    build_parser.add_argument("--feature", help="column grouping the transects (default: part, if any)")
+    query = commands.add_parser("query", help="query a store")
+    query.add_argument("store")
+    query.add_argument("--feature", help="feature of a chainage query")
+    query.add_argument("--route", type=int, default=0, help="route of a chainage query (default: 0, the longest)")
+    query.add_argument("--chainage", type=float, nargs=2, metavar=("START", "END"), help="chainage range")
+    query.add_argument("--window", type=float, nargs=4, metavar=("XMIN", "YMIN", "XMAX", "YMAX"), help="window")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "build":
+        store = build_outputs(args.output_dir, args.feature)
+        print(f"{store.path}: {len(store)} transects, {len(store.features)} features")
+        return
+    store = TransectStore(args.store)
+    if args.window:
+        rows = store.window(*args.window)
+        widths = store.column("width", rows)
+        print(f"{len(rows)} transects" + (f", width {widths.min():.2f} to {widths.max():.2f}" if len(rows) else ""))
+    else:
+        feature = args.feature if args.feature is not None else store.features[0]
+        if feature not in store.codes and str(feature).lstrip("-").isdigit():
+            feature = int(feature)
+        start, end = args.chainage or (-np.inf, np.inf)
+        rows = store.range(feature, start, end, args.route)
+        narrowest = store.min_width(feature, start, end, args.route)
+        print(f"{rows.stop - rows.start} transects" + (f", narrowest {narrowest[1]:.2f} at chainage {narrowest[0]:.1f}"
+                                                      if narrowest else ""))
+
+if __name__ == "__main__":
+    main()
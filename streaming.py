@@ -0,0 +1,103 @@
+"""
+Streaming mode for layers larger than memory. Features are read in bounded batches, each batch is pushed
+through reproject, smoothing, centerline and perpendicular lines, and the results are appended to the
+output layers, so that peak memory depends on the batch size rather than on the size of the layer.
+
+Parts are only formed within a batch: a component that spans two batches is processed as two parts. With
+target_epsg="utm", the zone is picked once from the bounds of the whole layer, as every batch is appended to
+the same layers.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import shapely
+import centerperp as cp
+import output
+import pipeline
+import profiling
+import reproject
+
+#Reads the layer in batches
+def read_batches(input_file, batch_size=10000):
+    """Yields GeoDataFrames of at most batch_size features."""
+    import pyogrio
+    total = pyogrio.read_info(input_file, force_feature_count=True)["features"]
+    for start in range(0, total, batch_size):
+        yield pyogrio.read_dataframe(input_file, skip_features=start, max_features=batch_size)
+
+def layer_target_crs(input_file, target_epsg=32651):
+    """Returns the EPSG code the layer is processed in, see reproject.target_crs, from its bounds without reading it."""
+    import pyogrio
+    if target_epsg != "utm":
+        return target_epsg
+    info = pyogrio.read_info(input_file, force_total_bounds=True)
+    if info["crs"] is None:
+        raise ValueError("Cannot transform naive geometries. Please set a crs on the object first.")
+    if info["total_bounds"] is None or not info["features"]:
+        return target_epsg
+    return int(reproject.utm_epsg([shapely.box(*info["total_bounds"])], info["crs"])[0])
+
+#Processes the layer batch by batch
+def stream_file(input_file, out_dir, batch_size=10000, fmt="gpkg", split="components", workers=None, chunksize=1,
+                remove_intersect=False, thin=False, profiler=None, **params):
+    """
+    Processes the layer in batches and appends the results to the output layers.
+
+    Parameters
+    ----------
+    input_file (str): Path of the polygon layer
+    out_dir (str): Directory the output layers are written to
+    batch_size (int): Number of features read at a time. The default is 10000.
+    fmt (str): "gpkg" or "fgb", see output.py. The default is "gpkg".
+    split, workers, chunksize: See pipeline.process. The process pool is shared by all batches.
+    remove_intersect, thin (bool): Remove intersecting perpendicular lines within each batch, see remove_intersect.
+    profiler (StageProfiler): Records every stage, summed over the batches, see profiling.py. The default is None.
+    params: Parameters of pipeline.process. A target_epsg of "utm" is resolved from the whole layer, unless
+        to_source processes every part in its own zone.
+
+    Returns
+    -------
+    count (int): Number of perpendicular lines written.
+
+    """
+    if fmt not in output.APPENDABLE:
+        raise ValueError(f"Cannot stream to the {fmt} format")
+    if not params.get("to_source"):
+        params["target_epsg"] = layer_target_crs(input_file, params.get("target_epsg", 32651))
+    paths = output.output_paths(out_dir, fmt)
+    os.makedirs(out_dir, exist_ok=True)
+    for path in set(paths.values()):
+        if os.path.exists(path):
+            os.remove(path)
+
+    executor = ProcessPoolExecutor(max_workers=workers) if split and workers != 1 else None
+    part_offset = count = 0
+    written = set()
+    try:
+        batches = read_batches(input_file, batch_size)
+        while (batch := profiling.run(profiler, "read", next, batches, None)) is not None:
+            outputs = pipeline.process(batch, **params, split=split, workers=workers, chunksize=chunksize, executor=executor,
+                                       profiler=profiler)
+            simplify_poly, centerline, perp_lines = outputs
+            if remove_intersect or thin:
+                perp_lines = profiling.run(profiler, "remove_intersect", cp.remove_intersect, perp_lines, thin=thin)
+
+            # Keep the part and id numbering continuous across batches
+            if "part" in perp_lines:
+                simplify_poly["part"] += part_offset
+                centerline["part"] += part_offset
+                perp_lines["part"] += part_offset
+            perp_lines["id"] = range(count, count + len(perp_lines))
+            part_offset += len(centerline)
+            count += len(perp_lines)
+
+            for layer, gdf in zip(output.LAYERS, (simplify_poly, centerline, perp_lines)):
+                if gdf.empty:
+                    continue
+                profiling.run(profiler, "write", output.write_layer, gdf, paths[layer], layer, fmt,
+                              append=layer in written, promote_to_multi=True)
+                written.add(layer)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return count
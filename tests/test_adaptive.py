@@ -0,0 +1,24 @@
+import numpy as np
+import shapely
+import geopandas as gpd
+import adaptive
+import centerperp as cp
+
+def turning(line):
+    """Total absolute turn of a line in degrees; a zigzag along the line inflates it."""
+    coords = shapely.get_coordinates(line)
+    heading = np.arctan2(*np.diff(coords, axis=0)[:, ::-1].T)
+    return np.degrees(np.abs((np.diff(heading) + np.pi) % (2 * np.pi) - np.pi)).sum()
+
+def test_auto_centerline_follows_the_fixed_one_without_zigzag():
+    x = np.arange(0, 405, 5.0)
+    polygon = shapely.LineString(np.column_stack([x, 50 * np.sin(2 * np.pi * x / 200)])).buffer(5, cap_style="flat")
+    gdf = gpd.GeoDataFrame(geometry=[polygon], crs=32651)
+    fixed = cp.create_centerline(gdf).geometry.values[0]
+    auto = cp.create_centerline(gdf, "auto")
+    np.testing.assert_allclose(auto["tole"], auto["dense"] * adaptive.TOLE_FRACTION)
+    auto = auto.geometry.values[0]
+    assert shapely.hausdorff_distance(auto, fixed) < 1
+    assert shapely.get_num_coordinates(auto) < shapely.get_num_coordinates(fixed) / 2
+    # The bends of the corridor, not the staircase of the coarse skeleton
+    assert turning(auto) < 1.1 * turning(fixed)
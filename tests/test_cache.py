@@ -0,0 +1,54 @@
+import itertools
+import os
+import subprocess
+import sys
+import types
+import shapely
+import cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROAD = shapely.box(0, 0, 100, 10)
+
+def test_hits_are_keyed_on_geometry_and_parameters(tmp_path):
+    centerlines = cache.CenterlineCache(str(tmp_path / "cache.sqlite"))
+    first = centerlines.centerline([ROAD], 1, 0.01)[0]
+    assert centerlines.centerline([ROAD], 1, 0.01)[0].equals(first)
+    assert centerlines.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": len(shapely.to_wkb(first))}
+    # Another dense, tole or geometry is another entry
+    centerlines.centerline([ROAD], 2, 0.01)
+    centerlines.centerline([ROAD], 1, 0.1)
+    centerlines.centerline([shapely.box(0, 0, 100, 12)], 1, 0.01)
+    stats = centerlines.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 4)
+    centerlines.close()
+
+def cached_keys(centerlines):
+    """Returns the keys in the cache, without marking them as used."""
+    return sorted(key for key, in centerlines.connection.execute("SELECT key FROM centerlines"))
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    centerlines = cache.CenterlineCache(str(tmp_path / "cache.sqlite"), max_bytes=300)
+    for key in "abc":
+        centerlines.put([key], [b"x" * 100])
+    assert centerlines.get(["a"]) == [b"x" * 100]
+    # Over the limit: b is the least recently used
+    centerlines.put(["d"], [b"x" * 100])
+    assert cached_keys(centerlines) == ["a", "c", "d"]
+    # Then a and d, as c was read since
+    centerlines.get(["c"])
+    centerlines.put(["e"], [b"x" * 150])
+    assert cached_keys(centerlines) == ["c", "e"]
+    assert centerlines.stats()["bytes"] == 250
+    centerlines.close()
+
+def test_cache_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    code = f"import shapely, cache; cache.open_cache({path!r}).centerline([shapely.box(0, 0, 100, 10)], 1, 0.01)"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    centerlines = cache.open_cache(path)
+    assert centerlines.stats()["entries"] == 1
+    centerlines.centerline([ROAD], 1, 0.01)
+    stats = centerlines.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
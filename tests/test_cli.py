@@ -0,0 +1,63 @@
+import os
+import pytest
+import cli
+
+def touch(*paths):
+    for path in paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+
+def test_output_dirs_are_unique(tmp_path):
+    inputs = [str(tmp_path / "a" / "road.gpkg"), str(tmp_path / "a" / "road.shp"), str(tmp_path / "b" / "road.gpkg")]
+    touch(*inputs)
+    found = cli.find_inputs([str(tmp_path / "*" / "road.*")])
+    assert list(found) == inputs and set(found.values()) == {str(tmp_path)}
+    dirs = [cli.output_dir(path, "out", root) for path, root in found.items()]
+    assert dirs == [os.path.join("out", "a", "road.gpkg"), os.path.join("out", "a", "road.shp"),
+                    os.path.join("out", "b", "road.gpkg")]
+    assert cli.output_dir(inputs[0], "out") == os.path.join("out", "road.gpkg")
+
+def test_output_dir_does_not_depend_on_the_other_inputs(tmp_path):
+    road, other = str(tmp_path / "a" / "road.gpkg"), str(tmp_path / "b" / "c" / "other.gpkg")
+    touch(road, other)
+    alone = cli.find_inputs([road])
+    together = cli.find_inputs([road, other])
+    assert cli.output_dir(road, "out", alone[road]) == cli.output_dir(road, "out", together[road]) \
+        == os.path.join("out", "road.gpkg")
+    # A directory places its files relative to itself, whatever else is given
+    for patterns in ([str(tmp_path / "a")], [str(tmp_path / "a"), other]):
+        assert cli.find_inputs(patterns)[road] == str(tmp_path / "a")
+
+def test_shared_outputs_are_refused(tmp_path):
+    inputs = [str(tmp_path / "a" / "road.gpkg"), str(tmp_path / "b" / "road.gpkg")]
+    touch(*inputs)
+    with pytest.raises(SystemExit) as exit:
+        cli.main(inputs + ["-o", str(tmp_path / "out")])
+    assert "would share their outputs" in str(exit.value.code)
+    assert not os.path.exists(tmp_path / "out")
+
+@pytest.mark.parametrize("flags, refused", [(["--incremental", "--format", "shp"], "--format"),
+                                            (["--incremental", "--store"], "--store"),
+                                            (["--incremental", "--report"], "--report"),
+                                            (["--incremental", "--batch-size", "10"], "--batch-size"),
+                                            (["--batch-size", "10", "--format", "shp"], "--format"),
+                                            (["--batch-size", "10", "--store"], "--store")])
+def test_unsupported_options_are_refused(flags, refused, capsys):
+    with pytest.raises(SystemExit) as exit:
+        cli.parse_args(["road.gpkg", "-o", "out"] + flags)
+    assert exit.value.code == 2
+    assert refused in capsys.readouterr().err
+
+def test_default_format():
+    assert cli.parse_args(["road.gpkg", "-o", "out"]).format == "shp"
+    assert cli.parse_args(["road.gpkg", "-o", "out", "--incremental"]).format == "gpkg"
+    assert cli.parse_args(["road.gpkg", "-o", "out", "--batch-size", "10"]).format == "gpkg"
+    assert cli.parse_args(["road.gpkg", "-o", "out", "--batch-size", "10", "--format", "fgb"]).format == "fgb"
+
+def test_failed_input_is_reported(tmp_path, capsys):
+    bad = tmp_path / "bad.gpkg"
+    bad.write_text("not a GeoPackage")
+    with pytest.raises(SystemExit) as exit:
+        cli.main([str(bad), "-o", str(tmp_path / "out")])
+    assert exit.value.code == 1
+    assert f"1 of 1 inputs failed:\n  {bad}: " in capsys.readouterr().out
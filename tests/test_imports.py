@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("geopandas", "pygeoops", "pyogrio", "pyproj", "matplotlib")
+
+@pytest.mark.parametrize("module", ["main", "pipeline", "transects"])
+def test_import_does_not_load_heavy_modules(module):
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, check=True)
+    assert result.stdout.split() == []
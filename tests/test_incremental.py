@@ -0,0 +1,74 @@
+import shapely
+import geopandas as gpd
+import pandas as pd
+import incremental
+
+def corridors(lons):
+    # 300 m long and 10 m wide, near the equator
+    return gpd.GeoDataFrame(geometry=[shapely.box(lon, 0, lon + 0.0027, 0.00009) for lon in lons], crs=4326)
+
+def test_utm_zone_change_rewrites_the_outputs(tmp_path):
+    first = corridors([121.0, 121.01])
+    assert incremental.update(first, tmp_path, target_epsg="utm", dense="auto") == \
+        {"added": 2, "removed": 0, "unchanged": 0}
+    assert incremental.load_manifest(tmp_path)["crs"] == "EPSG:32651"
+    assert incremental.update(first, tmp_path, target_epsg="utm", dense="auto")["added"] == 0
+
+    # The centre of the bounds moves to zone 50, so every component is recomputed in it
+    moved = pd.concat([first, corridors([109.0])], ignore_index=True)
+    assert incremental.update(moved, tmp_path, target_epsg="utm", dense="auto") == \
+        {"added": 3, "removed": 2, "unchanged": 0}
+    assert incremental.load_manifest(tmp_path)["crs"] == "EPSG:32650"
+    perp = gpd.read_file(tmp_path / "outputs.gpkg", layer="perp")
+    assert perp.crs.to_epsg() == 32650
+    assert sorted(perp["part"].unique()) == [0, 1, 2]
+
+def boxes(xs, width=10):
+    # 300 m long corridors, far enough apart to be separate components
+    return gpd.GeoDataFrame({"name": [f"road {x}" for x in xs]},
+                            geometry=[shapely.box(x, 0, x + 300, width) for x in xs], crs=32651)
+
+def read_layers(path):
+    return {layer: gpd.read_file(path, layer=layer) for layer in incremental.output.LAYERS}
+
+def rows(layers, components):
+    return {layer: gdf[gdf["component"].isin(components)].sort_values(["component", "id" if "id" in gdf else "part"])
+            .reset_index(drop=True) for layer, gdf in layers.items()}
+
+def test_only_changed_components_are_recomputed(tmp_path):
+    layer = boxes([0, 1000, 2000])
+    assert incremental.update(layer, tmp_path, workers=1, dense=1) == {"added": 3, "removed": 0, "unchanged": 0}
+    before = read_layers(tmp_path / "outputs.gpkg")
+    keys = set(before["perp"]["component"])
+    assert len(keys) == 3
+
+    # Edit one feature: its component is replaced, the rows of the others are left as they are
+    edited = pd.concat([layer.iloc[:2], boxes([2000], width=14)], ignore_index=True)
+    assert incremental.update(edited, tmp_path, workers=1, dense=1) == {"added": 1, "removed": 1, "unchanged": 2}
+    after = read_layers(tmp_path / "outputs.gpkg")
+    new_keys = set(after["perp"]["component"])
+    kept = keys & new_keys
+    assert len(kept) == 2 and len(new_keys - keys) == 1
+    for layer_name, gdf in rows(before, kept).items():
+        pd.testing.assert_frame_equal(rows(after, kept)[layer_name], gdf)
+    # The recomputed rows are numbered after those of the first run
+    changed = after["perp"][~after["perp"]["component"].isin(kept)]
+    assert changed["id"].min() > before["perp"]["id"].max()
+    old = before["perp"][~before["perp"]["component"].isin(kept)]
+    assert changed["width"].median() > old["width"].median() + 3
+
+    # Add a feature
+    grown = pd.concat([edited, boxes([3000])], ignore_index=True)
+    assert incremental.update(grown, tmp_path, workers=1, dense=1) == {"added": 1, "removed": 0, "unchanged": 3}
+    assert read_layers(tmp_path / "outputs.gpkg")["simplified_polygon"]["component"].nunique() == 4
+
+    # Remove one: its rows are deleted without recomputing anything
+    shrunk = grown.drop(index=0).reset_index(drop=True)
+    assert incremental.update(shrunk, tmp_path, workers=1, dense=1) == {"added": 0, "removed": 1, "unchanged": 3}
+    final = read_layers(tmp_path / "outputs.gpkg")
+    removed_key = set(after["perp"]["component"]) - set(final["perp"]["component"])
+    assert len(removed_key) == 1
+    for gdf in final.values():
+        assert gdf["component"].nunique() == 3
+        assert not gdf["component"].isin(removed_key).any()
+    assert incremental.update(shrunk, tmp_path, workers=1, dense=1) == {"added": 0, "removed": 0, "unchanged": 3}
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import shapely
+import line_simplify
+
+def baseline_smooth(geom, buffer_distance, simplify_tolerance, resolution):
+    """The per-geometry smoothing of the original utils.smoothen."""
+    return (geom.buffer(buffer_distance, quad_segs=resolution).buffer(-buffer_distance, quad_segs=resolution)
+            .simplify(simplify_tolerance, preserve_topology=True))
+
+# A wavy road with a small hole, a little larger than the buffer closes but within the simplify tolerance
+ROAD = shapely.LineString(np.column_stack([np.arange(0, 200, 2.0), 10 * np.sin(np.arange(0, 200, 2.0) / 15)])).buffer(12)
+HOLE = shapely.Point(100, 10 * np.sin(100 / 15)).buffer(1.8, quad_segs=2)
+POLYGON = ROAD.difference(HOLE)
+
+@pytest.mark.parametrize("resolution", [16, 2])
+def test_smooth_matches_baseline(resolution):
+    expected = baseline_smooth(POLYGON, 0.5, 2, resolution)
+    smoothed = line_simplify.smooth([POLYGON], 0.5, 2, resolution)[0]
+    assert len(smoothed.interiors) == len(expected.interiors) == 1
+    assert shapely.equals_exact(smoothed, expected, 1e-9)
+
+def test_fast_path_is_opt_in():
+    smoothed = line_simplify.smooth([POLYGON, shapely.LineString([(0, 0), (1, 1)])], 0.5, 2, 16, preserve_topology=False)
+    assert smoothed[0].is_valid and not smoothed[0].is_empty
+    assert smoothed[1].equals(shapely.LineString([(0, 0), (1, 1)]))
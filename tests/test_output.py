@@ -0,0 +1,48 @@
+import os
+import pyogrio
+import pytest
+import shapely
+import geopandas as gpd
+import output
+
+FORMATS = ["shp", "gpkg", "fgb",
+           pytest.param("parquet", marks=pytest.mark.skipif(not output.USE_ARROW, reason="pyarrow is not installed"))]
+
+def layers():
+    polygons = [shapely.box(0, 0, 10, 2), shapely.MultiPolygon([shapely.box(20, 0, 30, 2), shapely.box(40, 0, 50, 2)])]
+    lines = [shapely.LineString([(0, 1), (10, 1)]), shapely.MultiLineString([[(20, 1), (30, 1)], [(40, 1), (50, 1)]])]
+    perp = [shapely.LineString([(x, 0), (x, 2)]) for x in (0, 5, 25)]
+    return {"simplified_polygon": gpd.GeoDataFrame({"name": ["a", "b"]}, geometry=polygons, crs=32651),
+            "centerline": gpd.GeoDataFrame({"part": [0, 1]}, geometry=lines, crs=32651),
+            "perp": gpd.GeoDataFrame({"width": [2.0, 2.5, 3.0]}, geometry=perp, crs=32651)}
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_outputs_read_back(tmp_path, fmt):
+    written = layers()
+    output.write_outputs(written, tmp_path, fmt)
+    paths = output.output_paths(tmp_path, fmt)
+    for layer, expected in written.items():
+        if fmt == "parquet":
+            gdf = gpd.read_parquet(paths[layer])
+        else:
+            gdf = gpd.read_file(paths[layer], layer=layer if fmt == "gpkg" else None)
+        # The spatial index of a FlatGeobuf file orders its features, so the rows are matched on their attribute
+        column = expected.columns[0]
+        gdf = gdf.sort_values(column, ignore_index=True)
+        assert gdf.crs == expected.crs
+        assert gdf[column].tolist() == expected[column].tolist()
+        assert all(shapely.equals(gdf.geometry.values, expected.geometry.values))
+        if fmt in output.APPENDABLE:
+            # The layers declare the Multi* type of all their rows, as streaming and incremental runs write them
+            info = pyogrio.read_info(paths[layer], layer=layer if fmt == "gpkg" else None)
+            assert info["geometry_type"] == ("MultiPolygon" if layer == "simplified_polygon" else "MultiLineString")
+    if fmt == "gpkg":
+        # The partial file is renamed into place
+        assert sorted(os.listdir(tmp_path)) == ["outputs.gpkg"]
+
+def test_partial_geopackage_is_replaced(tmp_path):
+    partial = tmp_path / "outputs.partial.gpkg"
+    partial.write_text("left over by an interrupted run")
+    output.write_outputs(layers(), tmp_path, "gpkg")
+    assert not partial.exists()
+    assert pyogrio.list_layers(tmp_path / "outputs.gpkg")[:, 0].tolist() == list(output.LAYERS)
@@ -0,0 +1,31 @@
+import numpy as np
+import shapely
+import geopandas as gpd
+import pipeline
+
+def layer():
+    # Three separate roads, a bent one and two straight ones, in the order of their components
+    bend = shapely.union(shapely.box(0, 0, 200, 10), shapely.box(190, 0, 200, 150))
+    return gpd.GeoDataFrame({"name": ["bend", "short", "long"]},
+                            geometry=[bend, shapely.box(400, 0, 500, 12), shapely.box(700, 0, 1000, 8)], crs=32651)
+
+def assert_same_outputs(outputs, expected):
+    for gdf, other in zip(outputs, expected):
+        assert len(gdf) == len(other)
+        assert all(shapely.equals(gdf.geometry.values, other.geometry.values))
+        for column in ("part", "id", "width", "route", "chainage"):
+            if column in other.columns:
+                np.testing.assert_array_equal(gdf[column], other[column])
+
+def test_split_outputs_do_not_depend_on_the_workers_or_the_split():
+    expected = pipeline.process(layer(), dense="auto", split="components", workers=1)
+    simplify_poly, centerline, perp_lines = expected
+    assert simplify_poly["part"].tolist() == centerline["part"].tolist() == [0, 1, 2]
+    assert sorted(perp_lines["part"].unique()) == [0, 1, 2]
+    np.testing.assert_array_equal(perp_lines["id"], np.arange(len(perp_lines)))
+    assert_same_outputs(pipeline.process(layer(), dense="auto", split="components", workers=2), expected)
+    for workers in (1, 2):
+        outputs = pipeline.process(layer(), dense="auto", split="features", workers=workers)
+        assert_same_outputs(outputs, expected)
+        # The features keep their attributes
+        assert outputs[0]["name"].tolist() == ["bend", "short", "long"]
@@ -0,0 +1,47 @@
+import sys
+import types
+import numpy as np
+import shapely
+import geopandas as gpd
+import pipeline
+import profiling
+
+def test_rss_growth_is_per_stage():
+    profiler = profiling.StageProfiler()
+    profiler.run("heavy", lambda: np.ones(20_000_000).sum())
+    profiler.run("light", lambda: None)
+    heavy, light = profiler.stages["heavy"], profiler.stages["light"]
+    assert heavy["rss_growth_mb"] > 100
+    assert light["rss_growth_mb"] < 10
+    assert light["max_rss_mb"] >= heavy["max_rss_mb"]
+
+def test_without_resource_or_psutil(monkeypatch):
+    monkeypatch.setattr(profiling, "resource", None)
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    profiler = profiling.StageProfiler()
+    profiler.run("stage", lambda: None)
+    record = profiler.stages["stage"]
+    assert record["children_cpu_s"] is None and record["children_max_rss_mb"] is None
+    assert record["max_rss_mb"] is None and record["rss_growth_mb"] is None
+    assert "n/a MB rss growth" in profiler.summary()[0]
+
+def test_psutil_fallback(monkeypatch):
+    # The peak working set, as psutil reports it on Windows, growing by 50 MB during the stage
+    peaks = iter([200e6, 250e6])
+    memory_info = lambda: types.SimpleNamespace(rss=100e6, peak_wset=next(peaks))
+    monkeypatch.setattr(profiling, "resource", None)
+    monkeypatch.setitem(sys.modules, "psutil", types.SimpleNamespace(Process=lambda: types.SimpleNamespace(memory_info=memory_info)))
+    profiler = profiling.StageProfiler()
+    profiler.run("stage", lambda: None)
+    record = profiler.stages["stage"]
+    assert record["max_rss_mb"] == 250 and record["rss_growth_mb"] == 50
+    assert record["children_max_rss_mb"] is None
+
+def test_transect_placement_and_clipping_are_separate_stages():
+    gdf = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 200, 10)], crs=32651)
+    profiler = profiling.StageProfiler()
+    pipeline.process(gdf, dense=1, target_epsg=32651, profiler=profiler)
+    assert list(profiler.stages) == ["dissolve", "reproject", "smoothen", "centerline", "stations", "clip"]
+    stations, clip = profiler.stages["stations"], profiler.stages["clip"]
+    assert stations["output_features"] == clip["input_features"] > 0
+    assert clip["output_features"] <= stations["output_features"]
@@ -0,0 +1,17 @@
+import numpy as np
+import shapely
+import geopandas as gpd
+import reproject
+
+def test_z_coordinates_are_kept_like_to_crs():
+    flat = shapely.box(121.0, 14.0, 121.01, 14.01)
+    raised = shapely.force_3d(shapely.box(121.02, 14.0, 121.03, 14.01), 35.0)
+    gdf = gpd.GeoDataFrame({"name": ["flat", "raised", "missing"]}, geometry=[flat, raised, None], crs=4326)
+    result = reproject.reproject_crs(gdf, 32651)
+    expected = gdf.to_crs(32651)
+    assert result.crs == expected.crs
+    assert list(shapely.has_z(result.geometry.values)) == [False, True, False]
+    assert result.geometry.values[2] is None
+    np.testing.assert_allclose(shapely.get_coordinates(result.geometry.values, include_z=True),
+                               shapely.get_coordinates(expected.geometry.values, include_z=True))
+    np.testing.assert_allclose(shapely.get_coordinates(result.geometry.values[1], include_z=True)[:, 2], 35.0)
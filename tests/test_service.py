@@ -0,0 +1,75 @@
+import os
+import signal
+import threading
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import shapely
+import service
+
+BOX = {"type": "Polygon", "coordinates": [list(shapely.box(121.0, 14.0, 121.003, 14.0001).exterior.coords)]}
+
+@pytest.fixture(scope="module")
+def server():
+    # A wide batch window so that the jobs are batched, and their parts chunked, together
+    server = service.Service(workers=1, batch_window=0.5, chunksize=4)
+    yield server
+    server.close()
+
+def test_bad_parameters_are_rejected():
+    for params in ({"interval": "bogus"}, {"dense": -1}, {"interval": [5, 1]}, {"target_epsg": 1}):
+        with pytest.raises(ValueError):
+            service.job_parameters({"params": params})
+    assert service.job_parameters({"params": {"interval": [1, 25]}})["interval"] == (1, 25)
+
+def test_failed_part_only_fails_its_job(server):
+    good = server.submit({"geojson": BOX})
+    rejected = server.submit({"geojson": BOX, "params": {"interval": "bogus"}})
+    # Passes the checks but fails in the worker, in the same chunk as the good job
+    broken = server.submit({"geojson": BOX, "params": {"distance": "bogus"}})
+    for job in (good, rejected, broken):
+        assert job.wait(timeout=60)
+    assert good.status == "done" and len(good.result["perp"]) > 0
+    assert rejected.status == "failed" and "Unsupported interval" in rejected.error
+    assert broken.status == "failed"
+
+def test_close_fails_unfinished_jobs():
+    # One part per chunk, so that most chunks are still queued for the single worker and are cancelled
+    server = service.Service(workers=1, batch_window=0.1, chunksize=1)
+    jobs = [server.submit({"geojson": BOX}) for _ in range(8)]
+    server.close()
+    for job in jobs:
+        assert job.wait(timeout=0)
+    assert any(job.status == "failed" for job in jobs)
+    assert server.submit({"geojson": BOX}).wait(timeout=0)
+
+def test_killed_worker_is_replaced():
+    server = service.Service(workers=1)
+    try:
+        os.kill(server.executor.submit(os.getpid).result(), signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool):
+            server.executor.submit(os.getpid).result()
+        job = server.submit({"geojson": BOX})
+        assert job.wait(timeout=60)
+        assert job.status == "done" and len(job.result["perp"]) > 0
+        assert server.metrics()["pool_restarts"] == 1
+    finally:
+        server.close()
+
+def test_slow_preparation_does_not_hold_up_other_jobs(server, monkeypatch):
+    release = threading.Event()
+    load_layer = service.load_layer
+
+    def slow_load_layer(payload):
+        if payload.get("slow"):
+            release.wait(60)
+        return load_layer(payload)
+
+    monkeypatch.setattr(service, "load_layer", slow_load_layer)
+    slow = server.submit({"geojson": BOX, "slow": True})
+    try:
+        fast = server.submit({"geojson": BOX})
+        assert fast.wait(timeout=60) and fast.status == "done"
+        assert slow.status == "queued"
+    finally:
+        release.set()
+    assert slow.wait(timeout=60) and slow.status == "done"
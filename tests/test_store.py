@@ -0,0 +1,79 @@
+import numpy as np
+import shapely
+from shapely import LineString, MultiLineString
+import geopandas as gpd
+import centerperp as cp
+import store
+
+# A main road with a branch off its middle, as a pruned centerline keeps them: two routes, the longest first
+CENTERLINE = MultiLineString([[(0, 0), (200, 0)], [(100, 0), (100, 80)]])
+
+def transects():
+    polygon = shapely.union(LineString([(0, 0), (200, 0)]).buffer(5, cap_style="square"),
+                            LineString([(100, 0), (100, 80)]).buffer(5, cap_style="flat"))
+    gdf_polygon = gpd.GeoDataFrame({"name": ["road"]}, geometry=[polygon], crs=32651)
+    centerline = gpd.GeoDataFrame(geometry=[CENTERLINE], crs=32651)
+    return cp.create_perp(gdf_polygon, centerline, 10, 10), centerline
+
+def test_create_perp_measures_chainage_per_route():
+    perp, _ = transects()
+    branch = perp[perp["route"] == 1]
+    assert sorted(perp["route"].unique()) == [0, 1]
+    # Along the branch, not along the main road joined to it
+    midpoints = shapely.line_interpolate_point(branch.geometry.values, 0.5, normalized=True)
+    np.testing.assert_allclose(branch["chainage"], shapely.get_coordinates(midpoints)[:, 1], atol=1e-6)
+
+def test_store_uses_routes():
+    perp, centerline = transects()
+    arrays, _ = store.build(perp)
+    np.testing.assert_allclose(np.sort(arrays["chainage"]), np.sort(perp["chainage"]))
+    # Without the columns, the midpoints are measured on the nearest part; the transect at the junction is
+    # clipped off its station, so its midpoint is half the road width away
+    measured, _ = store.build(perp.drop(columns=["route", "chainage"]), centerline)
+    np.testing.assert_array_equal(measured["route"], arrays["route"])
+    np.testing.assert_allclose(measured["chainage"], arrays["chainage"], atol=2.5 + 1e-6)
+
+def test_range_of_a_route(tmp_path):
+    perp, _ = transects()
+    transect_store = store.write(str(tmp_path / store.STORE), perp)
+    rows = transect_store.range(0, 20, 60, route=1)
+    assert (transect_store.column("route", rows) == 1).all()
+    np.testing.assert_allclose(transect_store.column("chainage", rows), [20, 30, 40, 50, 60])
+    assert transect_store.range(0, route=0).stop - transect_store.range(0, route=0).start == (perp["route"] == 0).sum()
+
+def test_adaptive_routes_of_a_multipart_centerline():
+    # Three separate roads, not in order of length, with adaptive spacing
+    parts = [LineString([(0, y), (length, y)]) for y, length in ((0, 60), (100, 150), (200, 100))]
+    polygon = shapely.union_all([part.buffer(5, cap_style="square") for part in parts])
+    gdf_polygon = gpd.GeoDataFrame({"name": ["road"]}, geometry=[polygon], crs=32651)
+    centerline = gpd.GeoDataFrame(geometry=[MultiLineString(parts)], crs=32651)
+    perp = cp.create_perp(gdf_polygon, centerline, 10, "auto")
+    measured, _ = store.build(perp.drop(columns=["route", "chainage"]), centerline)
+    np.testing.assert_array_equal(measured["route"], store.build(perp)[0]["route"])
+    midpoints = shapely.get_coordinates(shapely.line_interpolate_point(perp.geometry.values, 0.5, normalized=True))
+    # Routes are ranked by length: the 150 m road first, then the 100 m and the 60 m one
+    np.testing.assert_array_equal(perp["route"], np.select([midpoints[:, 1] == 100, midpoints[:, 1] == 200], [0, 1], 2))
+    assert perp.groupby("route")["chainage"].min().tolist() == [0, 0, 0]
+    # The last station is within the largest spacing of the end of its road
+    last = perp.groupby("route")["chainage"].max().to_numpy()
+    assert ((last <= [150, 100, 60]) & (last > np.array([150, 100, 60]) - 25)).all()
+
+def test_window_matches_brute_force(tmp_path):
+    # Random transects, enough for three levels of the R-tree with small nodes
+    rng = np.random.default_rng(0)
+    start = rng.uniform(0, 1000, (500, 2))
+    end = start + rng.uniform(-30, 30, (500, 2))
+    lines = shapely.linestrings(np.stack([start, end], axis=1))
+    perp = gpd.GeoDataFrame({"route": np.zeros(500, dtype=np.int64), "chainage": np.arange(500.0)},
+                            geometry=lines, crs=32651)
+    transect_store = store.write(str(tmp_path / store.STORE), perp, node_size=4)
+    geoms = transect_store.to_geodataframe().geometry.values
+    x, y = start[0]
+    windows = [(100, 100, 300, 250), (0, 0, 1000, 1000), (-50, -50, 1050, 1050), (400, 400, 400.5, 400.5),
+               # Empty, with an edge through the start of a transect, and with a corner on it
+               (2000, 2000, 2100, 2100), (x, y - 10, x + 5, y + 10), (x - 5, y - 5, x, y)]
+    for window in windows:
+        expected = np.flatnonzero(shapely.intersects(geoms, shapely.box(*window)))
+        np.testing.assert_array_equal(transect_store.window(*window), expected)
+    assert len(transect_store.window(2000, 2000, 2100, 2100)) == 0
+    assert len(transect_store.window(x - 5, y - 5, x, y)) > 0
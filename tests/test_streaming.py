@@ -0,0 +1,14 @@
+import numpy as np
+import shapely
+import geopandas as gpd
+import streaming
+
+def test_utm_zone_is_picked_for_the_whole_layer(tmp_path):
+    # 300 m long and 10 m wide corridors in zones 51 and 49, read one at a time
+    layer = gpd.GeoDataFrame(geometry=[shapely.box(lon, 0, lon + 0.0027, 0.00009) for lon in (121.0, 109.0)], crs=4326)
+    layer.to_file(tmp_path / "zones.gpkg")
+    streaming.stream_file(str(tmp_path / "zones.gpkg"), str(tmp_path / "out"), batch_size=1, target_epsg="utm",
+                          dense="auto")
+    polygons = gpd.read_file(tmp_path / "out" / "outputs.gpkg", layer="simplified_polygon")
+    assert polygons.crs.to_epsg() == 32650
+    np.testing.assert_allclose(polygons.to_crs(4326).geometry.bounds["minx"], [121.0, 109.0], atol=1e-3)
@@ -0,0 +1,38 @@
+import numpy as np
+import shapely
+import geopandas as gpd
+import adaptive
+import centerperp as cp
+import tiling
+
+def test_auto_parameters_are_reported():
+    polygons = [shapely.LineString([(0, 0), (1500, 40)]).buffer(6, cap_style="flat"), shapely.box(0, 100, 200, 120)]
+    gdf = gpd.GeoDataFrame(geometry=polygons, crs=32651)
+    lines = tiling.create_centerline(gdf, "auto", tile_size=500, overlap=100)
+    dense, tole = adaptive.centerline_parameters(gdf.geometry.values)
+    assert list(lines.columns) == ["dense", "tole", "geometry"]
+    np.testing.assert_allclose(lines["dense"], dense)
+    np.testing.assert_allclose(lines["tole"], tole)
+    assert lines.geometry.length.iloc[0] > 1400
+
+def test_fixed_parameters_keep_the_geometry_only():
+    gdf = gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 200, 10)], crs=32651)
+    assert list(tiling.create_centerline(gdf, 0.5, 0.005, tile_size=100, overlap=50).columns) == ["geometry"]
+
+def test_tiled_centerline_matches_untiled():
+    # A 2 km winding corridor, 10 m wide, in five tiles
+    x = np.arange(0, 2005, 5.0)
+    polygon = shapely.LineString(np.column_stack([x, 40 * np.sin(2 * np.pi * x / 400)])).buffer(5, cap_style="flat")
+    gdf = gpd.GeoDataFrame(geometry=[polygon], crs=32651)
+    untiled = cp.create_centerline(gdf, 2, 0.01).geometry.values[0]
+    tiled = tiling.create_centerline(gdf, 2, 0.01, tile_size=500, overlap=150).geometry.values[0]
+    assert shapely.hausdorff_distance(tiled, untiled) < 0.5
+    assert abs(tiled.length - untiled.length) < 0.001 * untiled.length
+
+    # The pieces are merged into one line that crosses every seam once
+    assert tiled.geom_type == "LineString"
+    _, _, seams = tiling.tile_windows(polygon.bounds, 500, 150)
+    assert len(seams) == 4
+    for seam in seams:
+        crossing = shapely.intersection(tiled, shapely.LineString([(seam, -100), (seam, 100)]))
+        assert crossing.geom_type == "Point"
@@ -0,0 +1,51 @@
+import numpy as np
+import shapely
+from shapely.geometry import LineString, MultiLineString
+import topology
+
+def corridor(*lines, width=10):
+    return shapely.union_all([line.buffer(width / 2) for line in lines])
+
+def test_short_spur_is_pruned_and_the_rest_merged():
+    # The main line is split at the junction of a 3 m spur, in a 10 m wide polygon
+    line = MultiLineString([[(0, 0), (50, 0)], [(50, 0), (50, 3)], [(100, 0), (50, 0)]])
+    routes, removed = topology.routes(line, corridor(LineString([(0, 0), (100, 0)])))
+    assert routes.geom_type == "LineString"
+    np.testing.assert_allclose(shapely.get_coordinates(routes), [[0, 0], [50, 0], [100, 0]])
+    assert removed == 3
+
+def test_long_branch_is_kept():
+    line = MultiLineString([[(0, 0), (50, 0)], [(50, 0), (100, 0)], [(50, 0), (50, 40)]])
+    polygon = corridor(LineString([(0, 0), (100, 0)]), LineString([(50, 0), (50, 40)]))
+    routes, removed = topology.routes(line, polygon)
+    assert removed == 0
+    np.testing.assert_allclose(shapely.length(shapely.get_parts(routes)), [50, 50, 40])
+
+def test_junction_keeps_its_two_longest_chains():
+    # All three branches are spurs of the 100 m wide polygon, only the shortest one is pruned
+    line = MultiLineString([[(0, 0), (-8, 0)], [(0, 0), (10, 0)], [(0, 0), (0, 12)]])
+    routes, removed = topology.routes(line, shapely.box(-100, -100, 100, 100))
+    assert removed == 8
+    assert routes.geom_type == "LineString"
+    np.testing.assert_allclose(shapely.get_coordinates(routes), [[10, 0], [0, 0], [0, 12]])
+
+def test_routes_run_west_to_east_or_south_to_north():
+    east_west = LineString([(100, 1), (0, 0)])
+    routes, _ = topology.routes(east_west, corridor(east_west))
+    np.testing.assert_allclose(shapely.get_coordinates(routes), [[0, 0], [100, 1]])
+    north_south = LineString([(1, 100), (0, 0)])
+    routes, _ = topology.routes(north_south, corridor(north_south))
+    np.testing.assert_allclose(shapely.get_coordinates(routes), [[0, 0], [1, 100]])
+
+def test_routes_are_ordered_by_length():
+    line = MultiLineString([[(0, 0), (10, 0)], [(0, 50), (30, 50)], [(0, 100), (20, 100)]])
+    polygon = corridor(*shapely.get_parts(line), width=2)
+    routes, removed = topology.routes(line, polygon)
+    assert removed == 0
+    np.testing.assert_allclose(shapely.length(shapely.get_parts(routes)), [30, 20, 10])
+
+def test_prune_keeps_empty_centerlines():
+    line = LineString([(0, 0), (50, 0)])
+    lines, removed = topology.prune([line, None], [corridor(line), None])
+    assert lines[0].equals(line) and lines[1] is None
+    np.testing.assert_array_equal(removed, [0, 0])
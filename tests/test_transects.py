@@ -0,0 +1,203 @@
+"""
+Equivalence of the batched transect generator with the per-station loop create_perp used before it.
+"""
+
+import warnings
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import LineString, MultiLineString
+import geopandas as gpd
+import centerperp as cp
+import utils
+from transects import adaptive_station_points, non_intersecting, perpendiculars, width_profile
+
+def loop_perpendiculars(lines, distance=10, interval=5):
+    """The per-station loop of the original create_perp, without the overlay."""
+    new_perp = []
+    for geom in lines:
+        parts = [geom] if isinstance(geom, LineString) else list(geom.geoms)
+        for line in parts:
+            length = line.length
+            num_lines = int(length // interval) + 1
+            for i in range(num_lines):
+                position = i * interval
+                point = line.interpolate(position)
+                next_position = min(position + interval, length)
+                next_point = line.interpolate(next_position)
+                direction = np.array(next_point.coords[0]) - np.array(point.coords[0])
+                angle = np.arctan2(direction[1], direction[0])
+                perp_angle = angle + np.pi / 2
+                perp_start = np.array(point.coords[0]) + distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
+                perp_end = np.array(point.coords[0]) - distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
+                new_perp.append(LineString([tuple(perp_start), tuple(perp_end)]))
+    return np.array(new_perp, dtype=object)
+
+def loop_create_perp(gdf_polygon, gdf_lines, distance=10, interval=5):
+    """The original create_perp: the loop, then an overlay with the polygons."""
+    new_perp = gpd.GeoDataFrame(geometry=loop_perpendiculars(gdf_lines.geometry, distance, interval), crs=gdf_polygon.crs)
+    new_perp = gpd.overlay(new_perp, gdf_polygon, how="intersection")
+    new_perp["id"] = range(len(new_perp))
+    new_perp["width"] = new_perp.geometry.length
+    return new_perp
+
+BEND = LineString([(0, 0), (40, 3), (70, 30), (71.5, 80)])
+MULTI = MultiLineString([[(0, 0), (33, 0), (60, 12)], [(200, 0), (200, 47), (230, 90)]])
+
+def assert_same_lines(a, b):
+    assert len(a) == len(b)
+    np.testing.assert_allclose(shapely.get_coordinates(a), shapely.get_coordinates(b), atol=1e-9)
+
+@pytest.mark.parametrize("lines", [[BEND], [MULTI], [BEND, MULTI]], ids=["linestring", "multilinestring", "mixed"])
+@pytest.mark.parametrize("interval", [5, 3.7])
+def test_perpendiculars_match_loop(lines, interval):
+    perp, index, chainage, xy, _ = perpendiculars(lines, 10, interval)
+    assert_same_lines(perp, loop_perpendiculars(lines, 10, interval))
+    np.testing.assert_allclose(shapely.length(perp), 20)
+
+def test_exact_multiple_of_interval():
+    # The last station falls on the end of the line: the loop had a zero-length chord there and always drew a
+    # vertical line, the generator uses the backward chord instead
+    line = LineString([(0, 0), (60, 0), (60, 40)])
+    perp, _, chainage, _, _ = perpendiculars([line], 10, 5)
+    expected = loop_perpendiculars([line], 10, 5)
+    assert len(perp) == len(expected) == 21
+    np.testing.assert_allclose(chainage[[0, -1]], [0, 100])
+    assert_same_lines(perp[:-1], expected[:-1])
+    np.testing.assert_allclose(shapely.get_coordinates(perp[-1]), [[50, 40], [70, 40]], atol=1e-9)
+
+@pytest.mark.parametrize("line", [BEND, LineString([(0, 0), (103, 0)])], ids=["bend", "straight"])
+def test_create_perp_matches_loop(line):
+    # Square caps keep the first and last stations inside the polygon
+    polygon = line.buffer(4, cap_style="square")
+    gdf_polygon = gpd.GeoDataFrame({"name": ["road"]}, geometry=[polygon], crs=32651)
+    gdf_lines = gpd.GeoDataFrame(geometry=[line], crs=32651)
+    new = cp.create_perp(gdf_polygon, gdf_lines, 10, 5)
+    old = loop_create_perp(gdf_polygon, gdf_lines, 10, 5)
+    assert list(new.columns) == ["name", "geometry", "id", "width", "route", "chainage"]
+    assert (new["route"] == 0).all()
+    assert new["id"].tolist() == list(range(len(new)))
+    # The overlay sorts its rows differently, so the transects are matched by their midpoints
+    key = lambda gdf: np.argsort(shapely.get_coordinates(shapely.line_interpolate_point(gdf.geometry.values, 0.5,
+                                                                                          normalized=True)) @ [1, 1e-3])
+    new, old = new.iloc[key(new)], old.iloc[key(old)]
+    np.testing.assert_allclose(new["width"], old["width"], atol=1e-6)
+    np.testing.assert_allclose(shapely.get_coordinates(shapely.normalize(new.geometry.values)),
+                               shapely.get_coordinates(shapely.normalize(old.geometry.values)), atol=1e-6)
+
+def test_clip_keeps_the_segment_of_the_station():
+    # Two parallel roads 6 m wide with their centerlines 12 m apart: every transect crosses into the other road
+    roads = shapely.MultiPolygon([shapely.box(-1, 0, 101, 6), shapely.box(-1, 12, 101, 18)])
+    gdf_polygon = gpd.GeoDataFrame({"name": ["roads"]}, geometry=[roads], crs=32651)
+    lines = MultiLineString([[(0, 3), (100, 3)], [(0, 15), (100, 15)]])
+    perp, _, _, xy, _ = perpendiculars([lines], 10, 5)
+    new = cp.create_perp(gdf_polygon, gpd.GeoDataFrame(geometry=[lines], crs=32651), 10, 5)
+    assert len(new) == len(perp) == 42
+    np.testing.assert_allclose(new["width"], 6)
+    # Each transect contains its station and does not span the gap to the other road
+    assert (shapely.distance(new.geometry.values, shapely.points(xy)) < 1e-9).all()
+    assert not shapely.intersects(new.geometry.values, shapely.box(-1, 6.001, 101, 11.999)).any()
+    # The overlay keeps the metre of every transect that reaches into the other road too
+    overlay = gpd.overlay(gpd.GeoDataFrame(geometry=perp, crs=32651), gdf_polygon, how="intersection")
+    assert (overlay.geom_type == "MultiLineString").all()
+    np.testing.assert_allclose(overlay.length, 7)
+
+def test_adaptive_spacing_without_warnings():
+    # The polygon is wider than the rays on one side, so some sampled widths are infinite
+    line = LineString([(0, 0), (100, 0), (150, 50)])
+    polygon = LineString([(0, -5), (100, -5), (150, 45)]).buffer(12)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        perp, _, chainage, _, _ = perpendiculars([line], 10, "auto", [polygon])
+    assert len(perp) > 1 and chainage[0] == 0
+
+def test_width_profile_keys_multipart_routes():
+    # A branched centerline: the chainage starts again at 0 on every part, the route keeps the records apart
+    line = MultiLineString([[(0, 0), (60, 0)], [(60, 0), (100, 0)], [(60, 0), (60, 30)]])
+    polygon = shapely.union_all([LineString([(0, 0), (100, 0)]).buffer(4, cap_style="square"),
+                                 LineString([(60, 0), (60, 30)]).buffer(3, cap_style="square")])
+    profile = width_profile([polygon], [line], 5, 10)
+    assert set(profile["route"]) == {0, 1, 2}
+    keys = profile[["feature", "route", "chainage"]]
+    assert len(np.unique(keys)) == len(profile)
+    main = profile[profile["route"] == 0]
+    np.testing.assert_allclose(main["y"], 0)
+    np.testing.assert_allclose(main["chainage"], main["x"])
+    np.testing.assert_allclose(profile[profile["route"] == 1]["x"], 60 + profile[profile["route"] == 1]["chainage"])
+    np.testing.assert_allclose(profile[profile["route"] == 2]["x"], 60)
+
+def test_width_profile_of_an_off_centre_line():
+    # The road widens to the north from x = 52.5, between two stations, and the line runs 2 m from its southern edge
+    polygon = shapely.union(shapely.box(-1, -2, 101, 7), shapely.box(52.5, 0, 101, 12))
+    line = LineString([(0, 0), (100, 0)])
+    profile = width_profile([polygon], [line], 5, 20)
+    assert len(profile) == 21
+    # Eastward, the left of the line is the north side
+    np.testing.assert_allclose(profile["left"], np.where(profile["x"] < 52.5, 7, 12))
+    np.testing.assert_allclose(profile["right"], 2)
+    np.testing.assert_allclose(profile["left"] + profile["right"], profile["width"])
+    reverse = width_profile([polygon], [line.reverse()], 5, 20)
+    np.testing.assert_allclose(reverse["left"], profile["right"][::-1])
+    np.testing.assert_allclose(reverse["right"], profile["left"][::-1])
+
+def test_utils_create_perp_matches_centerperp():
+    polygon = MULTI.buffer(4, cap_style="square")
+    gdf_polygon = gpd.GeoDataFrame({"name": ["road"]}, geometry=[polygon], crs=32651)
+    gdf_lines = gpd.GeoDataFrame(geometry=[MULTI], crs=32651)
+    new = utils.create_perp(gdf_polygon, gdf_lines, 10, 5)
+    assert list(new.columns) == ["name", "geometry", "id", "width", "route", "chainage"]
+    assert set(new["route"]) == {0, 1}
+    assert new.equals(cp.create_perp(gdf_polygon, gdf_lines, 10, 5))
+
+def loop_remove_intersect(lines):
+    """The pairwise scan of the original remove_intersect, as a mask."""
+    return np.array([not any(i != j and a.intersects(b) for j, b in enumerate(lines)) for i, a in enumerate(lines)])
+
+def loop_thin(lines):
+    """Greedy thinning in order: a line is kept when it intersects no line kept before it."""
+    kept = []
+    for i, line in enumerate(lines):
+        if not any(line.intersects(lines[j]) for j in kept):
+            kept.append(i)
+    return np.isin(np.arange(len(lines)), kept)
+
+# Transects of a tight bend, where neighbouring lines cross, and a few scattered ones
+CROSSING = np.concatenate([
+    perpendiculars([LineString([(0, 0), (30, 0), (32, 2), (32, 30)])], 10, 1)[0],
+    shapely.linestrings(np.random.default_rng(0).uniform(0, 200, (40, 2, 2)))])
+
+def test_non_intersecting_matches_loop():
+    keep = non_intersecting(CROSSING)
+    np.testing.assert_array_equal(keep, loop_remove_intersect(CROSSING))
+    assert 0 < keep.sum() < len(CROSSING)
+    gdf = gpd.GeoDataFrame({"id": range(len(CROSSING))}, geometry=CROSSING, crs=32651)
+    assert cp.remove_intersect(gdf)["id"].tolist() == np.flatnonzero(keep).tolist()
+
+def test_thin_keeps_a_maximal_set_without_conflicts():
+    keep = non_intersecting(CROSSING, thin=True)
+    np.testing.assert_array_equal(keep, loop_thin(CROSSING))
+    kept, dropped = CROSSING[keep], CROSSING[~keep]
+    assert non_intersecting(kept).all()
+    # Every dropped line crosses a kept one, so none could be added back
+    assert all(shapely.intersects(line, kept).any() for line in dropped)
+    assert keep.sum() > non_intersecting(CROSSING).sum()
+
+def test_adaptive_spacing_is_sparse_on_straights():
+    line = LineString([(0, 5), (2000, 5)])
+    _, chainage, _, _, _ = adaptive_station_points([line], [shapely.box(-10, 0, 2010, 10)])
+    assert 80 <= len(chainage) <= 82
+    np.testing.assert_allclose(np.diff(chainage)[:-1], 25)
+
+def test_adaptive_spacing_is_denser_in_bends():
+    # 500 m straights on either side of a quarter circle of 50 m radius, with a little vertex noise
+    angle = np.linspace(-np.pi / 2, 0, 40)
+    coords = np.concatenate([np.column_stack([np.linspace(-500, 0, 501), np.full(501, -50)]),
+                             np.column_stack([50 * np.cos(angle), 50 * np.sin(angle)])[1:],
+                             np.column_stack([np.full(500, 50), np.linspace(1, 500, 500)])])
+    coords += np.random.default_rng(0).normal(0, 0.05, coords.shape)
+    _, chainage, _, _, _ = adaptive_station_points([LineString(coords)])
+    bend = (chainage > 500) & (chainage < 500 + 25 * np.pi)
+    straight = (chainage < 450) | (chainage > 600)
+    assert bend.sum() >= 8
+    assert np.diff(chainage[straight][:10]).min() > 20
+    assert np.diff(chainage[bend]).max() < 10
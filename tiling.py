@@ -0,0 +1,142 @@
+"""
+Tiled centerlines for very long polygons. The polygon is cut into overlapping windows along the longer side
+of its extent, the centerline of every window is computed separately (optionally in a process pool), and
+only the part of each centerline inside the core of its window, away from the cut, is kept. The pieces are
+then joined across the seams between the cores and merged into continuous lines.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+import adaptive
+import centerperp as cp
+from cache import open_cache
+
+#Windows along the longer side of the extent
+def tile_windows(bounds, tile_size=1000, overlap=200):
+    """
+    Returns the core and window rectangle of every tile. The cores tile the extent without overlapping, and
+    each window extends its core by overlap on both sides along the tiled axis.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    along_x = xmax - xmin >= ymax - ymin
+    start, stop = (xmin, xmax) if along_x else (ymin, ymax)
+    count = max(int(np.ceil((stop - start) / tile_size)), 1)
+    edges = np.linspace(start, stop, count + 1)
+
+    tiles = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        if along_x:
+            core = (low, ymin, high, ymax)
+            window = (low - overlap, ymin, high + overlap, ymax)
+        else:
+            core = (xmin, low, xmax, high)
+            window = (xmin, low - overlap, xmax, high + overlap)
+        tiles.append((core, window))
+    return tiles, along_x, edges[1:-1]
+
+def tile_centerline(wkb, core, window, crs, dense, tole, cache=None):
+    """Calculates the centerline of one window of the polygon and clips it to the core of the window."""
+    import geopandas as gpd
+    if isinstance(cache, str):
+        cache = open_cache(cache)
+    tile = shapely.clip_by_rect(shapely.from_wkb(wkb), *window)
+    if tile.is_empty:
+        return shapely.to_wkb(shapely.MultiLineString())
+    lines = cp.create_centerline(gpd.GeoDataFrame(geometry=[tile], crs=crs), dense, tole, cache).geometry.values[0]
+    return shapely.to_wkb(shapely.clip_by_rect(lines, *core))
+
+def _tile_centerline(args):
+    return tile_centerline(*args)
+
+#Joins the pieces across the seams
+def stitch(pieces, seams, along_x, tolerance=1.0):
+    """
+    Joins the centerline pieces of neighbouring tiles. The piece ends that lie on a seam are matched with the
+    nearest piece end on the other side of the seam, within tolerance, and both are moved to their midpoint.
+    The pieces are then merged into continuous lines.
+    """
+    lines = shapely.get_parts(np.asarray(pieces, dtype=object))
+    lines = lines[shapely.get_type_id(lines) == 1]
+    coords, vertex_line = shapely.get_coordinates(lines, return_index=True)
+    first = np.searchsorted(vertex_line, np.arange(len(lines)))
+    last = np.searchsorted(vertex_line, np.arange(len(lines)), side="right") - 1
+    ends = np.concatenate([first, last])
+    axis = 0 if along_x else 1
+
+    for seam in seams:
+        on_seam = ends[np.abs(coords[ends, axis] - seam) < 1e-9]
+        # The other end of the line tells on which side of the seam it lies
+        other = np.where(np.isin(on_seam, first), last[vertex_line[on_seam]], first[vertex_line[on_seam]])
+        before = on_seam[coords[other, axis] < seam]
+        after = on_seam[coords[other, axis] >= seam]
+        if len(before) == 0 or len(after) == 0:
+            continue
+        distance = np.linalg.norm(coords[before][:, None] - coords[after][None], axis=2)
+        nearest = distance.argmin(axis=1)
+        matched = distance[np.arange(len(before)), nearest] <= tolerance
+        for i, j in zip(before[matched], after[nearest[matched]]):
+            coords[i] = coords[j] = (coords[i] + coords[j]) / 2
+
+    lines = shapely.linestrings(coords, indices=vertex_line)
+    return shapely.line_merge(shapely.union_all(lines))
+
+#Centerline of a long polygon, tile by tile
+def tiled_centerline(polygon, tile_size=1000, overlap=200, dense=0.1, tole=0.001, crs=None, cache=None, workers=1,
+                     tolerance=1.0):
+    """
+    Calculates the centerline of a polygon tile by tile, so that the cost and memory of each skeletonization
+    are bounded by the tile size.
+
+    Parameters
+    ----------
+    polygon (Polygon or MultiPolygon): The polygon
+    tile_size (float): Length of the core of each tile along the longer side of the extent. The default is 1000.
+    overlap (float): Extension of each window beyond its core, on both sides. It should be well above the width
+        of the polygon, as the centerline is distorted near the cut. The default is 200.
+    dense, tole, cache: See create_centerline.
+    crs: CRS of the polygon, passed on to create_centerline.
+    workers (int): Number of worker processes. With 1, the tiles are processed in this process. The default is 1.
+    tolerance (float): Largest gap between two piece ends that are joined across a seam. The default is 1.0.
+
+    Returns
+    -------
+    lines (LineString or MultiLineString): The stitched centerline.
+
+    """
+    tiles, along_x, seams = tile_windows(polygon.bounds, tile_size, overlap)
+    wkb = shapely.to_wkb(polygon)
+    tasks = [(wkb, core, window, crs, dense, tole, cache) for core, window in tiles]
+    if workers == 1:
+        pieces = list(map(_tile_centerline, tasks))
+    else:
+        # Worker processes open the cache themselves
+        tasks = [task[:-1] + (cache and cache.path,) for task in tasks]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pieces = list(executor.map(_tile_centerline, tasks))
+    return stitch(shapely.from_wkb(pieces), seams, along_x, tolerance)
+
+def create_centerline(gdf_polygon, dense=0.1, tole=0.001, cache=None, tile_size=1000, overlap=200, workers=1):
+    """
+    Creates the centerline of the polygons like centerperp.create_centerline, tiling the polygons whose extent
+    exceeds tile_size. With dense="auto", the parameters are picked once per polygon, for all of its tiles, and
+    reported in the dense and tole columns.
+    """
+    import geopandas as gpd
+    polygons = gdf_polygon.geometry.values
+    auto = isinstance(dense, str) and dense == "auto"
+    if auto:
+        denses, toles = adaptive.centerline_parameters(polygons)
+    else:
+        denses, toles = np.full(len(polygons), dense, dtype=float), np.full(len(polygons), tole, dtype=float)
+    lines = []
+    for polygon, dense, tole in zip(polygons, denses.tolist(), toles.tolist()):
+        xmin, ymin, xmax, ymax = polygon.bounds
+        if max(xmax - xmin, ymax - ymin) <= tile_size:
+            single = gpd.GeoDataFrame(geometry=[polygon], crs=gdf_polygon.crs)
+            lines.append(cp.create_centerline(single, dense, tole, cache).geometry.values[0])
+        else:
+            lines.append(tiled_centerline(polygon, tile_size, overlap, dense, tole, gdf_polygon.crs, cache, workers))
+    if auto:
+        return gpd.GeoDataFrame({"dense": denses, "tole": toles}, geometry=lines, crs=gdf_polygon.crs)
+    return gpd.GeoDataFrame(geometry=lines, crs=gdf_polygon.crs)
@@ -0,0 +1,172 @@
+"""
+Topology of the centerlines, between create_centerline and create_perp. The parts of a centerline are the
+edges of a graph whose nodes are their end points, and the edges incident to every node are kept in compressed
+sparse row arrays. Chains of edges through nodes of degree 2 are merged into routes; the routes that end in a
+node of degree 1 on one side and branch off a junction on the other are spurs, like the branches toward the
+corners of a polygon, and are pruned when they are shorter than a factor of the polygon width at the junction.
+Pruning and merging are repeated until no spur is left, so the perpendicular lines are only placed along the
+main alignment.
+
+Every route is oriented west to east, or south to north when it runs more north-south, so its chainage does not
+depend on the order of the parts, and the routes of a centerline are ordered from the longest.
+"""
+
+import collections
+import numpy as np
+import shapely
+
+PRUNE_FACTOR = 1.5
+TOLERANCE = 1e-6
+
+class Graph:
+    """
+    The nodes and edges of a set of lines. The edges incident to node i are edges[indptr[i]:indptr[i + 1]],
+    and ends holds the start and end node of every edge.
+
+    Parameters
+    ----------
+    lines (ndarray): LineStrings, the edges
+    tolerance (float): Grid the end points are snapped to, so that ends closer than this are the same node.
+        The default is 1e-6.
+
+    """
+
+    def __init__(self, lines, tolerance=TOLERANCE):
+        self.lines = np.asarray(lines, dtype=object)
+        count = len(self.lines)
+        points = np.concatenate([shapely.get_coordinates(shapely.get_point(self.lines, 0)),
+                                 shapely.get_coordinates(shapely.get_point(self.lines, -1))]).reshape(-1, 2)
+        _, first, inverse = np.unique(np.round(points / tolerance).astype(np.int64), axis=0, return_index=True,
+                                      return_inverse=True)
+        inverse = inverse.ravel()
+        self.nodes = points[first]
+        self.ends = inverse.reshape(2, count).T
+        order = np.argsort(inverse, kind="stable")
+        self.indptr = np.searchsorted(inverse[order], np.arange(len(self.nodes) + 1))
+        self.edges = order % max(count, 1)
+        self.degree = np.diff(self.indptr)
+        self.length = shapely.length(self.lines)
+
+    def incident(self, node):
+        return self.edges[self.indptr[node]:self.indptr[node + 1]]
+
+    #Chains of edges through the nodes of degree 2
+    def chains(self):
+        """Returns the chains of edges between the nodes that are not of degree 2, as lists of (edge, forward)."""
+        visited = np.zeros(len(self.lines), dtype=bool)
+        chains = []
+        for start in range(len(self.lines)):
+            if visited[start]:
+                continue
+            visited[start] = True
+            chain = collections.deque([(start, True)])
+            for forward in (True, False):
+                edge, node = start, self.ends[start, 1 if forward else 0]
+                while self.degree[node] == 2:
+                    others = [e for e in self.incident(node) if e != edge]
+                    if not others or visited[others[0]]:
+                        break
+                    edge = others[0]
+                    visited[edge] = True
+                    along = self.ends[edge, 0] == node
+                    if forward:
+                        chain.append((edge, along))
+                    else:
+                        chain.appendleft((edge, not along))
+                    node = self.ends[edge, 1 if along else 0]
+            chains.append(list(chain))
+        return chains
+
+    def chain_ends(self, chain):
+        """Returns the first and last node of a chain."""
+        edge, forward = chain[0]
+        first = self.ends[edge, 0 if forward else 1]
+        edge, forward = chain[-1]
+        return first, self.ends[edge, 1 if forward else 0]
+
+    def chain_coordinates(self, chain):
+        coords = [shapely.get_coordinates(self.lines[edge])[::1 if forward else -1] for edge, forward in chain]
+        return np.concatenate([coords[0]] + [c[1:] for c in coords[1:]])
+
+def _orient(coords):
+    """Returns the coordinates of a route running west to east, or south to north if it runs more north-south."""
+    dx, dy = coords[-1] - coords[0]
+    if (dx < 0) if abs(dx) >= abs(dy) else (dy < 0):
+        return coords[::-1]
+    return coords
+
+#Spurs of a graph
+def spurs(graph, chains, width, factor=PRUNE_FACTOR):
+    """
+    Returns the chains to prune: those with a free end that branch off a junction and are shorter than factor
+    times the width at the junction, and separate fragments shorter than factor times the width at their start,
+    unless they are the longest chain. A junction keeps its two longest chains.
+
+    Parameters
+    ----------
+    graph (Graph): The graph of the centerline
+    chains (list): Its chains, see Graph.chains
+    width (ndarray): Polygon width at every node of the graph
+    factor (float): Spurs shorter than factor times the width are pruned. The default is 1.5.
+
+    """
+    ends = np.array([graph.chain_ends(chain) for chain in chains], dtype=np.int64).reshape(-1, 2)
+    length = np.array([graph.length[[edge for edge, _ in chain]].sum() for chain in chains])
+    free = graph.degree[ends] == 1
+    junction = np.where(free[:, 0], ends[:, 1], ends[:, 0])
+    short = length < factor * width[junction]
+    spur = np.flatnonzero((free[:, 0] ^ free[:, 1]) & (graph.degree[junction] >= 3) & short)
+    fragment = np.flatnonzero(free[:, 0] & free[:, 1] & short & (length < length.max()))
+
+    # The shortest spurs go first, as long as the junction keeps two chains
+    spur = spur[np.lexsort((length[spur], junction[spur]))]
+    group = junction[spur]
+    rank = np.arange(len(spur)) - np.searchsorted(group, group)
+    spur = spur[rank < graph.degree[group] - 2]
+    return np.concatenate([spur, fragment])
+
+#Routes of one centerline
+def routes(line, polygon, factor=PRUNE_FACTOR, tolerance=TOLERANCE):
+    """
+    Prunes the spurs of a centerline and merges the rest into continuous routes.
+
+    Parameters
+    ----------
+    line (LineString or MultiLineString): The centerline
+    polygon (Polygon): The polygon of the centerline, for its width at the junctions
+    factor (float): Spurs shorter than factor times the polygon width where they branch off are pruned.
+        The default is 1.5.
+    tolerance (float): Ends of the parts closer than this are joined. The default is 1e-6.
+
+    Returns
+    -------
+    routes (LineString or MultiLineString): The routes, from the longest
+    removed (float): Length of the pruned spurs
+
+    """
+    parts = shapely.get_parts(line)
+    parts = parts[(shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING) & (shapely.length(parts) > tolerance)]
+    if len(parts) == 0:
+        return line, 0.0
+    boundary = shapely.boundary(polygon)
+    removed = 0.0
+    while True:
+        graph = Graph(parts, tolerance)
+        chains = graph.chains()
+        width = 2 * shapely.distance(shapely.points(graph.nodes), boundary)
+        pruned = spurs(graph, chains, width, factor)
+        if not len(pruned):
+            break
+        drop = np.concatenate([[edge for edge, _ in chains[i]] for i in pruned]).astype(np.int64)
+        removed += graph.length[drop].sum()
+        parts = np.delete(parts, drop)
+
+    lines = np.array([shapely.LineString(_orient(graph.chain_coordinates(chain))) for chain in chains], dtype=object)
+    lines = lines[np.argsort(-shapely.length(lines), kind="stable")]
+    return (lines[0] if len(lines) == 1 else shapely.multilinestrings(lines)), float(removed)
+
+def prune(lines, polygons, factor=PRUNE_FACTOR, tolerance=TOLERANCE):
+    """Returns the routes of every centerline and the length pruned from it, see routes."""
+    results = [routes(line, polygon, factor, tolerance) if line is not None and not line.is_empty else (line, 0.0)
+               for line, polygon in zip(lines, polygons)]
+    return np.array([r[0] for r in results], dtype=object), np.array([r[1] for r in results], dtype=np.float64)
@@ -0,0 +1,402 @@
+import numpy as np
+import shapely
+
+LINESTRING = 1
+MULTILINESTRING = 5
+
+# Bounds and tolerances of the adaptive station spacing
+MIN_INTERVAL = 1
+MAX_INTERVAL = 25
+MAX_ANGLE = 10  # degrees of turn between neighbouring stations
+MAX_WIDTH_CHANGE = 1
+
+PROFILE_DTYPE = np.dtype([("feature", np.int64), ("route", np.int64), ("chainage", np.float64), ("x", np.float64),
+                          ("y", np.float64), ("left", np.float64), ("right", np.float64), ("width", np.float64)])
+
+def _vertex_distances(parts):
+    """Returns the vertex coordinates of the line parts, their cumulative distance and the first and last vertex of each part."""
+    coords, vertex_part = shapely.get_coordinates(parts, return_index=True)
+    step = np.hypot(*np.diff(coords, axis=0).T)
+    step[vertex_part[1:] != vertex_part[:-1]] = 0  # No distance is covered between two parts
+    cumulative = np.concatenate([[0.0], np.cumsum(step)])
+    first = np.searchsorted(vertex_part, np.arange(len(parts)))
+    last = np.searchsorted(vertex_part, np.arange(len(parts)), side="right") - 1
+    return coords, cumulative, first, last
+
+def _interpolate(vertices, part, chainage):
+    """Returns the points at the chainages along their line parts, and the segment each point lies on."""
+    coords, cumulative, first, last = vertices
+    target = cumulative[first[part]] + chainage
+    segment = np.searchsorted(cumulative, target, side="right") - 1
+    segment = np.clip(segment, first[part], last[part] - 1)
+    segment_length = cumulative[segment + 1] - cumulative[segment]
+    fraction = np.divide(target - cumulative[segment], segment_length,
+                         out=np.zeros(len(target)), where=segment_length > 0)
+    xy = coords[segment] + fraction[:, None] * (coords[segment + 1] - coords[segment])
+    return xy, segment
+
+def _line_parts(lines):
+    """Returns the non-empty parts of the lines and the position of the line each part belongs to."""
+    lines = np.asarray(lines, dtype=object)
+    type_ids = shapely.get_type_id(lines)
+    if not np.isin(type_ids, (LINESTRING, MULTILINESTRING)).all():
+        raise ValueError("Unsupported geometry type")
+
+    parts, part_index = shapely.get_parts(lines, return_index=True)
+    keep = ~shapely.is_empty(parts)
+    return parts[keep], part_index[keep]
+
+def _tangent_normals(vertices, segment):
+    """Returns the unit vectors perpendicular to the segments, to the left of the line direction."""
+    coords = vertices[0]
+    direction = coords[segment + 1] - coords[segment]
+    norm = np.hypot(*direction.T)
+    # A repeated vertex has no direction of its own, the previous segment is used instead
+    repeated = (norm == 0) & (segment > 0)
+    direction[repeated] = coords[segment[repeated]] - coords[segment[repeated] - 1]
+    norm[repeated] = np.hypot(*direction[repeated].T)
+    norm[norm == 0] = np.inf
+    return np.column_stack([-direction[:, 1], direction[:, 0]]) / norm[:, None]
+
+#Station points along the line parts
+def station_points(lines, interval=5):
+    """
+    Calculates the stations at certain intervals along every line part, all at once.
+
+    Parameters
+    ----------
+    lines (GeoSeries or arraylike): Lines or multilines
+    interval (int): Refers to the interval between stations. The default is 5.
+
+    Raises
+    ------
+    ValueError
+        If a geometry is not a line or a multiline.
+
+    Returns
+    -------
+    index (ndarray): Position of the input geometry each station belongs to.
+    chainage (ndarray): Distance of each station along its line part.
+    xy (ndarray): Coordinates of the stations, shape (n, 2).
+    normal (ndarray): Unit vectors perpendicular to the line direction at each station, shape (n, 2).
+    part (ndarray): Position of the line part of each station among the non-empty parts of all the lines,
+        see part_routes.
+
+    """
+    parts, part_index = _line_parts(lines)
+    lengths = shapely.length(parts)
+    counts = (lengths // interval).astype(np.int64) + 1  # Number of stations per part
+    station_part = np.repeat(np.arange(len(parts)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    chainage = (np.arange(counts.sum()) - first) * interval
+
+    # The direction at each station follows the chord to the next station, or to the previous one at the end of a part
+    vertices = _vertex_distances(parts)
+    next_chainage = np.minimum(chainage + interval, lengths[station_part])
+    at_end = next_chainage - chainage < interval * 1e-6
+    next_chainage[at_end] = np.maximum(chainage[at_end] - interval, 0)
+    xy, _ = _interpolate(vertices, station_part, chainage)
+    next_xy, _ = _interpolate(vertices, station_part, next_chainage)
+    direction = next_xy - xy
+    direction[at_end] *= -1
+    perp_angle = np.arctan2(direction[:, 1], direction[:, 0]) + np.pi / 2
+    normal = np.column_stack([np.cos(perp_angle), np.sin(perp_angle)])
+
+    return part_index[station_part], chainage, xy, normal, station_part
+
+#Station points spaced by the local curvature and width change
+def adaptive_station_points(lines, polygons=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                            max_angle=MAX_ANGLE, max_width_change=MAX_WIDTH_CHANGE, max_half_width=50):
+    """
+    Calculates stations along every line part whose spacing follows the line: dense in bends and where the
+    polygon narrows or widens, sparse along straight stretches of even width. The line is sampled every
+    min_interval, and the spacing at each sample is the largest one that keeps the turn of the line below
+    max_angle and the change of the width below max_width_change between neighbouring stations, bounded by
+    min_interval and max_interval. The turn is measured on chords of max_interval, so that the noise of the
+    vertices does not count as curvature. The direction at each station is the tangent of the segment it lies on.
+
+    Parameters
+    ----------
+    lines (GeoSeries or arraylike): Lines or multilines
+    polygons (GeoSeries or arraylike): The polygons the width is measured in, or None to follow the curvature
+        only. The default is None.
+    min_interval, max_interval (float): Bounds of the spacing. The defaults are 1 and 25.
+    max_angle (float): Largest turn of the line between neighbouring stations, in degrees. The default is 10.
+    max_width_change (float): Largest change of the width between neighbouring stations. The default is 1.
+    max_half_width (float): Length of the rays the width is measured with, see width_profile. The default is 50.
+
+    Raises
+    ------
+    ValueError
+        If a geometry is not a line or a multiline.
+
+    Returns
+    -------
+    index, chainage, xy, normal, part (ndarray): See station_points.
+
+    """
+    parts, part_index = _line_parts(lines)
+    lengths = shapely.length(parts)
+    vertices = _vertex_distances(parts)
+
+    # Samples every min_interval and at the end of each part
+    counts = np.ceil(lengths / min_interval).astype(np.int64) + 1
+    counts[lengths == 0] = 1
+    sample_part = np.repeat(np.arange(len(parts)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    sample_chainage = np.minimum((np.arange(counts.sum()) - first) * min_interval, lengths[sample_part])
+    sample_xy, sample_segment = _interpolate(vertices, sample_part, sample_chainage)
+
+    # Turn and width change over each chord between neighbouring samples of a part. The heading at a sample is
+    # that of the chord over max_interval around it, so the turn follows the bends and not the vertex noise
+    same = sample_part[1:] == sample_part[:-1]
+    step = np.diff(sample_chainage) * same
+    half_window = max(int(round(max_interval / min_interval / 2)), 1)
+    last = first + counts[sample_part] - 1
+    sample = np.arange(len(sample_xy))
+    chord = sample_xy[np.minimum(sample + half_window, last)] - sample_xy[np.maximum(sample - half_window, first)]
+    heading = np.arctan2(chord[:, 1], chord[:, 0])
+    turn = np.abs((np.diff(heading) + np.pi) % (2 * np.pi) - np.pi) * same
+    change = turn / np.radians(max_angle)
+    if polygons is not None:
+        normal = _tangent_normals(vertices, sample_segment)
+        rays = shapely.linestrings(np.stack([sample_xy + max_half_width * normal,
+                                             sample_xy - max_half_width * normal], axis=1))
+        sample, _, lower, upper, _, _ = _station_crossings(rays, sample_xy, polygons)
+        sample, first_polygon = np.unique(sample, return_index=True)
+        width = np.full(len(sample_xy), np.nan)
+        width[sample] = (upper[first_polygon] - lower[first_polygon]) * 2 * max_half_width
+        # A ray that leaves the polygon on one side has an infinite width, which does not count as a change
+        width[~np.isfinite(width)] = np.nan
+        width_change = np.nan_to_num(np.abs(np.diff(width))) * same
+        change = np.maximum(change, width_change / max_width_change)
+
+    # Stations per metre over each chord, integrated along the parts; a station is placed at every whole number
+    density = np.clip(np.divide(change, step, out=np.zeros(len(step)), where=step > 0), 1 / max_interval, 1 / min_interval)
+    stations = np.concatenate([[0.0], np.cumsum(density * step)])
+    part_start = stations[np.cumsum(counts) - counts]
+    part_end = stations[np.cumsum(counts) - 1]
+    # Parts are kept apart on the integrated axis so that np.interp never crosses from one part to the next
+    stations += 2 * sample_part
+    station_counts = np.floor(part_end - part_start + 1e-9).astype(np.int64) + 1
+    station_part = np.repeat(np.arange(len(parts)), station_counts)
+    target = part_start[station_part] + 2 * station_part + np.arange(station_counts.sum()) \
+        - np.repeat(np.cumsum(station_counts) - station_counts, station_counts)
+    chainage = np.minimum(np.interp(target, stations, sample_chainage), lengths[station_part])
+    # The offsets between the parts leave rounding errors at their first station
+    chainage[np.cumsum(station_counts) - station_counts] = 0
+
+    xy, segment = _interpolate(vertices, station_part, chainage)
+    return part_index[station_part], chainage, xy, _tangent_normals(vertices, segment), station_part
+
+def part_routes(lines):
+    """
+    Returns the route number of every non-empty line part, in the order of the part returned by station_points:
+    the rank of the part by length among the parts of its line, from 0 for the longest.
+    """
+    parts, part_index = _line_parts(lines)
+    order = np.lexsort((-shapely.length(parts), part_index))
+    routes = np.empty(len(parts), dtype=np.int64)
+    routes[order] = np.arange(len(parts)) - np.searchsorted(part_index[order], part_index[order])
+    return routes
+
+def _stations(lines, interval=5, polygons=None, max_half_width=50):
+    """Returns station_points, or adaptive_station_points if interval is "auto" or a (min, max) pair."""
+    if isinstance(interval, str) and interval != "auto":
+        raise ValueError(f"Unsupported interval: {interval}")
+    if interval == "auto":
+        interval = (MIN_INTERVAL, MAX_INTERVAL)
+    if isinstance(interval, (tuple, list)):
+        return adaptive_station_points(lines, polygons, *interval, max_half_width=max_half_width)
+    return station_points(lines, interval)
+
+#Perpendicular lines at the stations
+def perpendiculars(lines, distance=10, interval=5, polygons=None):
+    """
+    Creates every perpendicular line along the lines in a single shapely.linestrings call.
+
+    Parameters
+    ----------
+    lines (GeoSeries or arraylike): Lines or multilines
+    distance (int): Length of a perpendicular line extended in one direction from a station. The default is 10.
+    interval (int): Refers to the interval per perpendicular lines. The default is 5. With "auto" or a
+        (min, max) pair, the stations are spaced adaptively between the bounds, see adaptive_station_points.
+    polygons (GeoSeries or arraylike): The polygons the width changes of adaptive spacing are measured in.
+        The default is None.
+
+    Returns
+    -------
+    perp (ndarray): The perpendicular lines as shapely LineStrings.
+    index (ndarray): Position of the input geometry each perpendicular line belongs to.
+    chainage (ndarray): Distance of each station along its line part.
+    xy (ndarray): Coordinates of the stations, shape (n, 2).
+    part (ndarray): Line part of each station, see station_points.
+
+    """
+    index, chainage, xy, normal, part = _stations(lines, interval, polygons, distance)
+    perp_start = xy + distance * normal
+    perp_end = xy - distance * normal
+    perp = shapely.linestrings(np.stack([perp_start, perp_end], axis=1))
+
+    return perp, index, chainage, xy, part
+
+def _boundary_segments(polygons):
+    """Returns the start and end coordinates of every boundary segment of the polygons, and the polygon each belongs to."""
+    parts, part_polygon = shapely.get_parts(polygons, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, vertex_ring = shapely.get_coordinates(rings, return_index=True)
+    same_ring = vertex_ring[1:] == vertex_ring[:-1]
+    segment_polygon = part_polygon[ring_part[vertex_ring[:-1][same_ring]]]
+    return coords[:-1][same_ring], coords[1:][same_ring], segment_polygon
+
+def _cross(a, b):
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+def _station_crossings(perp, xy, polygons):
+    """
+    Finds, for every station and polygon that contains it, the nearest boundary crossings of the perpendicular
+    line on either side of the station. The crossings are returned as fractions along the line, from 0 at its
+    start to 1 at its end, and are -inf and inf where the line does not cross the boundary on that side.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    shapely.prepare(polygons)
+    stations = shapely.points(xy)
+    perp_index, poly_index = shapely.STRtree(polygons).query(stations)
+    inside = shapely.contains_properly(polygons[poly_index], stations[perp_index])
+    perp_index, poly_index = perp_index[inside], poly_index[inside]
+    order = np.lexsort((poly_index, perp_index))
+    perp_index, poly_index = perp_index[order], poly_index[order]
+
+    # Position of the crossings along the lines
+    coords = shapely.get_coordinates(perp).reshape(-1, 2, 2)
+    start, end = coords[:, 0], coords[:, 1]
+    seg_start, seg_end, segment_polygon = _boundary_segments(polygons)
+    segments = shapely.linestrings(np.stack([seg_start, seg_end], axis=1))
+    hit_pair, hit_segment = shapely.STRtree(segments).query(perp[perp_index])
+    hit_perp = perp_index[hit_pair]
+    same_polygon = segment_polygon[hit_segment] == poly_index[hit_pair]
+    hit_pair, hit_perp, hit_segment = hit_pair[same_polygon], hit_perp[same_polygon], hit_segment[same_polygon]
+
+    direction = end[hit_perp] - start[hit_perp]
+    seg_direction = seg_end[hit_segment] - seg_start[hit_segment]
+    offset = seg_start[hit_segment] - start[hit_perp]
+    denom = _cross(direction, seg_direction)
+    parallel = denom == 0
+    denom[parallel] = 1
+    t = _cross(offset, seg_direction) / denom
+    u = _cross(offset, direction) / denom
+    crosses = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+    # The nearest crossings on either side of the station
+    direction = end[perp_index] - start[perp_index]
+    station = np.einsum("ij,ij->i", xy[perp_index] - start[perp_index], direction) / np.einsum("ij,ij->i", direction, direction)
+    lower, upper = np.full(len(perp_index), -np.inf), np.full(len(perp_index), np.inf)
+    below = crosses & (t < station[hit_pair])
+    above = crosses & (t > station[hit_pair])
+    np.maximum.at(lower, hit_pair[below], t[below])
+    np.minimum.at(upper, hit_pair[above], t[above])
+
+    return perp_index, poly_index, lower, upper, start[perp_index], direction
+
+#Clip the perpendicular lines to the polygons
+def clip_perpendiculars(perp, xy, polygons):
+    """
+    Clips the perpendicular lines to the polygons and keeps, for every polygon that contains the station, only
+    the segment of the line that contains the station. The polygons are prepared and the boundary segments
+    are indexed in an STRtree, so only the boundary near each line is examined. Lines that do not cross the
+    boundary are kept as they are.
+
+    Parameters
+    ----------
+    perp (ndarray): Perpendicular lines, as returned by perpendiculars
+    xy (ndarray): Coordinates of the stations, shape (n, 2)
+    polygons (GeoSeries or arraylike): A polygon or multipolygon
+
+    Returns
+    -------
+    clipped (ndarray): The clipped perpendicular lines.
+    perp_index (ndarray): Position of the perpendicular line each clipped line comes from.
+    poly_index (ndarray): Position of the polygon each clipped line lies in.
+
+    """
+    perp_index, poly_index, lower, upper, start, direction = _station_crossings(perp, xy, polygons)
+    clipped_start = start + np.maximum(lower, 0)[:, None] * direction
+    clipped_end = start + np.minimum(upper, 1)[:, None] * direction
+    clipped = shapely.linestrings(np.stack([clipped_start, clipped_end], axis=1))
+
+    return clipped, perp_index, poly_index
+
+#Width profile along the centerline
+def width_profile(polygon, centerline, interval=5, max_half_width=50):
+    """
+    Calculates the width of the polygon at stations along the centerline, without building perpendicular
+    line GeoDataFrames or overlaying them. The half-widths are measured by casting a ray of max_half_width to
+    either side of every station and finding its nearest crossing with the polygon boundary.
+
+    Parameters
+    ----------
+    polygon (GeoSeries or arraylike): A polygon or multipolygon
+    centerline (GeoSeries or arraylike): Lines or multilines
+    interval (int): Refers to the interval between stations. The default is 5. See perpendiculars for
+        adaptive spacing.
+    max_half_width (float): Length of the rays. Half-widths beyond it are NaN. The default is 50.
+
+    Returns
+    -------
+    profile (ndarray): Structured array with one record per station that lies inside the polygon, with the
+        fields feature (position of the centerline geometry), route (part of the centerline the station lies
+        on, see part_routes), chainage along that part, x, y, left, right and width. Left is the half-width on
+        the left of the centerline direction.
+
+    """
+    index, chainage, xy, normal, part = _stations(centerline, interval, polygon, max_half_width)
+    rays = shapely.linestrings(np.stack([xy + max_half_width * normal, xy - max_half_width * normal], axis=1))
+    station, _, lower, upper, _, _ = _station_crossings(rays, xy, polygon)
+
+    # A station inside overlapping polygons is measured in the first of them
+    station, first = np.unique(station, return_index=True)
+    left = (0.5 - lower[first]) * 2 * max_half_width
+    right = (upper[first] - 0.5) * 2 * max_half_width
+
+    profile = np.empty(len(station), dtype=PROFILE_DTYPE)
+    profile["feature"] = index[station]
+    profile["route"] = part_routes(centerline)[part[station]]
+    profile["chainage"] = chainage[station]
+    profile["x"], profile["y"] = xy[station, 0], xy[station, 1]
+    profile["left"] = np.where(np.isfinite(left), left, np.nan)
+    profile["right"] = np.where(np.isfinite(right), right, np.nan)
+    profile["width"] = profile["left"] + profile["right"]
+    return profile
+
+#Lines that intersect no other line
+def non_intersecting(lines, thin=False):
+    """
+    Finds the lines that do not intersect any other line, using an STRtree so that only nearby lines are tested.
+
+    Parameters
+    ----------
+    lines (GeoSeries or arraylike): Lines or multilines
+    thin (bool): If True, conflicting lines are thinned greedily instead of all being dropped: going through the
+        lines in order, a line is kept when it does not intersect any line kept before it, so one line is kept per
+        crossing cluster. The default is False.
+
+    Returns
+    -------
+    keep (ndarray): Boolean mask of the lines to keep.
+
+    """
+    lines = np.asarray(lines, dtype=object)
+    left, right = shapely.STRtree(lines).query(lines, predicate="intersects")
+    other = left != right
+    left, right = left[other], right[other]
+
+    keep = np.ones(len(lines), dtype=bool)
+    keep[left] = False
+    if thin:
+        order = np.lexsort((right, left))
+        left, right = left[order], right[order]
+        conflicting, first, counts = np.unique(left, return_index=True, return_counts=True)
+        for i, start, count in zip(conflicting, first, counts):
+            keep[i] = not keep[right[start:start + count]].any()
+
+    return keep
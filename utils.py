@@ -1,7 +1,8 @@
-import geopandas as gpd
-import pygeoops
-from shapely.geometry import LineString, MultiLineString
-import numpy as np
+import adaptive
+import centerperp
+import line_simplify
+import reproject as projection
+from transects import non_intersecting
 
 def dissolve(gdf):
     """
@@ -39,7 +40,8 @@ def reproject(gdf, target_epsg=32651):
     ----------
     gdf (geometry, GeoSeries or arraylike): A polygon or multipolygon
 
-    epsg (int) : EPSG code specifying output projection.The default is 32651.
+    epsg (int or str) : EPSG code specifying output projection, or "utm" for the UTM zone of the layer.
+        The default is 32651.
     
     Raises
     ------
@@ -51,9 +53,9 @@ def reproject(gdf, target_epsg=32651):
     gdf (geometry, GeoSeries or arraylike)
 
     """
-    return gdf.to_crs(epsg=target_epsg)
+    return projection.reproject_crs(gdf, target_epsg)
 
-def smoothen(gdf, buffer_distance=5, simplify_tolerance=1, resolution=40):
+def smoothen(gdf, buffer_distance=5, simplify_tolerance=1, resolution="auto", threads=1):
     """
     From geopandas GeoSeries.
     This algorithm first creates a buffer area around all features in the input layer using a specified distance. 
@@ -69,8 +71,10 @@ def smoothen(gdf, buffer_distance=5, simplify_tolerance=1, resolution=40):
     simplify_tolerance (float): All parts of a simplified geometry will be no more than tolerance distance from the 
         original. It has the same units as the coordinate reference system of the GeoSeries. For example, 
         using tolerance=100 in a projected CRS with meters as units means a distance of 100 meters in reality.
-    resolution (int): The resolution of the buffer around each vertex. Specifies the number of linear segments in 
-        a quarter circle in the approximation of circular arcs.
+    resolution (int or str): The resolution of the buffer around each vertex. Specifies the number of linear segments in 
+        a quarter circle in the approximation of circular arcs. With "auto", the lowest resolution whose arcs are not 
+        removed again by the simplification is used. The default is "auto".
+    threads (int): Number of threads the geometries are split over. The default is 1.
         
         Raises
         ------
@@ -79,18 +83,11 @@ def smoothen(gdf, buffer_distance=5, simplify_tolerance=1, resolution=40):
 
         Returns
         ------- 
-        gdf (geometry, GeoSeries or arraylike)
+        gdf (geometry, GeoSeries or arraylike): A smoothed copy, the input is left unchanged.
     """
-    if gdf.empty:
-        return gdf
-    smoothed_gdf = gdf
-    smoothed_gdf['geometry'] = smoothed_gdf.geometry.apply(lambda geom: 
-        geom.buffer(buffer_distance, resolution=resolution)
-        .buffer(-buffer_distance, resolution=resolution)
-        .simplify(simplify_tolerance, preserve_topology=True))
-    return smoothed_gdf
+    return line_simplify.smoothen(gdf, buffer_distance, simplify_tolerance, resolution, threads)
 
-def create_centerline(gdf, dense = 0.1, tole = 0.01):
+def create_centerline(gdf, dense = 0.1, tole = 0.01, cache=None):
     """
     From pygeoops. Calculates an approximated centerline/s for a polygon/multipolygon. Negative values for the algorithm parameters will result in an automatic optimisation based on the average geometry width for each input geometry.
 
@@ -102,9 +99,12 @@ def create_centerline(gdf, dense = 0.1, tole = 0.01):
                     A reasonable value is the typical minimal width of the input geometries. 
                     If a larger value is used centerlines might have holes on narrow places in the input geometry. 
                     The smaller the value choosen, the longer the processing will take.
+                    With "auto", the value is picked from the typical width of each polygon, see adaptive.py,
+                    and tole is ignored. The chosen values are reported in the dense and tole columns.
                     The default is 0.1.
     tole (float): Tolerance to simplify the resulting centerline (using Douglas-Peucker algoritm). 
                     The default is 0.01.
+    cache (CenterlineCache): Cache of previously computed centerlines, see cache.py. The default is None.
 
     Raises
     ------
@@ -116,7 +116,15 @@ def create_centerline(gdf, dense = 0.1, tole = 0.01):
     (GeoDataFrame): The centerline for each of the input geometries.
 
     """
-    gdf_lines = pygeoops.centerline(gdf.geometry, densify_distance=dense, simplifytolerance=tole)
+    import geopandas as gpd
+    if dense == "auto":
+        lines, dense, tole = adaptive.centerline(gdf.geometry, cache)
+        return gpd.GeoDataFrame({"dense": dense, "tole": tole}, geometry=lines, crs=gdf.crs)
+    if cache is None:
+        import pygeoops
+        gdf_lines = pygeoops.centerline(gdf.geometry, densify_distance=dense, simplifytolerance=tole)
+    else:
+        gdf_lines = cache.centerline(gdf.geometry, dense, tole)
     gdf_lines = gpd.GeoDataFrame(geometry=gdf_lines, crs=gdf.crs)
     
     return gdf_lines
@@ -143,78 +151,25 @@ def create_perp(gdf_polygon, gdf_lines, distance=10, interval=5):
     Returns
     -------
     new_perp (geometry, GeoSeries or arraylike): Returns a multiline of lines perpendicular to the edges of the polygon.
+        The route column is the part of the centerline each line is placed on, numbered from 0 for the longest, 
+        and chainage its distance along that part, see centerperp.create_perp.
 
     """
-    new_perp = []
+    return centerperp.create_perp(gdf_polygon, gdf_lines, distance, interval)
 
-    for idx, row in gdf_lines.iterrows():
-        geom = row.geometry
-        
-        if isinstance(geom, LineString):
-            length = geom.length
-            num_lines = int(length // interval) + 1  # Calculate number of perpendicular lines based on interval
-
-            for i in range(num_lines):
-                position = i * interval
-                point = geom.interpolate(position)
-
-                # Find the next point along the line to determine the direction
-                next_position = min(position + interval, length)
-                next_point = geom.interpolate(next_position)
-                direction = np.array(next_point.coords[0]) - np.array(point.coords[0])
-                angle = np.arctan2(direction[1], direction[0])
-                perp_angle = angle + np.pi / 2
-
-                # Create the perpendicular line
-                perp_start = np.array(point.coords[0]) + distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-                perp_end = np.array(point.coords[0]) - distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-
-                perpendicular_line = LineString([tuple(perp_start), tuple(perp_end)])
-                new_perp.append(perpendicular_line)
-
-        elif isinstance(geom, MultiLineString):
-            for line in geom.geoms:
-                length = line.length
-                num_lines = int(length // interval) + 1  # Calculate number of perpendicular lines based on interval
-
-                for i in range(num_lines):
-                    position = i * interval
-                    point = line.interpolate(position)
-
-                    next_position = min(position + interval, length)
-                    next_point = line.interpolate(next_position)
-                    direction = np.array(next_point.coords[0]) - np.array(point.coords[0])
-                    angle = np.arctan2(direction[1], direction[0])
-                    perp_angle = angle + np.pi / 2
-
-                    # Create the perpendicular line
-                    perp_start = np.array(point.coords[0]) + distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-                    perp_end = np.array(point.coords[0]) - distance * np.array([np.cos(perp_angle), np.sin(perp_angle)])
-
-                    perpendicular_line = LineString([tuple(perp_start), tuple(perp_end)])
-                    new_perp.append(perpendicular_line)
-        else:
-            raise ValueError("Unsupported geometry type")
-    new_perp = gpd.GeoDataFrame(geometry=new_perp, crs=gdf_polygon.crs)
-    new_perp = gpd.overlay(new_perp, gdf_polygon, how='intersection')    
-    new_perp['id'] = range(len(new_perp))
-    new_perp['width'] = new_perp.geometry.length
-    
-    return new_perp
-
-def remove_intersect(gdf):
+def remove_intersect(gdf, thin=False):
     """
     The function takes a GeoDataFrame (`gdf`) containing a line or multiline and removes any lines that intersect 
-    with others. It iterates through each line and checks for intersections with all other lines in the GeoDataFrame. 
-    If a line does not intersect with any others, it is added to a list of non-intersecting lines. Finally, the 
-    function returns a new GeoDataFrame containing only the non-intersecting lines, preserving the original 
-    coordinate reference system (CRS).
+    with others. The lines are indexed in an STRtree, so each line is only checked against the lines near it. 
+    With `thin`, the conflicting lines are thinned instead: going through the rows in order (create_perp returns 
+    them by station), a line is kept when it does not intersect any line kept before it. The function returns the 
+    remaining rows with their original attributes and coordinate reference system (CRS).
 
     
     Parameters
     ----------
     gdf (geometry, GeoSeries or arraylike): A geometry that is a line or multiline
-        DESCRIPTION.
+    thin (bool): Keep one line per crossing cluster instead of removing all of them. The default is False.
 
     Raises
     ------
@@ -226,18 +181,7 @@ def remove_intersect(gdf):
     non_intersecting_lines (geometry, GeoSeries or arraylike)
 
     """
-    non_intersecting_lines = []
-    
-    for i, geom1 in enumerate(gdf.geometry):
-        intersects = False
-        for j, geom2 in enumerate(gdf.geometry):
-            if i != j and geom1.intersects(geom2):
-                intersects = True
-                break
-        if not intersects:
-            non_intersecting_lines.append(geom1)
-    
-    return gpd.GeoDataFrame(geometry=non_intersecting_lines, crs=gdf.crs)
+    return gdf[non_intersecting(gdf.geometry, thin)]
 
 def print_width(gdf):
     """